@@ -0,0 +1,54 @@
+"""Measure "pyticket list --opened" and "list --closed" before and after
+archiving the closed ticket trees.
+
+Creates ```count``` tickets, nine tenths of them being closed like in an old
+repository, each ticket having a content.
+
+Usage: python -m benchmarks.archive [count...]
+"""
+import shutil
+import sys
+import tempfile
+
+from pyticket.repository import Repository
+
+from benchmarks.utils import time_command
+
+
+def create_repository(root, count):
+    r = Repository(root, create=True)
+    with r.transaction():
+        for i in range(count):
+            name = "ticket-{}".format(i)
+            # Opened tickets are the last created ones.
+            status = "opened" if i >= count * 9 // 10 else "closed"
+            r.create_ticket(name, status, [])
+            with open(r.get_ticket_content_path(name, create=True), "w") as f:
+                f.write("# {}\n\nSome content.\n".format(name))
+    r.compact()
+    return r
+
+
+def main(counts):
+    for count in counts:
+        root = tempfile.mkdtemp("pyticket-bench")
+        try:
+            r = create_repository(root, count)
+            before = [time_command(root, ["list", "--opened"]),
+                      time_command(root, ["list", "--closed"])]
+            archived = r.archive_tickets()
+            after = [time_command(root, ["list", "--opened"]),
+                     time_command(root, ["list", "--closed"])]
+            print("{} tickets, {} archived".format(count, len(archived)))
+            print("  list --opened: {:.3f}s -> {:.3f}s".format(
+                before[0], after[0]
+            ))
+            print("  list --closed: {:.3f}s -> {:.3f}s".format(
+                before[1], after[1]
+            ))
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,53 @@
+"""Measure concurrent pyticket invocations, and check no update is lost.
+
+Runs ```count``` parallel "add-tags" commands, each adding its own tag to the
+same ticket, while "compact" commands run at the same time.
+
+Usage: python -m benchmarks.concurrency [count] [tickets]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from pyticket.repository import Repository
+
+from benchmarks.utils import create_repository
+
+
+def main(count, tickets):
+    root = tempfile.mkdtemp("pyticket-bench") + "/repository"
+    try:
+        names = create_repository(root, tickets)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__)
+        ))
+        commands = [["add-tags", names[0], "parallel-{}".format(i)]
+                    for i in range(count)]
+        for i in range(0, count, 10):
+            commands.insert(i, ["compact"])
+
+        start = time.perf_counter()
+        processes = [
+            subprocess.Popen([sys.executable, "-m", "pyticket"] + args,
+                             cwd=root, env=env, stdout=subprocess.DEVNULL)
+            for args in commands
+        ]
+        failures = sum(1 for p in processes if p.wait() != 0)
+        elapsed = time.perf_counter() - start
+
+        tags = Repository(root).get_ticket(names[0]).tags
+        added = len([t for t in tags if t.startswith("parallel-")])
+        print("{} commands in {:.3f}s, {} failed, {}/{} tags added".format(
+            len(commands), elapsed, failures, added, count
+        ))
+    finally:
+        shutil.rmtree(os.path.dirname(root))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10000)
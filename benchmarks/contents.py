@@ -0,0 +1,45 @@
+"""Measure the reading of the contents of a ticket subtree, one ticket at a
+time and with ```Repository.read_contents```.
+
+Usage: python -m benchmarks.contents [count]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+from pyticket.repository import Repository
+
+from benchmarks.recent import best_time
+from benchmarks.show import create_epic
+
+
+def read_serially(r, names):
+    contents = []
+    for name in names:
+        if r.has_ticket_content(name):
+            contents.append(r.read_ticket_content(name))
+    return contents
+
+
+def main(count):
+    root = tempfile.mkdtemp("pyticket-bench") + "/repository"
+    try:
+        total = create_epic(root, count)
+        r = Repository(root, lazy=True)
+        names = r.get_subtree_names("epic")
+        print("epic with {} tickets".format(total))
+        print("one at a time: {:.4f}s".format(
+            best_time(lambda: read_serially(r, names))
+        ))
+        for threads in [1, 8]:
+            print("read_contents, {} threads: {:.4f}s".format(
+                threads,
+                best_time(lambda: list(r.read_contents(names, threads)))
+            ))
+    finally:
+        shutil.rmtree(os.path.dirname(root))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
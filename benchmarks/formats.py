@@ -0,0 +1,75 @@
+"""Compare the size and the loading time of the JSON and binary tickets
+files.
+
+The JSON tickets file is loaded without its cache.
+
+Usage: python -m benchmarks.formats [count...]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from pyticket.storage import BinaryStorage, JsonStorage
+from pyticket.ticket import MetaTicket
+
+from benchmarks.utils import TAGS
+
+
+def gen_tickets(count):
+    """Returns ```count``` tickets, a third of them being childs of another
+    ticket.
+    """
+    random.seed(count)
+    tickets = []
+    for i in range(count):
+        name = "ticket-{}".format(i)
+        if tickets and random.random() < 0.3:
+            name = random.choice(tickets).name + "." + name
+        tickets.append(MetaTicket(name, random.choice(["opened", "closed"]),
+                                  random.sample(TAGS, random.randrange(4)),
+                                  time.time()))
+    return tickets
+
+
+def time_load(storage_class, directory, runs=3):
+    """Returns the best time needed to load every ticket of the storage."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        storage_class(directory).load()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(counts):
+    for count in counts:
+        tickets = gen_tickets(count)
+        root = tempfile.mkdtemp("pyticket-bench")
+        try:
+            results = []
+            for storage_class in [JsonStorage, BinaryStorage]:
+                directory = root + "/" + storage_class.NAME
+                os.mkdir(directory)
+                storage = storage_class(directory)
+                storage.loaded = True
+                storage.loaded_tickets = {t.name: t for t in tickets}
+                storage.write_tickets_file(1)
+                with mock.patch("pyticket.storage.read_cache",
+                                return_value=None):
+                    elapsed = time_load(storage_class, directory)
+                results.append("{} {:.1f} MB {:.3f}s".format(
+                    storage_class.NAME, os.path.getsize(storage.path) / 1e6,
+                    elapsed
+                ))
+            print("{:>8} tickets: {}".format(count, ", ".join(results)))
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,65 @@
+"""Measure the "grep" of ticket contents with a growing number of
+processes.
+
+Creates ```count``` tickets whose contents are about ```size``` bytes of
+random words, then measures the time to find a rare and a frequent word in
+every content, the time to the first match, and the time to search the
+contents of a tag.
+
+Usage: python -m benchmarks.grep [count] [size]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pyticket import grep
+from pyticket.repository import Repository
+
+from benchmarks.recent import best_time
+from benchmarks.search import write_contents
+from benchmarks.utils import create_repository
+
+PATTERNS = ["word10\\b", "word4999\\d"]
+
+
+def main(count, size):
+    root = tempfile.mkdtemp("pyticket-bench") + "/repository"
+    try:
+        names = create_repository(root, count)
+        write_contents(root, names, size)
+        contents = root + "/.pyticket/contents"
+        cpus = os.cpu_count() or 1
+        print("{} tickets, {} processors".format(count, cpus))
+        jobs = sorted(set([1, 2, cpus]))
+        for pattern in PATTERNS:
+            for j in jobs:
+                matches = []
+                elapsed = best_time(lambda: matches.append(
+                    sum(1 for _ in grep.iter_matches(contents, pattern,
+                                                     jobs=j))
+                ), runs=3)
+                print("{:<12} jobs={:<3} {:.4f}s ({} lines)".format(
+                    pattern, j, elapsed, matches[-1]
+                ))
+        for j in jobs:
+            start = time.perf_counter()
+            next(grep.iter_matches(contents, PATTERNS[0], jobs=j))
+            print("first match jobs={:<3} {:.4f}s".format(
+                j, time.perf_counter() - start
+            ))
+
+        r = Repository(root, lazy=True)
+        tagged = [t.name for t in r.iter_tickets(tags=["tag-0"])]
+        print("tag-0 contents ({} tickets): {:.4f}s".format(
+            len(tagged), best_time(lambda: list(grep.iter_matches(
+                contents, PATTERNS[0], tagged)))
+        ))
+    finally:
+        shutil.rmtree(os.path.dirname(root))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10000)
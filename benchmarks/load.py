@@ -0,0 +1,44 @@
+"""Measure the time needed to load every ticket of a repository.
+
+Usage: python -m benchmarks.load [count...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from pyticket.repository import Repository
+
+from benchmarks.utils import create_repository
+
+
+def time_load(root, runs=5):
+    """Returns the best time needed to load the repository at ```root```."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        Repository(root)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(counts):
+    for count in counts:
+        root = tempfile.mkdtemp("pyticket-bench") + "/repository"
+        try:
+            create_repository(root, count)
+            cached = time_load(root)
+            with mock.patch("pyticket.storage.read_cache", return_value=None):
+                parsed = time_load(root)
+            print("{:>8} tickets: parsed {:.3f}s, cached {:.3f}s".format(
+                count, parsed, cached
+            ))
+        finally:
+            shutil.rmtree(os.path.dirname(root))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,37 @@
+"""Measure the peak memory used by read-only commands on the JSON and
+binary storage engines.
+
+Usage: python -m benchmarks.memory [count]
+"""
+import shutil
+import sys
+import tempfile
+
+from benchmarks.utils import (
+    create_repository, get_command_peak_rss, time_command
+)
+
+
+def main(count):
+    root = tempfile.mkdtemp("pyticket-bench")
+    try:
+        commands = [["current"], ["list", "--opened", "--tags", "tag-1"],
+                    ["table", "--closed", "--tags", "tag-2,tag-3"]]
+        for storage in ["json", "binary"]:
+            directory = root + "/" + storage
+            names = create_repository(directory, count, storage)
+            time_command(directory, ["works-on", names[0]], runs=1)
+            # Let the JSON engine write its cache.
+            time_command(directory, ["list"], runs=1)
+            for args in commands:
+                print("{:<7} {:<35} {:>7} kB {:.3f}s".format(
+                    storage, " ".join(args),
+                    get_command_peak_rss(directory, args),
+                    time_command(directory, args, runs=3)
+                ))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500000)
@@ -0,0 +1,60 @@
+"""Measure queries answered by their plan against a scan of every ticket.
+
+Usage: python -m benchmarks.query [count]
+"""
+import shutil
+import sys
+import tempfile
+
+from pyticket import query
+from pyticket.repository import Repository
+
+from benchmarks.recent import best_time
+from benchmarks.utils import create_repository
+
+QUERIES = [
+    "tag:tag-1 and mtime>={old}",
+    "status:opened and tag:tag-1 and tag:tag-2 and not tag:tag-3",
+    "(tag:tag-1 or tag:tag-2) and mtime>={recent}",
+    "name:{name}.* and not tag:tag-1",
+]
+
+
+def main(count):
+    root = tempfile.mkdtemp("pyticket-bench")
+    try:
+        for storage in ["json", "binary", "sqlite"]:
+            directory = root + "/" + storage
+            names = create_repository(directory, count, storage)
+            r = Repository(directory)
+            values = {
+                "old": r.get_ticket(names[count // 100]).mtime,
+                "recent": r.get_ticket(names[-count // 100]).mtime,
+                "name": names[0],
+            }
+            for lazy in [False, True]:
+                r = Repository(directory, lazy=lazy)
+                if storage == "json" and lazy:
+                    # Selecting loads the storage.
+                    continue
+                for text in QUERIES:
+                    expression = query.parse(text.format(**values))
+                    plan = query.compile_query(expression)
+
+                    def planned():
+                        return list(plan.iter_tickets(r))
+
+                    def scanned():
+                        return [t for t in r.iter_tickets()
+                                if expression.match(t)]
+
+                    print("{:<7} {:<7} plan: {:.4f}s, scan: {:.4f}s  {}"
+                          .format(storage, "lazy" if lazy else "loaded",
+                                  best_time(planned), best_time(scanned),
+                                  text))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
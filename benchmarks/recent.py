@@ -0,0 +1,57 @@
+"""Measure the selection of the recently modified tickets, using the mtime
+index, against a scan of every ticket.
+
+Usage: python -m benchmarks.recent [count]
+"""
+import shutil
+import sys
+import tempfile
+import time
+
+from pyticket.repository import Repository
+
+from benchmarks.utils import create_repository
+
+
+def best_time(function, runs=5):
+    """Returns the best time needed to call ```function```."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(count):
+    root = tempfile.mkdtemp("pyticket-bench")
+    try:
+        for storage in ["json", "binary", "sqlite"]:
+            directory = root + "/" + storage
+            names = create_repository(directory, count, storage)
+            r = Repository(directory)
+            # The last percent of the created tickets.
+            since = r.get_ticket(names[-count // 100]).mtime
+            for lazy in [False, True]:
+                r = Repository(directory, lazy=lazy)
+
+                def indexed():
+                    return r.list_tickets(since=since)
+
+                def scanned():
+                    return [t for t in r.list_tickets() if t.mtime >= since]
+
+                if storage == "json" and lazy:
+                    # Selecting loads the storage.
+                    continue
+                print("{:<7} {:<7} --since: {:.4f}s, scan: {:.4f}s".format(
+                    storage, "lazy" if lazy else "loaded",
+                    best_time(indexed), best_time(scanned)
+                ))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,95 @@
+"""Measure the full-text search of ticket contents.
+
+Creates ```count``` tickets whose contents are about ```size``` bytes of
+random words, builds the search index, then measures searches and the
+check of the modified contents done before every search.
+
+Usage: python -m benchmarks.search [count] [size]
+"""
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from pyticket import search
+from pyticket.repository import Repository
+from pyticket.utils import get_content_path
+
+from benchmarks.recent import best_time
+from benchmarks.utils import create_repository
+
+WORDS = ["word{}".format(i) for i in range(50000)]
+
+# Frequent words are much more frequent than rare ones, like in a text.
+WEIGHTS = list(itertools.accumulate([1.0 / (i + 1) for i in range(50000)]))
+
+SEARCHES = [
+    "word10",
+    "word10 word20",
+    "word5000",
+    "word5000 word30000",
+    "\"word1 word2\"",
+]
+
+
+def write_contents(root, names, size):
+    """Write a random content for every given ticket."""
+    random.seed(size)
+    for name in names:
+        words = random.choices(WORDS, cum_weights=WEIGHTS, k=size // 8)
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        path = get_content_path(root + "/.pyticket/contents", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("# {}\n\n{}\n".format(name, "\n".join(lines)))
+
+
+def main(count, size):
+    root = tempfile.mkdtemp("pyticket-bench") + "/repository"
+    try:
+        names = create_repository(root, count)
+        write_contents(root, names, size)
+        total = sum([
+            os.path.getsize(get_content_path(root + "/.pyticket/contents",
+                                             name))
+            for name in names
+        ])
+
+        r = Repository(root, lazy=True)
+        start = time.perf_counter()
+        r.search_tickets("word0")
+        index_size = os.path.getsize(r.get_search_index().path)
+        print("indexed {:.1f} MB in {:.1f}s, index: {:.1f} MB".format(
+            total / 1e6, time.perf_counter() - start, index_size / 1e6
+        ))
+
+        index = r.get_search_index()
+        # Directories just modified are checked by every search for a while.
+        time.sleep(search.RACY_NS / 1e9)
+        index.refresh()
+        print("modified contents check: {:.4f}s".format(
+            best_time(index.refresh)
+        ))
+        print("search with checks: {:.4f}s".format(
+            best_time(lambda: r.search_tickets("word5000", 20))
+        ))
+        for text in SEARCHES:
+            results = index.search(text, 20)
+            print("{:<22} {:.4f}s ({} shown)".format(
+                text, best_time(lambda: index.search(text, 20)), len(results)
+            ))
+        name = random.choice(names)
+        r.write_ticket_content(name, "word1 word2 word3\n")
+        print("content update: {:.4f}s".format(best_time(
+            lambda: r.write_ticket_content(name, "word1 word2 word3\n")
+        )))
+    finally:
+        shutil.rmtree(os.path.dirname(root))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10000)
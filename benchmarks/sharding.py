@@ -0,0 +1,58 @@
+"""Measure the contents sharding migration, and the access to content files
+in the flat and in the sharded layouts.
+
+Creates ```count``` content files in a flat contents directory, measures
+random reads and the listing of the contents, applies the migration, then
+measures the same operations in the sharded layout.
+
+Usage: python -m benchmarks.sharding [count]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from pyticket import migrations
+from pyticket.utils import get_content_path, iter_content_files
+
+from benchmarks.recent import best_time
+
+
+def main(count):
+    directory = tempfile.mkdtemp("pyticket-bench")
+    try:
+        contents = directory + "/contents"
+        os.mkdir(contents)
+        names = ["ticket-{}".format(i) for i in range(count)]
+        for name in names:
+            with open(contents + "/" + name, "w") as f:
+                f.write(name)
+        random.seed(count)
+        sample = random.sample(names, min(count, 10000))
+
+        def read(path):
+            with open(path, "r") as f:
+                return f.read()
+
+        print("{} content files".format(count))
+        print("flat: list {:.4f}s, read {} files {:.4f}s".format(
+            best_time(lambda: os.listdir(contents)), len(sample),
+            best_time(lambda: [read(contents + "/" + n) for n in sample])
+        ))
+        start = time.perf_counter()
+        migrations.contents_sharding_migration(directory)
+        print("migration: {:.4f}s".format(time.perf_counter() - start))
+        print("sharded: list {:.4f}s, read {} files {:.4f}s".format(
+            best_time(lambda: list(iter_content_files(contents))),
+            len(sample),
+            best_time(lambda: [read(get_content_path(contents, n))
+                               for n in sample])
+        ))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 150000)
@@ -0,0 +1,84 @@
+"""Measure "pyticket show" on an epic with many sub-tickets.
+
+Creates an epic ticket with ```count``` childs, each child having a few
+childs of its own, every ticket having a content of a few paragraphs. Then
+measures the time "show" needs to print the whole epic, with and without
+rendered tickets in the cache, and to print its first line.
+
+Usage: python -m benchmarks.show [count]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+from pyticket.repository import Repository
+
+from benchmarks.stream import time_first_line
+from benchmarks.utils import time_command
+
+CONTENT = """# {name}
+
+The *{name}* ticket has a paragraph which is long enough to be wrapped by
+the renderer, with some `inline code` and **strong** words.
+
+## Tasks
+
+- first task
+- second task
+
+```
+# not a heading
+```
+"""
+
+
+def create_epic(root, count):
+    """Create an epic with ```count``` childs, and 3 childs per child."""
+    os.makedirs(root)
+    r = Repository(root, create=True)
+    names = ["epic"]
+    with r.transaction():
+        r.create_ticket("epic", "opened", [])
+        for i in range(count):
+            child = "epic.story-{}".format(i)
+            names.append(child)
+            r.create_ticket(child, "opened", [])
+            for j in range(3):
+                names.append("{}.task-{}".format(child, j))
+                r.create_ticket(names[-1], "opened", [])
+    for name in names:
+        r.write_ticket_content(name, CONTENT.format(name=name))
+    return len(names)
+
+
+def main(count):
+    root = tempfile.mkdtemp("pyticket-bench") + "/repository"
+    try:
+        total = create_epic(root, count)
+        print("epic with {} tickets".format(total))
+        cache = root + "/.pyticket/cache/render"
+        shutil.rmtree(cache, ignore_errors=True)
+        print("whole epic, empty cache: {:.4f}s".format(
+            time_command(root, ["show", "epic"], runs=1)
+        ))
+        print("whole epic, cached: {:.4f}s".format(
+            time_command(root, ["show", "epic"], runs=3)
+        ))
+        print("first line, cached: {:.4f}s".format(
+            time_first_line(root, ["show", "epic"])
+        ))
+        # Adding a paragraph doesn't change the following headings numbers.
+        r = Repository(root, lazy=True)
+        name = "epic.story-{}.task-0".format(count // 2)
+        content = r.read_ticket_content(name)
+        r.write_ticket_content(name, content + "\nOne more paragraph.\n")
+        print("whole epic, one ticket modified: {:.4f}s".format(
+            time_command(root, ["show", "epic"], runs=1)
+        ))
+    finally:
+        shutil.rmtree(os.path.dirname(root))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
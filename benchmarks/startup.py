@@ -0,0 +1,26 @@
+"""Measure the wall time of trivial commands on a large repository.
+
+Usage: python -m benchmarks.startup [count]
+"""
+import shutil
+import sys
+import tempfile
+
+from benchmarks.utils import create_repository, time_command
+
+
+def main(count):
+    root = tempfile.mkdtemp("pyticket-bench") + "/repository"
+    try:
+        names = create_repository(root, count)
+        time_command(root, ["works-on", names[0]], runs=1)
+        for args in [["current"], ["add-tags", names[-1], "x"],
+                     ["release"], ["list", "--opened"]]:
+            print("{:<30} {:.3f}s".format(" ".join(args)[:30],
+                                          time_command(root, args)))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,54 @@
+"""Measure the time needed by "pyticket list" to print its first ticket.
+
+Usage: python -m benchmarks.stream [count...]
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.utils import create_repository, get_environment
+
+
+def time_first_line(root, args, runs=3):
+    """Returns the best time needed by ```pyticket <args>``` to print its
+    second line, the first one being the "opened:" header.
+    """
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "pyticket"] + args, cwd=root,
+            env=get_environment(), stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        process.stdout.readline()
+        process.stdout.readline()
+        elapsed = time.perf_counter() - start
+        process.stdout.close()
+        process.wait()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(counts):
+    for count in counts:
+        root = tempfile.mkdtemp("pyticket-bench")
+        try:
+            results = []
+            for storage in ["json", "binary", "sqlite"]:
+                directory = root + "/" + storage
+                create_repository(directory, count, storage)
+                # Let the JSON engine write its cache.
+                time_first_line(directory, ["list"], runs=1)
+                results.append("{} {:.3f}s".format(
+                    storage, time_first_line(directory, ["list"])
+                ))
+            print("{:>8} tickets: {}".format(count, ", ".join(results)))
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 500000])
@@ -0,0 +1,31 @@
+"""Measure the "table" command showing a few tickets of a large repository.
+
+Usage: python -m benchmarks.table [count]
+"""
+import shutil
+import sys
+import tempfile
+
+from benchmarks.utils import create_repository, time_command
+
+
+def main(count):
+    root = tempfile.mkdtemp("pyticket-bench")
+    try:
+        for storage in ["json", "binary"]:
+            directory = root + "/" + storage
+            create_repository(directory, count, storage)
+            # Let the JSON engine write its cache.
+            time_command(directory, ["list"], runs=1)
+            for args in [["table", "--count", "20"],
+                         ["table", "--count", "20", "--sorted-name"],
+                         ["table", "--count", "20", "--tags", "tag-1"]]:
+                print("{:<7} {:<35} {:.3f}s".format(
+                    storage, " ".join(args), time_command(directory, args)
+                ))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
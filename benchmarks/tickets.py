@@ -0,0 +1,70 @@
+"""Measure the memory used by loaded tickets, using tracemalloc.
+
+Reports the bytes allocated per ticket by the tickets alone, built from a
+parsed JSON tickets file, and by a JSON storage loaded without its cache
+(tickets and indexes).
+
+Usage: python -m benchmarks.tickets [count...]
+"""
+import gc
+import json
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from unittest import mock
+
+from pyticket.storage import JsonStorage
+from pyticket.ticket import MetaTicket
+
+from benchmarks.formats import gen_tickets
+
+
+def measure(function):
+    """Returns the memory still allocated once ```function``` returned,
+    while its result is alive.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(counts):
+    for count in counts:
+        root = tempfile.mkdtemp("pyticket-bench")
+        try:
+            storage = JsonStorage(root)
+            storage.loaded = True
+            storage.loaded_tickets = {t.name: t for t in gen_tickets(count)}
+            storage.write_tickets_file(1)
+            with open(storage.path, "r") as f:
+                content = f.read()
+            del storage
+
+            def build_tickets():
+                nodes = json.loads(content)["tickets"]
+                return [MetaTicket.from_json(node) for node in nodes]
+
+            def load_storage():
+                storage = JsonStorage(root)
+                with mock.patch("pyticket.storage.read_cache",
+                                return_value=None), \
+                        mock.patch("pyticket.storage.write_cache"):
+                    storage.load()
+                storage.raw_tickets = None
+                return storage
+
+            print("{:>8} tickets: {:.0f} B/ticket, storage {:.0f} B/ticket"
+                  .format(count, measure(build_tickets) / count,
+                          measure(load_storage) / count))
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
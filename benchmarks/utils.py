@@ -0,0 +1,77 @@
+"""Utility functions to write benchmarks."""
+import os
+import random
+import subprocess
+import sys
+import time
+
+from pyticket.repository import Repository
+
+TAGS = ["tag-{}".format(i) for i in range(40)]
+
+
+def create_repository(root, count, storage="json"):
+    """Create a pyticket repository in ```root``` containing ```count```
+    tickets, a third of them being childs of another ticket.
+
+    :return: the list of created ticket names.
+    """
+    random.seed(count)
+    os.makedirs(root)
+    r = Repository(root, create=True, storage=storage)
+    names = []
+    with r.transaction():
+        for i in range(count):
+            name = "ticket-{}".format(i)
+            if names and random.random() < 0.3:
+                name = random.choice(names) + "." + name
+            r.create_ticket(name, random.choice(["opened", "closed"]),
+                            random.sample(TAGS, random.randrange(4)))
+            names.append(name)
+    r.compact()
+    return names
+
+
+def get_environment():
+    """Returns the environment running pyticket from this source tree."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)
+    ))
+    return env
+
+
+def time_command(root, args, runs=5):
+    """Run ```pyticket <args>``` in ```root``` several times.
+
+    :return: the best wall time of the runs, in seconds.
+    """
+    env = get_environment()
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, "-m", "pyticket"] + args,
+                              cwd=root, env=env, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def get_command_peak_rss(root, args):
+    """Run ```pyticket <args>``` in ```root```.
+
+    :return: the peak resident set size of the command, in kilobytes.
+    """
+    # The command is run by an intermediate process, so the peak of the
+    # previous commands isn't reported.
+    script = ("import resource, subprocess, sys;"
+              "subprocess.check_call(sys.argv[1:],"
+              " stdout=subprocess.DEVNULL);"
+              "print(resource.getrusage(resource.RUSAGE_CHILDREN)"
+              ".ru_maxrss)")
+    output = subprocess.check_output(
+        [sys.executable, "-c", script, sys.executable, "-m", "pyticket"] +
+        args,
+        cwd=root, env=get_environment()
+    )
+    return int(output)
@@ -1,140 +1,276 @@
 #!/usr/bin/env python
 """
 PyTicket main program.
+
+Command callbacks are given by name, so only the modules needed by the
+executed command are imported.
 """
+import os
 import sys
 from pyticket import PyticketException
+from pyticket import client
 from pyticket.command import (
-    command, print_usage, execute_argv, option
+    argument, command, command_table, print_usage, execute_argv, option
 )
-from pyticket import commands as commands
 
-COMMANDS = [
+
+def help_(options, command=None):
+    if command:
+        if command not in COMMANDS:
+            raise PyticketException(
+                "command '{}' doesn't exist".format(command)
+            )
+        COMMANDS[command].usage()
+    else:
+        print_usage("pyticket", COMMANDS)
+
+
+def serve(options):
+    from pyticket import server
+    server.serve(COMMANDS)
+
+
+COMMANDS = command_table([
+    command(
+        "help",
+        "Show this help",
+        help_,
+        args=[argument("command", "Print the help of the given command",
+                       True)]
+    ),
     command(
         "init",
         "Initialize a pyticket repository",
-        commands.init
+        "pyticket.commands:init",
+        [option("storage",
+                "tickets storage engine (json, binary or sqlite)", True)],
+        args=[argument("directory", "The pyticket repository directory",
+                       False)]
     ),
     command(
         "configure",
         "Configure the pyticket repository",
-        commands.configure
+        "pyticket.commands:configure",
+        args=[argument("what", "Which configuration key to configure", False),
+              argument("value", "Key value", False)]
     ),
     command(
         "create",
         "Create a new ticket",
-        commands.create_ticket,
+        "pyticket.commands:create_ticket",
         [option("no-edit", "don't edit the created ticket", False),
-         option("tags", "initial ticket's tags", True)]
+         option("tags", "initial ticket's tags", True)],
+        args=[argument("ticket_name", "The ticket name", False),
+              argument("template", "The template to use", True)]
     ),
     command(
         "edit",
         "Edit an existing ticket",
-        commands.edit_ticket
+        "pyticket.commands:edit_ticket",
+        args=[argument("ticket_name", "The ticket name", False)]
     ),
     command(
         "delete",
         "Delete an existing ticket",
-        commands.delete_ticket,
-        [option("force", "don't ask for confirmation", False)]
+        "pyticket.commands:delete_ticket",
+        [option("force", "don't ask for confirmation", False)],
+        args=[argument("name", "The ticket name", False)]
     ),
     command(
         "rename",
         "Rename a ticket",
-        commands.rename_ticket
+        "pyticket.commands:rename_ticket",
+        args=[argument("name", "The ticket name", False),
+              argument("new_name", "The new ticket name", False)]
     ),
     command(
         "close",
         "Close an opened ticket",
-        commands.close_ticket
+        "pyticket.commands:close_ticket",
+        args=[argument("name", "The ticket name", False)]
     ),
     command(
         "reopen",
         "Reopen a closed ticket",
-        commands.reopen_ticket
+        "pyticket.commands:reopen_ticket",
+        args=[argument("name", "The ticket name", False)]
     ),
     command(
         "show",
         "Show an existing ticket",
-        commands.show_ticket
+        "pyticket.commands:show_ticket",
+        args=[argument("ticket_name", "The ticket name", False)]
     ),
     command(
         "list",
         "List tickets using criteria",
-        commands.list_tickets,
+        "pyticket.commands:list_tickets",
         [option("opened", "only list opened tickets", False),
          option("closed", "only list closed tickets", False),
          option("tags",
                 ("list tickets having the given tags (separated by a comma)."
                  " Listed tickets must have every given tags."),
-                True)]
+                True),
+         option("any-tags",
+                "list tickets having at least one of the given tags", True),
+         option("without-tags",
+                "list tickets having none of the given tags", True),
+         option("since",
+                ("list tickets modified at this time or later (a timestamp"
+                 " or a UTC date: YYYY-MM-DD[THH:MM[:SS]])"),
+                True),
+         option("until", "list tickets modified before this time", True),
+         option("query",
+                ("list tickets matching the given query, like \"status:opened"
+                 " and tag:bug and not tag:wontfix and name:core.* and"
+                 " mtime>2026-01-01\""),
+                True),
+         option("explain",
+                "show how the tickets are found instead of listing them",
+                False)],
+        args=[argument("ticket_name", "List given ticket and its childs",
+                       True)]
+    ),
+    command(
+        "search",
+        "Search tickets by content",
+        "pyticket.commands:search",
+        [option("count",
+                "number of tickets to show (20 by default, 0 for every one)",
+                True)],
+        args=[argument("terms",
+                       ("The searched words and \"quoted phrases\", every"
+                        " one must be in the ticket content"),
+                       False)]
+    ),
+    command(
+        "grep",
+        "Print the lines of ticket contents matching a regular expression",
+        "pyticket.commands:grep",
+        [option("ignore-case", "ignore the case", False),
+         option("jobs",
+                "number of processes reading the contents (the number of"
+                " processors by default)",
+                True),
+         option("opened", "only search opened tickets", False),
+         option("closed", "only search closed tickets", False),
+         option("tags", "only search tickets having the given tags", True),
+         option("any-tags",
+                "only search tickets having any of the given tags", True),
+         option("without-tags",
+                "only search tickets having none of the given tags", True),
+         option("since", "only search tickets modified since this time",
+                True),
+         option("until", "only search tickets modified before this time",
+                True),
+         option("query", "only search tickets matching the given query",
+                True)],
+        args=[argument("pattern", "The regular expression", False),
+              argument("ticket", "Only search this ticket tree", True)]
     ),
     command(
         "add-tags",
         "Add tags to the given ticket",
-        commands.add_tags
+        "pyticket.commands:add_tags",
+        args=[argument("ticket", "The ticket to modify", False),
+              argument("tags", "The tags to add to the ticket", False)]
     ),
     command(
         "remove-tags",
         "Remove tags from the given ticket",
-        commands.remove_tags
+        "pyticket.commands:remove_tags",
+        args=[argument("ticket", "The ticket to modify", False),
+              argument("tags", "The tag to remove from the ticket", False)]
     ),
     command(
         "works-on",
         "Set the current working ticket",
-        commands.works_on
+        "pyticket.commands:works_on",
+        args=[argument("name", "The ticket to work on", False)]
     ),
     command(
         "current",
         "Shows the current working ticket",
-        commands.current
+        "pyticket.commands:current"
     ),
     command(
         "release",
         "Release the working ticket",
-        commands.release
+        "pyticket.commands:release"
     ),
     command(
         "table",
         "Show tickets in a table",
-        commands.table,
+        "pyticket.commands:table",
         [option("sorted-name", "Sort the table with ticket names", False),
          option("count", "Number of tickets to show", True),
          option("opened", "Show opened tickets", False),
          option("closed", "Show closed tickets", False),
-         option("tags", "Filter using given tags", True)]
+         option("tags", "Filter using given tags", True),
+         option("any-tags", "Show tickets having any of given tags", True),
+         option("without-tags", "Hide tickets having given tags", True),
+         option("since", "Show tickets modified at this time or later",
+                True),
+         option("until", "Show tickets modified before this time", True),
+         option("query", "Show tickets matching the given query", True),
+         option("explain", "Show how the tickets are found", False)],
+        args=[argument("ticket", "Show only this ticket tree", True)]
+    ),
+    command(
+        "compact",
+        "Fold the repository journal into the tickets file",
+        "pyticket.commands:compact"
+    ),
+    command(
+        "archive",
+        "Move closed ticket trees to the archive",
+        "pyticket.commands:archive",
+        args=[argument("ticket", "Only archive this ticket tree", True)]
+    ),
+    command(
+        "convert",
+        ("Convert the tickets storage to another engine (json, binary or"
+         " sqlite)"),
+        "pyticket.commands:convert",
+        args=[argument("storage", "The new storage engine", False)]
+    ),
+    command(
+        "serve",
+        "Keep the repository loaded and answer commands over a socket",
+        serve
     ),
     command(
         "install-git",
         "Install pyticket callbacks in git repository",
-        commands.install_git
+        "pyticket.commands:install_git"
     ),
-]
-
-
-def help_(options, command: "Print the help of the given command" = None):
-    if command:
-        for cmd in COMMANDS:
-            if cmd.name == command:
-                cmd.usage()
-                return
-        raise PyticketException("command '{}' doesn't exist".format(command))
-    else:
-        print_usage("pyticket", COMMANDS)
+])
 
 
 def main(args=[]):
-    COMMANDS.insert(0, command("help", "Show this help", help_))
-
     if not args:
         print_usage("pyticket", COMMANDS)
         sys.exit(0)
 
     try:
+        if client.can_forward(args):
+            answer = client.forward(args)
+            if answer is not None:
+                output, error = answer
+                sys.stdout.write(output)
+                if error is not None:
+                    raise PyticketException(error)
+                return
         execute_argv(COMMANDS, args)
     except PyticketException as ex:
         print('pyticket: ' + str(ex))
         sys.exit(1)
+    except BrokenPipeError:
+        # The output has been closed before the end of the command (when
+        # piped into "head" for example): don't fail again when the
+        # interpreter flushes it at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
 
 
 if __name__ == '__main__':
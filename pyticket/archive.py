@@ -0,0 +1,276 @@
+"""Archive of closed ticket trees.
+
+Archived tickets are removed from the tickets storage and from the contents
+directory, and kept in the ".pyticket/archive" directory:
+
+- the pack file: the compressed contents of the archived tickets,
+  concatenated. New contents are appended to it ;
+- the "index" file: the name of the current pack file and, for every
+  archived ticket having a content, the offset and the size of its
+  compressed content in the pack ;
+- the "tickets" file: the JSON list of the archived tickets.
+
+Both JSON files are replaced atomically, after the pack has been written. The
+contents of unarchived tickets stay in the pack until it holds more removed
+contents than archived ones: the archived contents are then written to a new
+pack file, and the previous one is removed once the index refers to the new
+one.
+
+Only whole trees of closed tickets are archived, so an archived ticket never
+has a parent in the storage. Archive files are only read by the commands
+needing closed tickets, or a ticket missing from the storage.
+"""
+import json
+import os
+import os.path
+import zlib
+
+from pyticket import utils
+from pyticket.cache import (
+    get_cache_directory, get_file_key, read_cache, write_cache
+)
+from pyticket.storage import get_hierarchy_sort_key, is_in_subtree
+from pyticket.ticket import MetaTicket
+
+# The pack file is rewritten when it holds more than this number of bytes of
+# removed contents, and more removed contents than archived ones.
+MIN_REPACK_SIZE = 1024 * 1024
+
+
+class Archive:
+    """The archived tickets of a repository.
+
+    Archive files are read when they are first needed, and read again when
+    another process modified them.
+
+    :param directory: the ".pyticket" directory of the repository.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = directory + "/archive"
+        self.tickets = {}
+        self.tickets_key = None
+        # Names of the archived tickets, read from the cache.
+        self.names = frozenset()
+        self.names_key = None
+        self.index = {"pack": None, "contents": {}}
+        self.index_key = None
+
+    def exists(self):
+        """Check tickets have been archived."""
+        return os.path.isdir(self.path)
+
+    def _read_json(self, name, key, default):
+        """Read an archive JSON file, if it changed since ```key```.
+
+        :return: the ```(key, data)``` of the file, ```data``` being
+                 ```None``` if it didn't change.
+        """
+        path = self.path + "/" + name
+        try:
+            current_key = get_file_key(path)
+        except FileNotFoundError:
+            return None, default
+        if current_key == key:
+            return key, None
+        with open(path, "r", encoding="utf-8") as f:
+            return current_key, json.load(f)
+
+    def get_tickets(self):
+        """Returns the mapping of the names of the archived tickets to their
+        ```MetaTicket```.
+        """
+        key, data = self._read_json("tickets", self.tickets_key, [])
+        if data is not None:
+            self.tickets = {t["name"]: MetaTicket.from_json(t) for t in data}
+            if key is not None:
+                write_cache(self.get_names_cache_path(), key,
+                            sorted(self.tickets))
+        self.tickets_key = key
+        return self.tickets
+
+    def get_names_cache_path(self):
+        return get_cache_directory(self.directory) + "/archive-names.marshal"
+
+    def get_names(self):
+        """Returns the names of the archived tickets.
+
+        The tickets file is only parsed if the names are not cached for its
+        current version (see ```pyticket.cache```).
+        """
+        try:
+            key = get_file_key(self.path + "/tickets")
+        except FileNotFoundError:
+            return frozenset()
+        if key == self.tickets_key:
+            return self.tickets.keys()
+        if key != self.names_key:
+            names = read_cache(self.get_names_cache_path(), key)
+            if names is None:
+                return self.get_tickets().keys()
+            self.names = frozenset(names)
+            self.names_key = key
+        return self.names
+
+    def get_index(self):
+        """Returns the index of the archived contents: the name of the pack
+        file, and the mapping of ticket names to the ```[offset, size]``` of
+        their content in the pack.
+        """
+        key, data = self._read_json("index", self.index_key,
+                                    {"pack": None, "contents": {}})
+        if data is not None:
+            self.index = data
+        self.index_key = key
+        return self.index
+
+    def has_ticket(self, name):
+        """Check the given ticket is archived."""
+        return name in self.get_names()
+
+    def get_ticket(self, name):
+        """Returns the archived ticket, or ```None```."""
+        return self.get_tickets().get(name)
+
+    def get_descendant_names(self, name, recursive=True):
+        """Returns the names of the archived descendants of a ticket, in the
+        order of ```Repository.get_descendant_names```.
+        """
+        depth = name.count(".") + 1
+        names = [other for other in self.get_tickets()
+                 if other != name and is_in_subtree(other, name) and
+                 (recursive or other.count(".") == depth)]
+        names.sort(key=get_hierarchy_sort_key)
+        return names
+
+    def has_content(self, name):
+        """Check the given archived ticket has a content."""
+        return name in self.get_index()["contents"]
+
+    def read_content(self, name):
+        """Read the content of an archived ticket.
+
+        :return: the content, or ```None``` if the ticket has no archived
+                 content.
+        """
+        index = self.get_index()
+        location = index["contents"].get(name)
+        if location is None:
+            return None
+        offset, size = location
+        with open(self.path + "/" + index["pack"], "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(size)).decode("utf-8")
+
+    def iter_select(self, root=None, status=None, tags=None, any_tags=None,
+                    without_tags=None, since=None, until=None):
+        """Iterate over the archived tickets selected by the given filters
+        (see ```Repository.iter_tickets```), by scanning them.
+        """
+        if status == "opened":
+            return
+        tickets = self.get_tickets()
+        if root:
+            names = [root] + self.get_descendant_names(root)
+        else:
+            names = sorted(tickets, key=get_hierarchy_sort_key)
+        for name in names:
+            ticket = tickets[name]
+            if tags and not all(tag in ticket.tags for tag in tags):
+                continue
+            if any_tags and not any(tag in ticket.tags for tag in any_tags):
+                continue
+            if without_tags and \
+                    any(tag in ticket.tags for tag in without_tags):
+                continue
+            if since is not None and ticket.mtime < since:
+                continue
+            if until is not None and ticket.mtime >= until:
+                continue
+            yield ticket
+
+    def add(self, archived):
+        """Archive tickets.
+
+        Must be called with the repository lock held.
+
+        :param archived: an iterable over the ```(ticket, content)``` of the
+                         archived tickets, ```content``` being ```None``` if
+                         the ticket has no content.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        tickets = dict(self.get_tickets())
+        index = self.get_index()
+        pack = index["pack"] or "pack-1"
+        contents = dict(index["contents"])
+        with open(self.path + "/" + pack, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            for ticket, content in archived:
+                tickets[ticket.name] = ticket
+                if content is None:
+                    contents.pop(ticket.name, None)
+                    continue
+                blob = zlib.compress(content.encode("utf-8"))
+                f.write(blob)
+                contents[ticket.name] = [offset, len(blob)]
+                offset += len(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        self._write(tickets, {"pack": pack, "contents": contents})
+
+    def remove(self, names):
+        """Remove tickets from the archive.
+
+        Must be called with the repository lock held.
+
+        :param names: the names of the removed tickets.
+        """
+        tickets = dict(self.get_tickets())
+        index = self.get_index()
+        contents = dict(index["contents"])
+        for name in names:
+            tickets.pop(name, None)
+            contents.pop(name, None)
+        self._write(tickets, {"pack": index["pack"], "contents": contents})
+
+    def _write(self, tickets, index):
+        """Write the archive files, writing a new pack file if the current
+        one holds too many removed contents.
+        """
+        previous_pack = None
+        if index["pack"] is not None:
+            pack_size = os.path.getsize(self.path + "/" + index["pack"])
+            removed = pack_size - sum([size for _, size
+                                       in index["contents"].values()])
+            if removed > MIN_REPACK_SIZE and removed * 2 > pack_size:
+                previous_pack = index["pack"]
+                index = self._repack(index)
+        utils.write_file_atomically(self.path + "/index", json.dumps(index))
+        utils.write_file_atomically(
+            self.path + "/tickets",
+            json.dumps([tickets[name].to_json() for name in sorted(tickets)])
+        )
+        if previous_pack is not None:
+            os.remove(self.path + "/" + previous_pack)
+
+    def _repack(self, index):
+        """Write the archived contents to a new pack file.
+
+        :return: the index of the new pack file.
+        """
+        number = int(index["pack"].split("-")[1]) + 1
+        pack = "pack-{}".format(number)
+        contents = {}
+        with open(self.path + "/" + index["pack"], "rb") as previous, \
+                open(self.path + "/" + pack, "wb") as f:
+            offset = 0
+            # Contents are copied in pack order.
+            for name, (start, size) in sorted(index["contents"].items(),
+                                              key=lambda item: item[1]):
+                previous.seek(start)
+                f.write(previous.read(size))
+                contents[name] = [offset, size]
+                offset += size
+            f.flush()
+            os.fsync(f.fileno())
+        return {"pack": pack, "contents": contents}
@@ -0,0 +1,277 @@
+"""Compact binary tickets file format.
+
+The file is made of the following parts, every number being little-endian:
+
+- a header: the "PYTK" magic, the format version (u16), the file generation
+  (u64), the number of tickets, of strings and of tags ids (u32 each),
+  padded to 32 bytes ;
+- the strings offsets: one u32 per string plus one, string ```i``` being the
+  bytes between offsets ```i``` and ```i + 1``` of the strings data ;
+- the tags ids: the string ids of the tickets tags, one u32 per tag ;
+- the mtime order: the indexes of the tickets sorted by mtime, then by name,
+  one u32 per ticket (since version 2) ;
+- the tickets records, fixed-width: the name string id (u32), the status
+  index in ```MetaTicket.VALID_STATUS``` (u8), the mtime (f64), the index of
+  the first ticket tag in the tags ids (u32) and the number of tags (u16) ;
+- the strings data, encoded in utf-8.
+
+The name of ticket ```i``` is string ```i```. Tags strings follow the names
+and are stored once, whatever the number of tickets having them. Since
+version 3, tickets are sorted in hierarchy order (see
+```storage.get_hierarchy_sort_key```), so reading the records in file order
+lists every ticket followed by its descendants.
+"""
+import array
+import bisect
+import struct
+import sys
+
+from pyticket import PyticketException
+from pyticket.ticket import MetaTicket
+
+MAGIC = b"PYTK"
+
+VERSION = 3
+
+# Versions this module can read.
+VERSIONS = (1, 2, 3)
+
+HEADER = struct.Struct("<4sHQIII6x")
+
+RECORD = struct.Struct("<IBdIH")
+
+# Offset of the mtime in a record.
+MTIME = struct.Struct("<d")
+MTIME_OFFSET = 5
+
+
+def encode_tickets(generation, tickets):
+    """Encode tickets in the binary format.
+
+    :param generation: the generation of the tickets file.
+    :param tickets: the list of ```MetaTicket``` to encode. They are written
+                    in hierarchy order.
+    :return: the encoded bytes.
+    """
+    tickets = sorted(tickets, key=lambda t: t.name.split("."))
+    strings = [t.name for t in tickets]
+    string_ids = {}
+    tag_ids = array.array("I")
+    records = []
+    for ticket in tickets:
+        first_tag = len(tag_ids)
+        for tag in ticket.tags:
+            string_id = string_ids.get(tag)
+            if string_id is None:
+                string_id = len(strings)
+                string_ids[tag] = string_id
+                strings.append(tag)
+            tag_ids.append(string_id)
+        records.append(RECORD.pack(
+            len(records),
+            MetaTicket.VALID_STATUS.index(ticket.status),
+            ticket.mtime, first_tag, len(ticket.tags)
+        ))
+
+    mtime_order = array.array("I", sorted(
+        range(len(tickets)), key=lambda i: (tickets[i].mtime, tickets[i].name)
+    ))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = array.array("I", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    if sys.byteorder == "big":
+        offsets.byteswap()
+        tag_ids.byteswap()
+        mtime_order.byteswap()
+
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, generation, len(tickets), len(strings),
+                    len(tag_ids)),
+        offsets.tobytes(),
+        tag_ids.tobytes(),
+        mtime_order.tobytes(),
+        b"".join(records),
+        b"".join(encoded),
+    ])
+
+
+class TicketsFile:
+    """Reader of a binary tickets file.
+
+    Nothing is decoded when building the reader: strings and records are
+    decoded when requested, so a memory-mapped file is only read where it is
+    needed.
+
+    :param data: the file content, as ```bytes``` or a ```mmap.mmap```.
+    :raises PyticketException: the data is not a binary tickets file.
+    """
+    def __init__(self, data):
+        self.raw = data
+        self.data = memoryview(data)
+        if len(self.data) < HEADER.size:
+            raise PyticketException("truncated binary tickets file")
+        magic, self.version, self.generation, self.count, strings_count, \
+            tags_count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or self.version not in VERSIONS:
+            raise PyticketException("not a binary tickets file")
+        version = self.version
+
+        offsets_start = HEADER.size
+        tags_start = offsets_start + 4 * (strings_count + 1)
+        order_start = tags_start + 4 * tags_count
+        records_start = order_start
+        if version >= 2:
+            records_start += 4 * self.count
+        strings_start = records_start + RECORD.size * self.count
+        if len(self.data) < strings_start:
+            raise PyticketException("truncated binary tickets file")
+        self.offsets = self._u32_array(offsets_start, tags_start)
+        self.tag_ids = self._u32_array(tags_start, order_start)
+        self.mtime_order = None
+        if version >= 2:
+            self.mtime_order = self._u32_array(order_start, records_start)
+        self.records = self.data[records_start:strings_start]
+        self.strings_start = strings_start
+        self.strings_count = strings_count
+        self.strings_data = self.data[strings_start:]
+        if len(self.strings_data) < self.offsets[-1]:
+            raise PyticketException("truncated binary tickets file")
+
+    def _u32_array(self, start, end):
+        view = self.data[start:end].cast("I")
+        if sys.byteorder == "big":
+            values = array.array("I", view)
+            values.byteswap()
+            return values
+        return view
+
+    def get_string(self, index):
+        """Returns the string ```index``` of the strings table."""
+        return str(self.strings_data[self.offsets[index]:
+                                     self.offsets[index + 1]], "utf-8")
+
+    def get_tags_ids(self):
+        """Returns the mapping of every tag to its string id."""
+        return {self.get_string(i): i
+                for i in range(self.count, self.strings_count)}
+
+    def get_strings(self):
+        """Decode the whole strings table.
+
+        :return: the list of every string, indexed by string id.
+        """
+        offsets = self.offsets
+        data = bytes(self.strings_data[:offsets[-1]])
+        if data.isascii():
+            # Byte offsets are also characters offsets.
+            text = data.decode("ascii")
+            return [text[offsets[i]:offsets[i + 1]]
+                    for i in range(len(offsets) - 1)]
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8")
+                for i in range(len(offsets) - 1)]
+
+    def iter_records(self):
+        """Iterate over the ```(name_id, status, mtime, first_tag,
+        tags_count)``` records of every ticket, in file order.
+        """
+        return RECORD.iter_unpack(self.records)
+
+    def find(self, name):
+        """Returns the index of the ticket called ```name```, or ```None```
+        if there is no such ticket.
+        """
+        encoded = name.encode("utf-8")
+        offsets = self.offsets
+        # Ticket names are the first strings.
+        start = self.strings_start
+        end = start + offsets[self.count]
+        position = self.raw.find(encoded, start, end)
+        while position >= 0:
+            # The match must be a whole string.
+            offset = position - start
+            index = bisect.bisect_left(offsets, offset, 0, self.count)
+            if index < self.count and offsets[index] == offset and \
+                    offsets[index + 1] - offset == len(encoded):
+                return index
+            position = self.raw.find(encoded, position + 1, end)
+        return None
+
+    def get_record(self, index):
+        """Returns the ```(name_id, status, mtime, first_tag, tags_count)```
+        record of the ticket ```index```.
+        """
+        return RECORD.unpack_from(self.records, index * RECORD.size)
+
+    def get_mtime(self, index):
+        """Returns the mtime of the ticket ```index```."""
+        return MTIME.unpack_from(self.records,
+                                 index * RECORD.size + MTIME_OFFSET)[0]
+
+    def get_mtime_order(self):
+        """Returns the indexes of the tickets sorted by mtime, then by
+        name.
+        """
+        if self.mtime_order is None:
+            # Files written before version 2.
+            self.mtime_order = sorted(
+                range(self.count),
+                key=lambda i: (self.get_mtime(i),
+                               self.get_string(self.get_record(i)[0]))
+            )
+        return self.mtime_order
+
+    def find_mtime_range(self, since=None, until=None):
+        """Find the tickets modified in the given period by bisecting the
+        mtime order.
+
+        :param since: if given, the tickets must have been modified at this
+                      time or later.
+        :param until: if given, the tickets must have been modified before
+                      this time.
+        :return: the slice of ```get_mtime_order()``` holding these
+                 tickets.
+        """
+        order = self.get_mtime_order()
+
+        def bisect_mtime(mtime):
+            # Returns the position of the first ticket modified at or after
+            # ```mtime```.
+            low, high = 0, len(order)
+            while low < high:
+                middle = (low + high) // 2
+                if self.get_mtime(order[middle]) < mtime:
+                    low = middle + 1
+                else:
+                    high = middle
+            return low
+
+        start = 0 if since is None else bisect_mtime(since)
+        stop = len(order) if until is None else bisect_mtime(until)
+        return slice(start, max(start, stop))
+
+    def get_ticket(self, index):
+        """Returns the ```MetaTicket``` of the ticket ```index```."""
+        name_id, status, mtime, first_tag, tags_count = self.get_record(index)
+        tags = [self.get_string(self.tag_ids[i])
+                for i in range(first_tag, first_tag + tags_count)]
+        return MetaTicket(self.get_string(name_id),
+                          MetaTicket.VALID_STATUS[status], tags, mtime)
+
+    def get_tickets(self):
+        """Decode every ticket.
+
+        :return: the list of every ```MetaTicket```, in file order.
+        """
+        strings = self.get_strings()
+        statuses = MetaTicket.VALID_STATUS
+        tag_ids = self.tag_ids
+        tickets = []
+        for name_id, status, mtime, first_tag, tags_count in \
+                self.iter_records():
+            tags = [strings[tag_ids[i]]
+                    for i in range(first_tag, first_tag + tags_count)]
+            tickets.append(MetaTicket(strings[name_id], statuses[status],
+                                      tags, mtime))
+        return tickets
@@ -0,0 +1,86 @@
+"""Binary caches of data derived from repository files.
+
+Caches are stored in the ".pyticket/cache" directory, which is ignored by
+git. A cache entry is only used if the files it has been computed from didn't
+change since it has been written.
+
+Cached values are serialized with ```marshal```, so they must be made of
+builtin types only. Unlike ```pickle```, loading a forged cache file cannot
+execute code.
+"""
+import json
+import marshal
+import os
+import os.path
+
+
+def get_cache_directory(directory):
+    """Returns the cache directory of the given ".pyticket" directory,
+    creating it if needed.
+    """
+    path = directory + "/cache"
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+        with open(path + "/.gitignore", "w+") as f:
+            f.write("*\n")
+    return path
+
+
+def get_file_key(path):
+    """Returns a key identifying the current version of the given file: its
+    size, modification time and inode number.
+
+    :param path: the file path, or a file descriptor of the opened file.
+    """
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def encode_key(key):
+    """Returns the header line identifying a cache entry key."""
+    return json.dumps(key).encode("utf-8") + b"\n"
+
+
+def read_cache(path, key):
+    """Read a cache entry.
+
+    :param path: the cache file path.
+    :param key: the key the cache entry must have been written with.
+    :return: the cached value, or ```None``` if the cache file doesn't exist,
+             has been written with another key or is corrupted.
+    """
+    try:
+        with open(path, "rb") as f:
+            # The key is checked before loading the value.
+            if f.readline() != encode_key(key):
+                return None
+            return marshal.loads(f.read())
+    except Exception:
+        return None
+
+
+def write_cache(path, key, value):
+    """Write a cache entry.
+
+    The entry is written in a temporary file moved over the previous entry,
+    so a reader never sees a partially written entry. Failing to write the
+    cache is not an error.
+
+    :param path: the cache file path.
+    :param key: the key identifying the value.
+    :param value: the value to cache.
+    """
+    import tempfile
+
+    directory = os.path.dirname(path)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(encode_key(key))
+            f.write(marshal.dumps(value))
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
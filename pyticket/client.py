@@ -0,0 +1,71 @@
+"""Client of the pyticket daemon (see ```pyticket.server```).
+
+This module is imported by every pyticket command, so it must stay cheap to
+import.
+"""
+import json
+import os
+
+from pyticket import PyticketException
+
+# Commands executed by the daemon.
+FORWARDED_COMMANDS = [
+    "list", "table", "close", "reopen", "rename", "works-on", "current",
+    "release", "add-tags", "remove-tags", "compact", "search", "archive"
+]
+
+# Commands executed by the daemon only when given the option preventing them
+# to use the terminal.
+FORWARDED_WITH_OPTION = {
+    "create": "--no-edit",
+    "delete": "--force",
+}
+
+
+def get_socket_path(root):
+    """Returns the path of the daemon socket of the given repository root."""
+    return root + "/.pyticket/socket"
+
+
+def can_forward(argv):
+    """Check if the given command line can be executed by the daemon.
+
+    :param argv: the command line arguments, without the program name.
+    :return: ```True``` if the command doesn't need the terminal.
+    """
+    if not argv:
+        return False
+    if argv[0] in FORWARDED_COMMANDS:
+        return True
+    option = FORWARDED_WITH_OPTION.get(argv[0])
+    return option is not None and option in argv[1:]
+
+
+def forward(argv, root="."):
+    """Execute a command line by the daemon serving the repository.
+
+    :param argv: the command line arguments, without the program name.
+    :param root: the repository root.
+    :return: the ```(output, error)``` answer of the daemon, or ```None``` if
+             no daemon is serving the repository.
+    :raises PyticketException: the connection to the daemon has been lost.
+    """
+    path = get_socket_path(root)
+    if not os.path.exists(path):
+        return None
+    # Only imported when a daemon may be running.
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        request = json.dumps({"argv": argv}) + "\n"
+        client.sendall(request.encode("utf-8"))
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("r", encoding="utf-8") as f:
+            answer = f.readline()
+    if not answer.endswith("\n"):
+        raise PyticketException("connection to the pyticket daemon lost")
+    answer = json.loads(answer)
+    return answer["output"], answer["error"]
@@ -1,7 +1,12 @@
 """
 Command line management.
+
+Commands are declared statically: their arguments are given when building
+them, and their callbacks can be given as a "module:function" string so the
+module is only imported when the command is executed.
 """
-import inspect
+import importlib
+
 from pyticket import PyticketException
 
 
@@ -30,31 +35,32 @@ class option:
 
 
 class command:
-    def __init__(self, name, description, callback=None, options=[]):
+    """A pyticket command.
+
+    :param name: the command name.
+    :param description: the command description.
+    :param callback: the function executing the command, or the
+                     "module:function" path of this function. It is called
+                     with the options dictionary and the arguments as keyword
+                     arguments.
+    :param options: the list of the command's ```option```.
+    :param args: the list of the command's ```argument```. Optional arguments
+                 must be the last ones.
+    """
+    def __init__(self, name, description, callback=None, options=[],
+                 args=[]):
         self.name = name
         self.description = description
         self.callback = callback
-        self.args = command.__args_of_callback(callback) if callback else []
+        self.args = args
         self.options = options
 
-    @staticmethod
-    def __args_of_callback(callback):
-        parameters = inspect.signature(callback).parameters
-        annotations = callback.__annotations__
-        args = []
-        for arg in parameters.items():
-            arg = arg[1]
-            if arg.name not in annotations:
-                continue
-            doc = annotations[arg.name]
-            if arg.default != inspect._empty and arg.default:
-                raise PyticketException(
-                    "only 'None' default parameter value is authorized for "
-                    "commands callbacks"
-                )
-            optional = True if not arg.default else False
-            args += [argument(arg.name, doc, optional)]
-        return args
+    def get_callback(self):
+        """Returns the command callback, importing its module if needed."""
+        if isinstance(self.callback, str):
+            module, function = self.callback.split(":")
+            self.callback = getattr(importlib.import_module(module), function)
+        return self.callback
 
     def find_option(self, name):
         for opt in self.options:
@@ -92,9 +98,7 @@ class command:
                 raise PyticketException("unexpected token '{}'".format(opt))
         return options
 
-    def try_execute(self, argv):
-        if argv[0] != self.name:
-            return False
+    def execute(self, argv):
         if not self.callback:
             raise PyticketException(
                 "command '{}' is not implemented".format(self.name)
@@ -115,8 +119,7 @@ class command:
             )
         rest = argv[1 + current_arg:]
         options = self.parse_options(rest)
-        self.callback(options, **args)
-        return True
+        self.get_callback()(options, **args)
 
     def usage(self):
         def do_arg_str(arg):
@@ -134,15 +137,29 @@ class command:
                 opt.usage()
 
 
+def command_table(commands):
+    """Returns the dictionary associating command names to the given
+    commands, in the given order.
+    """
+    return {cmd.name: cmd for cmd in commands}
+
+
 def print_usage(prg_name, commands):
     print("{} <command> <args...>".format(prg_name))
-    for cmd in commands:
+    for cmd in commands.values():
         print("")
         cmd.usage()
 
 
 def execute_argv(commands, argv):
-    for cmd in commands:
-        if cmd.try_execute(argv):
-            return
-    raise PyticketException("command '{}' is not valid".format(argv[0]))
+    """Execute a command line.
+
+    :param commands: the commands table (see ```command_table```).
+    :param argv: the command line arguments, starting by the command name.
+    :raises PyticketException: the command doesn't exist or its arguments
+                               are invalid.
+    """
+    cmd = commands.get(argv[0])
+    if cmd is None:
+        raise PyticketException("command '{}' is not valid".format(argv[0]))
+    cmd.execute(argv)
@@ -1,24 +1,44 @@
-import subprocess
+"""Commands callbacks.
+
+Modules only needed by some commands (editor and git calls, markdown
+rendering...) are imported by these commands, to keep the startup of the
+other ones fast.
+"""
 import sys
+import operator
 import os
-import shutil
 import time
-import re
-
-import vmd
 
 from pyticket import PyticketException, get_extra
+from pyticket import query
 from pyticket import utils as utils
-from pyticket import git
 from pyticket.repository import Repository
 from pyticket.configuration import Configuration
 
+# Repository answering the commands when they are run by a "pyticket serve"
+# daemon (see ```pyticket.server```).
+served_repository = None
+
+
+def open_repository(lazy=False):
+    """Returns the repository of the current directory, or the repository
+    loaded by the daemon if the command is run by ```pyticket serve```.
+
+    :param lazy: if ```True```, the repository storage is loaded lazily (see
+                 ```Repository```).
+    """
+    if served_repository is not None:
+        return served_repository
+    if lazy:
+        return Repository(".", lazy=True)
+    return Repository(".")
+
+
+def create_ticket(options, ticket_name, template=None):
+    import subprocess
 
-def create_ticket(options,
-                  ticket_name: "The ticket name",
-                  template: "The template to use" = None):
     tags = options["tags"].split(",") if "tags" in options else []
-    r = Repository(".")
+    r = open_repository(lazy=True)
     r.create_ticket(ticket_name, "opened", tags)
 
     if template:
@@ -27,74 +47,112 @@ def create_ticket(options,
 
     if "no-edit" in options:
         if not template:
-            open(r.get_ticket_content_path(ticket_name), "w+").close()
+            path = r.get_ticket_content_path(ticket_name, create=True)
+            open(path, "w+").close()
     else:
         config = Configuration.load(utils.get_home_path())
         subprocess.call([
             config.values["editor"],
-            r.get_ticket_content_path(ticket_name)
+            r.get_ticket_content_path(ticket_name, create=True)
         ])
+        r.index_ticket_contents([ticket_name])
 
 
-def edit_ticket(argv, ticket_name: "The ticket name"):
-    r = Repository(".")
+def edit_ticket(argv, ticket_name):
+    import subprocess
+
+    r = open_repository(lazy=True)
+    r.unpack_archived(ticket_name)
     config = Configuration.load(utils.get_home_path())
     subprocess.call([
-        config.values["editor"], r.get_ticket_content_path(ticket_name)
+        config.values["editor"],
+        r.get_ticket_content_path(ticket_name, create=True)
     ])
     r.update_ticket_mtime(ticket_name)
+    r.index_ticket_contents([ticket_name])
 
 
-def show_ticket(options, ticket_name: "The ticket name"):
-    def add_indent(content, level):
-        if level == 0:
-            return content
-        content = add_indent(content, level - 1)
-        return re.sub("^#", "\g<0>#", content, flags=re.MULTILINE)
+def show_ticket(options, ticket_name):
+    from pyticket.render import RenderCache, SubtreeRenderer
 
-    def get_ticket_content_rec(repository, ticket_name, depth):
-        content = ""
-        if repository.has_ticket_content(ticket_name):
-            content = repository.read_ticket_content(ticket_name)
-        else:
-            # If there is no content, we generate a really simple one.
-            content = "# {}".format(ticket_name)
-        content = add_indent(content, depth)
-
-        # Append childs content
-        childs = repository.get_ticket_childs(ticket_name)
-        for child in childs:
-            child_content = get_ticket_content_rec(
-                repository, child.name, depth + 1
-            )
-            content = content + "\n" + child_content
-        return content
-
-    class parser_args:
-        tab_spaces = 4
-    r = Repository(".")
-
-    ticket_content = get_ticket_content_rec(r, ticket_name, 0)
-
-    parser = vmd.build_parser(parser_args)
-    config = vmd.load_config()
-    config.formatting.indent_paragraph_first_line = False
-    config.formatting.align_content_with_headings = True
-    writer = vmd.create_display_writer(sys.stdout)
-    renderer = vmd.build_render(writer, config)
-    doc = parser.parse(ticket_content)
-
-    renderer.render_document(doc)
+    r = open_repository(lazy=True)
+    renderer = SubtreeRenderer(sys.stdout, RenderCache(r.repository))
+    renderer.render_subtree(r, ticket_name)
     print("")
 
 
-def list_tickets(options,
-                 ticket_name: "List given ticket and its childs" = None):
+def get_tags_filters(options):
+    """Returns the (tags, any_tags, without_tags) filters given by the
+    "--tags", "--any-tags" and "--without-tags" options.
+    """
+    filters = []
+    for name in ["tags", "any-tags", "without-tags"]:
+        filters.append(options[name].split(",") if name in options else None)
+    return tuple(filters)
+
+
+def get_time_filters(options):
+    """Returns the (since, until) filters given by the "--since" and
+    "--until" options.
+    """
+    filters = []
+    for name in ["since", "until"]:
+        filters.append(utils.parse_time(options[name]) if name in options
+                       else None)
+    return tuple(filters)
+
+
+def get_query_plan(options):
+    """Compile the query given by the "--query" option, combined with the
+    tags and time filters options.
+
+    :return: the ```query.Plan``` of the query.
+    :raises PyticketException: the query or a filter is invalid.
+    """
+    tags, any_tags, without_tags = get_tags_filters(options)
+    since, until = get_time_filters(options)
+    terms = [query.Tag(tag) for tag in tags or ()]
+    if any_tags:
+        terms.append(query.Or([query.Tag(tag) for tag in any_tags]))
+    terms += [query.Not(query.Tag(tag)) for tag in without_tags or ()]
+    if since is not None:
+        terms.append(query.Mtime(">=", since, options["since"]))
+    if until is not None:
+        terms.append(query.Mtime("<", until, options["until"]))
+    if "query" in options:
+        terms.append(query.parse(options["query"]))
+    return query.compile_query(terms[0] if len(terms) == 1
+                               else query.And(terms))
+
+
+def explain_query(r, plan, root, statuses, elapsed):
+    """Print how a query is answered, and the time needed to run it.
+
+    :param r: the repository.
+    :param plan: the ```query.Plan``` of the query.
+    :param root: the root ticket given to the plan, if any.
+    :param statuses: the statuses the plan is run with, one after the other.
+    :param elapsed: the time needed to parse and compile the query.
+    """
+    print("query: {}".format(plan))
+    print("compiled in {:.3f}ms".format(elapsed * 1000))
+    for status in statuses:
+        print("{}:".format(status or "tickets"))
+        for line in plan.explain(r, root, status):
+            print("  " + line)
+        start = time.perf_counter()
+        count = sum(1 for _ in plan.iter_tickets(r, root, status))
+        print("  {} tickets found in {:.3f}ms".format(
+            count, (time.perf_counter() - start) * 1000
+        ))
+
+
+def list_tickets(options, ticket_name=None):
     def print_ticket(working, ticket):
         spaces = "".join([" " for _ in ticket.name if _ == "."])
         print("  {} {}{}".format("*" if working else " ", spaces, ticket.name))
 
-    r = Repository(".")
+    r = open_repository(lazy=True)
 
     status = None
     if "opened" in options:
@@ -102,33 +160,68 @@ def list_tickets(options,
     if "closed" in options:
         status = "closed"
 
-    tags = None
-    if "tags" in options:
-        tags = options["tags"].split(",")
+    start = time.perf_counter()
+    plan = get_query_plan(options)
+    if "explain" in options:
+        explain_query(r, plan, ticket_name,
+                      [c for c in ["opened", "closed"] if status in (None, c)],
+                      time.perf_counter() - start)
+        return
 
-    tickets = r.list_tickets(root=ticket_name, status=status, tags=tags)
-    categories = (
-        ("opened", [t for t in tickets if t.status == "opened"]),
-        ("closed", [t for t in tickets if t.status == "closed"])
-    )
+    # Tickets are printed as they are found, one status after the other.
+    categories = [
+        (category, plan.iter_tickets(r, ticket_name, category)
+         if status in (None, category) else [])
+        for category in ["opened", "closed"]
+    ]
 
-    for (status, tickets) in categories:
-        print(status + ":")
-        for ticket in sorted(tickets, key=lambda t: t.name):
-            print_ticket(r.is_working_ticket(ticket.name), ticket)
+    working = r.get_working_ticket_name()
+    for (category, tickets) in categories:
+        print(category + ":")
+        for ticket in tickets:
+            print_ticket(ticket.name == working, ticket)
 
 
-def close_ticket(options, name: "The ticket name"):
-    r = Repository(".")
+def search(options, terms):
+    r = open_repository(lazy=True)
+    count = int(options.get("count", 20))
+    for name, score in r.search_tickets(terms, count if count > 0 else None):
+        print("  {:8.3f}  {}".format(score, name))
+
+
+def grep(options, pattern, ticket=None):
+    from pyticket.grep import iter_matches
+
+    status = None
+    if "opened" in options:
+        status = "opened"
+    elif "closed" in options:
+        status = "closed"
+
+    plan = get_query_plan(options)
+    r = open_repository(lazy=True)
+
+    names = None
+    if ticket is not None or status is not None or not plan.selects_all():
+        # Only read the contents of the selected tickets.
+        names = [t.name for t in plan.iter_tickets(r, ticket, status)]
+    jobs = int(options["jobs"]) if "jobs" in options else None
+    for name, line_number, line in iter_matches(
+            r.contents, pattern, names, "ignore-case" in options, jobs):
+        print("{}:{}: {}".format(name, line_number, line))
+
+
+def close_ticket(options, name):
+    r = open_repository()
     r.switch_ticket_status(name, "closed")
 
 
-def reopen_ticket(options, name: "The ticket name"):
-    r = Repository(".")
+def reopen_ticket(options, name):
+    r = open_repository(lazy=True)
     r.switch_ticket_status(name, "opened")
 
 
-def delete_ticket(options, name: "The ticket name"):
+def delete_ticket(options, name):
     force = "force" in options
     remove = True
     if not force:
@@ -138,23 +231,22 @@ def delete_ticket(options, name: "The ticket name"):
         )
         remove = answer == "Y" or answer == "y" or answer == ""
     if remove:
-        r = Repository(".")
+        r = open_repository()
         r.delete_ticket(name)
 
 
-def rename_ticket(options, name: "The ticket name",
-                  new_name: "The new ticket name"):
-    r = Repository(".")
+def rename_ticket(options, name, new_name):
+    r = open_repository()
     r.rename_ticket(name, new_name)
 
 
-def works_on(options, name: "The ticket to work on"):
-    r = Repository(".")
+def works_on(options, name):
+    r = open_repository(lazy=True)
     r.set_working_ticket(name)
 
 
 def current(options):
-    r = Repository(".")
+    r = open_repository(lazy=True)
     working = r.get_working_ticket()
     if working is None:
         print("No working ticket")
@@ -163,23 +255,33 @@ def current(options):
 
 
 def release(options):
-    r = Repository(".")
+    r = open_repository(lazy=True)
     r.set_working_ticket(None)
 
 
-def configure(options,
-              what: "Which configuration key to configure",
-              value: "Key value"):
+def configure(options, what, value):
     config = Configuration.load(utils.get_home_path())
     config.set_value(what, value)
     config.save(utils.get_home_path())
 
 
-def init(options, directory: "The pyticket repository directory"):
-    Repository(directory, create=True)
+def init(options, directory):
+    if "storage" in options:
+        Repository(directory, create=True, storage=options["storage"])
+    else:
+        Repository(directory, create=True)
+
+
+def convert(options, storage):
+    from pyticket import migrations
+
+    if not os.path.isdir(".pyticket"):
+        raise PyticketException(". is not a pyticket repository")
+    migrations.apply_migrations(".pyticket")
+    migrations.convert_storage(".pyticket", storage)
 
 
-def table(options, ticket: "Show only this ticket tree" = None):
+def table(options, ticket=None):
     HEADER = ["Ticket", "Status", "Last update", "Tags"]
 
     def get_terminal_width():
@@ -220,10 +322,10 @@ def table(options, ticket: "Show only this ticket tree" = None):
             formatted_table.append(format_row(table[i]))
         return formatted_table
 
-    sorted_field = 2
+    sort_key = operator.attrgetter("mtime")
     sorted_reverse = True
     if "sorted-name" in options:
-        sorted_field = 0
+        sort_key = operator.attrgetter("name")
         sorted_reverse = False
 
     count = int(options.get("count", -1))
@@ -234,19 +336,27 @@ def table(options, ticket: "Show only this ticket tree" = None):
     elif "closed" in options:
         status = "closed"
 
-    tags = []
-    if "tags" in options:
-        tags = options["tags"].split(",")
+    start = time.perf_counter()
+    plan = get_query_plan(options)
 
-    r = Repository(".")
+    r = open_repository(lazy=True)
 
-    table = [[t.name, t.status, t.mtime, t.tags]
-             for t in r.list_tickets(ticket, status, tags)]
+    if "explain" in options:
+        explain_query(r, plan, ticket, [status], time.perf_counter() - start)
+        return
 
-    table = sorted(table,
-                   key=lambda row: row[sorted_field], reverse=sorted_reverse)
+    tickets = plan.iter_tickets(r, ticket, status)
     if count > 0:
-        table = table[:count]
+        # Only keep the shown tickets while selecting them.
+        import heapq
+
+        if sorted_reverse:
+            tickets = heapq.nlargest(count, tickets, key=sort_key)
+        else:
+            tickets = heapq.nsmallest(count, tickets, key=sort_key)
+    else:
+        tickets = sorted(tickets, key=sort_key, reverse=sorted_reverse)
+    table = [[t.name, t.status, t.mtime, t.tags] for t in tickets]
 
     formatted_table = format_table(table)
     sizes = get_table_cols_min_size(formatted_table)
@@ -258,19 +368,31 @@ def table(options, ticket: "Show only this ticket tree" = None):
     print("-" * sum(sizes))
 
 
-def add_tags(options, ticket: "The ticket to modify",
-             tags: "The tags to add to the ticket"):
-    r = Repository(".")
+def compact(options):
+    r = open_repository()
+    r.compact()
+
+
+def archive(options, ticket=None):
+    r = open_repository()
+    names = r.archive_tickets(ticket)
+    print("{} tickets archived".format(len(names)))
+
+
+def add_tags(options, ticket, tags):
+    r = open_repository(lazy=True)
     r.add_tags(ticket, tags.split(","))
 
 
-def remove_tags(options, ticket: "The ticket to modify",
-                tags: "The tag to remove from the ticket"):
-    r = Repository(".")
+def remove_tags(options, ticket, tags):
+    r = open_repository(lazy=True)
     r.remove_tags(ticket, tags.split(","))
 
 
 def install_git(options):
+    import shutil
+    from pyticket import git
+
     def install_hook(name):
         print("Installing '.git/hooks/{}'...".format(name))
         shutil.copy(get_extra("git-hooks/{}".format(name)), ".git/hooks/")
@@ -0,0 +1,142 @@
+"""Regular expression search in the ticket contents files.
+
+Unlike ```pyticket.search```, no index is used: every candidate content file
+is read. Files are split in chunks read by a pool of processes, and the
+matches of a chunk are produced as soon as it has been read.
+"""
+import os
+import re
+
+from pyticket import PyticketException
+from pyticket import utils
+
+# Under this number of files, they are read by the calling process: starting
+# a pool would take longer.
+SERIAL_FILES = 64
+
+# Bounds of the number of files of a chunk.
+MIN_CHUNK_SIZE = 16
+MAX_CHUNK_SIZE = 512
+
+
+def compile_pattern(pattern, ignore_case=False):
+    """Compile a searched regular expression.
+
+    :raises PyticketException: the regular expression is invalid.
+    """
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    try:
+        return re.compile(pattern, flags)
+    except re.error as ex:
+        raise PyticketException(
+            "invalid regular expression '{}': {}".format(pattern, ex)
+        )
+
+
+def grep_file(regex, contents, name):
+    """Find the lines of a content file matching a compiled regular
+    expression.
+
+    :return: the list of the ```(name, line_number, line)``` of the matching
+             lines, line numbers starting at 1.
+    """
+    try:
+        with open(utils.get_content_path(contents, name), "r",
+                  encoding="utf-8", errors="replace") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return []
+    matches = []
+    line_number = 1
+    counted = 0
+    position = 0
+    while position <= len(content):
+        match = regex.search(content, position)
+        if match is None:
+            break
+        start = content.rfind("\n", 0, match.start()) + 1
+        end = content.find("\n", match.start())
+        if end < 0:
+            end = len(content)
+        line_number += content.count("\n", counted, start)
+        counted = start
+        matches.append((name, line_number, content[start:end]))
+        # Every line is reported once.
+        position = end + 1
+    return matches
+
+
+def grep_files(contents, names, pattern, ignore_case=False):
+    """Find the lines of content files matching a regular expression.
+
+    This is the task of the pool processes: its arguments and result are
+    sent between processes.
+
+    :param contents: the contents directory.
+    :param names: the names of the tickets whose content is searched.
+    :param pattern: the regular expression.
+    :param ignore_case: if ```True```, the case is ignored.
+    :return: the list of the ```(name, line_number, line)``` of the matching
+             lines.
+    """
+    regex = compile_pattern(pattern, ignore_case)
+    matches = []
+    for name in names:
+        matches += grep_file(regex, contents, name)
+    return matches
+
+
+def iter_matches(contents, pattern, names=None, ignore_case=False,
+                 jobs=None):
+    """Iterate over the lines of content files matching a regular
+    expression.
+
+    :param contents: the contents directory.
+    :param pattern: the regular expression.
+    :param names: the names of the tickets whose content is searched. If
+                  ```None```, every content file is searched.
+    :param ignore_case: if ```True```, the case is ignored.
+    :param jobs: the number of processes reading the files, the number of
+                 processors by default.
+    :return: an iterator over the ```(name, line_number, line)``` of the
+             matching lines. The lines of a file are produced in order, but
+             the files are produced as they are read.
+    :raises PyticketException: the regular expression is invalid.
+    """
+    regex = compile_pattern(pattern, ignore_case)
+    if names is None:
+        names = sorted([entry.name
+                        for entry in utils.iter_content_files(contents)])
+    else:
+        names = list(names)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(names) < SERIAL_FILES:
+        return (match for name in names
+                for match in grep_file(regex, contents, name))
+    return iter_pool_matches(contents, pattern, names, ignore_case, jobs)
+
+
+def iter_pool_matches(contents, pattern, names, ignore_case, jobs):
+    """Iterate over the matches of ```iter_matches```, reading the files
+    with a pool of ```jobs``` processes.
+    """
+    # Only imported when the files are read by several processes.
+    import concurrent.futures
+
+    # Several chunks per process balance the work, while small enough
+    # chunks give the first matches early.
+    chunk_size = max(MIN_CHUNK_SIZE,
+                     min(MAX_CHUNK_SIZE, len(names) // (jobs * 8)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(grep_files, contents, names[i:i + chunk_size],
+                        pattern, ignore_case)
+            for i in range(0, len(names), chunk_size)
+        ]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                yield from future.result()
+        finally:
+            # The iteration may have been stopped early.
+            for future in futures:
+                future.cancel()
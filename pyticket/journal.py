@@ -0,0 +1,85 @@
+"""Append-only journal of repository mutations."""
+import json
+import os
+import os.path
+
+from pyticket import utils
+from pyticket.cache import get_file_key
+
+
+class Journal:
+    """An append-only log of the mutations applied to a repository since its
+    tickets file was last compacted.
+
+    Every record is a JSON object written on its own line. A record always
+    contains an "op" field naming the mutation (see ```pyticket.storage```),
+    the other fields depend on the operation.
+
+    The first line of the journal is a ```{"generation": <n>}``` header
+    giving the generation of the tickets file the records apply to. A
+    journal without header applies to generation 0.
+
+    :param path: the journal file path.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, records):
+        """Append the given records at the end of the journal, and wait for
+        them to be written on the disk.
+
+        :param records: the list of records to append.
+        """
+        if not records:
+            return
+        data = "".join([json.dumps(record) + "\n" for record in records])
+        with open(self.path, "a") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read(self):
+        """Read every record of the journal.
+
+        A last line that doesn't end with a newline has been torn by an
+        interrupted write: it is ignored.
+
+        :return: the ```(generation, records)``` of the journal, records
+                 being in writing order.
+        """
+        if not os.path.isfile(self.path):
+            return 0, []
+        with open(self.path, "r") as f:
+            content = f.read()
+        lines = content.split("\n")
+        # The last element is either empty or a torn record.
+        records = [json.loads(line) for line in lines[:-1] if line]
+        if records and "op" not in records[0]:
+            return records[0]["generation"], records[1:]
+        return 0, records
+
+    def key(self):
+        """Returns the key of the current journal file (see
+        ```pyticket.cache.get_file_key```), or ```None``` if it doesn't
+        exist.
+        """
+        try:
+            return get_file_key(self.path)
+        except FileNotFoundError:
+            return None
+
+    def size(self):
+        """Returns the journal size in bytes."""
+        if not os.path.isfile(self.path):
+            return 0
+        return os.path.getsize(self.path)
+
+    def reset(self, generation):
+        """Replace the journal by an empty one.
+
+        :param generation: the generation of the tickets file the next
+                           records will apply to.
+        """
+        utils.write_file_atomically(
+            self.path, json.dumps({"generation": generation}) + "\n"
+        )
@@ -3,8 +3,14 @@ import os.path
 import shutil
 import time
 
+from pyticket import storage
+from pyticket import utils
 from pyticket.ticket import MetaTicket
 
+# Number of content files moved between two progress messages of the
+# contents sharding migration.
+SHARDING_BATCH_SIZE = 10000
+
 
 def working_ticket_migration(directory):
     print("Applying working ticket migration...")
@@ -80,14 +86,90 @@ def tickets_json_migration(directory):
         f.write(json.dumps(json_data))
 
 
+def storage_migration(directory):
+    print("Applying storage migration...")
+    storage.set_storage_name(directory, storage.JsonStorage.NAME)
+
+
+def contents_sharding_migration(directory):
+    """Move the content files from the contents directory to the
+    subdirectories given by ```utils.get_content_path```.
+
+    Files are moved to a new contents directory, which replaces the previous
+    one once it is empty, as a ticket could be named like a subdirectory.
+    If the migration is interrupted, applying it again moves the remaining
+    files.
+    """
+    print("Applying contents sharding migration...")
+    contents = directory + "/contents"
+    sharded = directory + "/contents.sharded"
+    if os.path.isdir(contents):
+        os.makedirs(sharded, exist_ok=True)
+        with os.scandir(contents) as entries:
+            names = [entry.name for entry in entries if entry.is_file()]
+        created = set()
+        for i in range(0, len(names), SHARDING_BATCH_SIZE):
+            for name in names[i:i + SHARDING_BATCH_SIZE]:
+                path = utils.get_content_path(sharded, name)
+                shard = os.path.dirname(path)
+                if shard not in created:
+                    os.makedirs(shard, exist_ok=True)
+                    created.add(shard)
+                os.rename(contents + "/" + name, path)
+            print("{} of {} content files moved".format(
+                min(i + SHARDING_BATCH_SIZE, len(names)), len(names)
+            ))
+        os.rmdir(contents)
+    os.rename(sharded, contents)
+
+
+def sqlite_hierarchy_index_migration(directory):
+    """Add the index of the hierarchy order to SQLite storages."""
+    if storage.get_storage_name(directory) != storage.SqliteStorage.NAME:
+        return
+    print("Applying SQLite hierarchy index migration...")
+    import sqlite3
+
+    connection = sqlite3.connect(directory + "/tickets.sqlite")
+    with connection:
+        connection.execute(storage.SqliteStorage.HIERARCHY_INDEX)
+    connection.close()
+
+
 MIGRATIONS = [
     working_ticket_migration,
     tickets_meta_files_migration,
     tickets_mtime_migration,
-    tickets_json_migration
+    tickets_json_migration,
+    storage_migration,
+    contents_sharding_migration,
+    sqlite_hierarchy_index_migration
 ]
 
 
+def convert_storage(directory, name):
+    """Convert the tickets storage of the given directory to another storage
+    engine.
+
+    :param directory: the ".pyticket" directory.
+    :param name: the name of the new storage engine.
+    :raises PyticketException: there is no such storage engine.
+    """
+    storage.get_storage_class(name)
+    previous = storage.open_storage(directory)
+    if previous.NAME == name:
+        return
+    print("Converting {} storage to {}...".format(previous.NAME, name))
+    records = [{"op": "create", "ticket": ticket.to_json()}
+               for ticket in previous.tickets.values()]
+    converted = storage.create_storage(directory, name)
+    for record in records:
+        converted.apply(record)
+    converted.commit(records)
+    converted.compact()
+    previous.remove()
+
+
 def get_current_migration(directory):
     path = "{}/migration".format(directory)
     if not os.path.exists(path):
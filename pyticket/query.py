@@ -0,0 +1,377 @@
+"""Tickets query language.
+
+A query combines terms with "and", "or", "not" and parentheses, adjacent
+terms being combined with "and":
+
+- ```status:<status>```: the ticket has the given status ;
+- ```tag:<tag>```: the ticket has the given tag ;
+- ```name:<pattern>```: the ticket name matches the given shell-style
+  pattern, like ```core.*``` ;
+- ```mtime<operator><time>```: the ticket modification time compares to the
+  given time (see ```utils.parse_time```), the operator being one of ">",
+  ">=", "<" or "<=".
+
+For example: ```status:opened and tag:bug and not tag:wontfix and
+name:core.* and mtime>2026-01-01```.
+
+A query is parsed once into an expression, then compiled into a ```Plan```:
+the terms the storage engines index are given to ```Repository.iter_tickets```,
+which answers them using its most selective index, and the other terms are
+checked on the tickets it selects.
+"""
+import collections
+import fnmatch
+import operator
+import re
+
+from pyticket import PyticketException
+from pyticket import utils
+from pyticket.ticket import MetaTicket
+
+TOKEN = re.compile(r"\(|\)|[^\s()]+")
+
+TERM = re.compile(r"^(status|tag|name):(.+)$")
+
+MTIME_TERM = re.compile(r"^mtime(>=|<=|>|<)(.+)$")
+
+KEYWORDS = ("and", "or", "not", "(", ")")
+
+
+class Status:
+    """Match the tickets having the given status."""
+    def __init__(self, status):
+        if not MetaTicket.is_valid_status(status):
+            raise PyticketException(
+                "'{}' is an invalid status".format(status)
+            )
+        self.status = status
+
+    def match(self, ticket):
+        return ticket.status == self.status
+
+    def __str__(self):
+        return "status:" + self.status
+
+
+class Tag:
+    """Match the tickets having the given tag."""
+    def __init__(self, tag):
+        self.tag = tag
+
+    def match(self, ticket):
+        return self.tag in ticket.tags
+
+    def __str__(self):
+        return "tag:" + self.tag
+
+
+class Name:
+    """Match the tickets whose name matches the given shell-style
+    pattern.
+    """
+    def __init__(self, pattern):
+        self.pattern = pattern
+
+    def match(self, ticket):
+        return fnmatch.fnmatchcase(ticket.name, self.pattern)
+
+    def get_root(self):
+        """Returns the name of the ticket whose subtree holds every ticket
+        matching the pattern, or ```None``` if there is no such ticket.
+        """
+        literal = re.split(r"[*?\[]", self.pattern)[0]
+        if literal == self.pattern:
+            return literal
+        if "." in literal:
+            return literal[:literal.rindex(".")]
+        return None
+
+    def __str__(self):
+        return "name:" + self.pattern
+
+
+class Mtime:
+    """Match the tickets whose modification time compares to the given
+    time.
+
+    :param op: the comparison operator: ">", ">=", "<" or "<=".
+    :param time: the time, as a timestamp.
+    :param text: the time as written in the query, if any.
+    """
+    OPERATORS = {
+        ">": operator.gt,
+        ">=": operator.ge,
+        "<": operator.lt,
+        "<=": operator.le,
+    }
+
+    def __init__(self, op, time, text=None):
+        self.op = op
+        self.time = time
+        self.text = text if text is not None else repr(time)
+
+    def match(self, ticket):
+        return Mtime.OPERATORS[self.op](ticket.mtime, self.time)
+
+    def __str__(self):
+        return "mtime{}{}".format(self.op, self.text)
+
+
+class And:
+    """Match the tickets matched by every operand."""
+    def __init__(self, operands):
+        self.operands = operands
+
+    def match(self, ticket):
+        return all(operand.match(ticket) for operand in self.operands)
+
+    def __str__(self):
+        return "(" + " and ".join([str(o) for o in self.operands]) + ")"
+
+
+class Or:
+    """Match the tickets matched by at least one operand."""
+    def __init__(self, operands):
+        self.operands = operands
+
+    def match(self, ticket):
+        return any(operand.match(ticket) for operand in self.operands)
+
+    def __str__(self):
+        return "(" + " or ".join([str(o) for o in self.operands]) + ")"
+
+
+class Not:
+    """Match the tickets not matched by the operand."""
+    def __init__(self, operand):
+        self.operand = operand
+
+    def match(self, ticket):
+        return not self.operand.match(ticket)
+
+    def __str__(self):
+        return "not " + str(self.operand)
+
+
+def parse_term(token):
+    """Parse a query term.
+
+    :param token: the term, like "tag:bug".
+    :return: the term expression.
+    :raises PyticketException: the term is invalid.
+    """
+    match = TERM.match(token)
+    if match:
+        field, value = match.groups()
+        if field == "status":
+            return Status(value)
+        elif field == "tag":
+            return Tag(value)
+        return Name(value)
+    match = MTIME_TERM.match(token)
+    if match:
+        op, value = match.groups()
+        return Mtime(op, utils.parse_time(value), value)
+    raise PyticketException("invalid query term '{}'".format(token))
+
+
+def parse(text):
+    """Parse a query.
+
+    :param text: the query.
+    :return: the query expression.
+    :raises PyticketException: the query is invalid.
+    """
+    tokens = collections.deque(TOKEN.findall(text))
+    if not tokens:
+        raise PyticketException("empty query")
+
+    def parse_or():
+        operands = [parse_and()]
+        while tokens and tokens[0] == "or":
+            tokens.popleft()
+            operands.append(parse_and())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def parse_and():
+        operands = [parse_not()]
+        while tokens and tokens[0] not in ("or", ")"):
+            if tokens[0] == "and":
+                tokens.popleft()
+            operands.append(parse_not())
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def parse_not():
+        if not tokens:
+            raise PyticketException("unexpected end of query")
+        token = tokens.popleft()
+        if token == "not":
+            return Not(parse_not())
+        elif token == "(":
+            expression = parse_or()
+            if not tokens or tokens.popleft() != ")":
+                raise PyticketException("missing ')' in query")
+            return expression
+        elif token in KEYWORDS:
+            raise PyticketException("unexpected '{}' in query".format(token))
+        return parse_term(token)
+
+    expression = parse_or()
+    if tokens:
+        raise PyticketException(
+            "unexpected '{}' in query".format(tokens[0])
+        )
+    return expression
+
+
+class Plan:
+    """A compiled query: the filters given to ```Repository.iter_tickets```,
+    and the residual expression checked on the tickets it selects.
+
+    :param expression: the compiled expression.
+    """
+    def __init__(self, expression):
+        self.expression = expression
+        self.root = None
+        self.status = None
+        self.tags = []
+        self.any_tags = None
+        self.without_tags = []
+        self.since = None
+        self.until = None
+        self.residual = None
+
+    def get_filters(self, repository, root=None, status=None):
+        """Returns the keyword arguments of ```Repository.iter_tickets```.
+
+        :param repository: the ```Repository```.
+        :param root: the root ticket given by the command, if any. The root
+                     deduced from the name terms is only used without it,
+                     and if the repository has this ticket.
+        :param status: the status given by the command, if any.
+        :return: the filters, or ```None``` if no ticket can have both the
+                 given status and the status of the query.
+        """
+        if status and self.status and status != self.status:
+            return None
+        if root is None and self.root is not None and \
+                repository.has_ticket(self.root):
+            root = self.root
+        return {
+            "root": root,
+            "status": status or self.status,
+            "tags": self.tags or None,
+            "any_tags": self.any_tags,
+            "without_tags": self.without_tags or None,
+            "since": self.since,
+            "until": self.until,
+        }
+
+    def iter_tickets(self, repository, root=None, status=None):
+        """Iterate over the tickets of the repository matching the query.
+
+        :param repository: the ```Repository```.
+        :param root: if given, only iterate over this ticket and its
+                     descendants.
+        :param status: if given, only iterate over tickets with this status.
+        :return: an iterator over the matching tickets, in the order of
+                 ```Repository.iter_tickets```.
+        :raises PyticketException: the 'root' ticket doesn't exist or
+                                   'status' is invalid.
+        """
+        filters = self.get_filters(repository, root, status)
+        if filters is None:
+            return iter(())
+        tickets = repository.iter_tickets(**filters)
+        if self.residual is None:
+            return tickets
+        return (ticket for ticket in tickets if self.residual.match(ticket))
+
+    def explain(self, repository, root=None, status=None):
+        """Describe how the query is answered.
+
+        :param repository: the ```Repository```.
+        :param root: the root ticket given to ```iter_tickets```, if any.
+        :param status: the status given to ```iter_tickets```, if any.
+        :return: the list of the description lines.
+        """
+        filters = self.get_filters(repository, root, status)
+        if filters is None:
+            return ["no ticket can match"]
+        used = ["{}={}".format(name, value)
+                for name, value in sorted(filters.items())
+                if value is not None]
+        return [
+            "storage filters: {}".format(", ".join(used) or "none"),
+            "index: {}".format(repository.explain_tickets(**filters)),
+            "residual filter: {}".format(self.residual or "none"),
+        ]
+
+    def selects_all(self):
+        """Check the query selects every ticket."""
+        return not get_conjunction(self.expression)
+
+    def __str__(self):
+        if self.selects_all():
+            return "every ticket"
+        return str(self.expression)
+
+
+def get_conjunction(expression):
+    """Returns the list of the operands of the "and" expression, nested
+    "and" being flattened, or a list holding the expression itself.
+    """
+    if not isinstance(expression, And):
+        return [expression]
+    operands = []
+    for operand in expression.operands:
+        operands += get_conjunction(operand)
+    return operands
+
+
+def compile_query(expression):
+    """Compile a query expression.
+
+    Terms of the top-level "and" are given to the storage when it can
+    answer them with its indexes: one status, the tags, one "or" of tags,
+    the negated tags and the modification time bounds. The subtree holding
+    the tickets matched by a name pattern is also given to the storage, the
+    pattern itself being checked on the selected tickets, like every other
+    term.
+
+    :param expression: the expression returned by ```parse```.
+    :return: the ```Plan``` of the query.
+    """
+    plan = Plan(expression)
+    residual = []
+    for term in get_conjunction(expression):
+        if isinstance(term, Status) and plan.status is None:
+            plan.status = term.status
+        elif isinstance(term, Tag):
+            plan.tags.append(term.tag)
+        elif isinstance(term, Or) and plan.any_tags is None and \
+                all(isinstance(o, Tag) for o in term.operands):
+            plan.any_tags = [o.tag for o in term.operands]
+        elif isinstance(term, Not) and isinstance(term.operand, Tag):
+            plan.without_tags.append(term.operand.tag)
+        elif isinstance(term, Mtime):
+            if term.op in (">", ">="):
+                if plan.since is None or term.time > plan.since:
+                    plan.since = term.time
+            else:
+                # The storage excludes the "until" bound: "<=" terms give a
+                # larger bound, and are checked on the selected tickets.
+                until = term.time if term.op == "<" else term.time + 1
+                if plan.until is None or until < plan.until:
+                    plan.until = until
+            if term.op in (">", "<="):
+                residual.append(term)
+        else:
+            if isinstance(term, Name) and plan.root is None:
+                plan.root = term.get_root()
+            residual.append(term)
+    if len(residual) == 1:
+        plan.residual = residual[0]
+    elif residual:
+        plan.residual = And(residual)
+    return plan
@@ -0,0 +1,296 @@
+"""Rendering of ticket subtrees in the terminal.
+
+The ```show``` command renders a ticket followed by its descendants, the
+headings of every descendant being shifted by its depth below the shown
+ticket. Tickets are read, shifted and rendered one at a time, so the first
+ones are displayed before the next ones are read.
+
+The output is the one of the concatenated subtree contents, but for a
+content starting with text rather than a heading: it is no longer appended
+to the last paragraph of the previous ticket.
+
+The rendered output of every ticket can be kept in a ```RenderCache```. An
+entry is keyed by the content hash, the depth, the state left by the tickets
+rendered before (heading numbers, indentation), the terminal width and the
+renderer configuration, so only the modified tickets are rendered again.
+"""
+import hashlib
+import io
+import os
+import re
+
+from pyticket.cache import get_cache_directory, read_cache, write_cache
+
+HEADING = re.compile("^(?=#)", re.MULTILINE)
+
+# Heading appended to every parsed document, standing for the next ticket:
+# the parser writes the same text between them as between two concatenated
+# tickets.
+SENTINEL = "pyticket-next-ticket"
+
+# Version of the rendered output, to change when the rendering changes.
+RENDER_VERSION = 2
+
+TAB_SPACES = 4
+
+
+def shift_headings(content, depth):
+    """Shift the markdown headings of a content.
+
+    :param content: the content.
+    :param depth: the number of levels added to every heading.
+    :return: the shifted content.
+    """
+    if depth == 0:
+        return content
+    return HEADING.sub("#" * depth, content)
+
+
+def iter_subtree_contents(repository, name):
+    """Iterate over the contents of a ticket and of its descendants.
+
+    :param repository: the ```Repository```.
+    :param name: the ticket name.
+    :return: an iterator over the ```(name, depth, content)``` of the
+             subtree tickets, depth-first (see ```get_ticket_childs```).
+             ```depth``` is the number of levels below the given ticket, and
+             tickets without content have a simple one holding their name.
+    :raises PyticketException: the ticket doesn't exist.
+    """
+    # Raises an exception if the ticket doesn't exist.
+    repository.get_ticket(name)
+    root_depth = name.count(".")
+    names = repository.get_subtree_names(name)
+    for ticket_name, content in repository.read_contents(names):
+        if content is None:
+            content = "# {}".format(ticket_name)
+        yield ticket_name, ticket_name.count(".") - root_depth, content
+
+
+class RenderCache:
+    """Rendered tickets, stored in the "render" directory of the cache.
+
+    Every entry is a file named by the hash of its key. Reading an entry
+    updates its modification time, and the least recently used entries are
+    removed once the entries exceed ```max_size``` bytes.
+
+    :param directory: the ".pyticket" directory of the repository.
+    :param max_size: the maximum size of the entries, in bytes.
+    """
+    MAX_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, directory, max_size=MAX_SIZE):
+        self.path = get_cache_directory(directory) + "/render"
+        self.max_size = max_size
+        self.written = False
+        os.makedirs(self.path, exist_ok=True)
+
+    def get_entry_path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return self.path + "/" + digest
+
+    def get(self, key):
+        """Returns the value cached for the given key, or ```None```."""
+        path = self.get_entry_path(key)
+        value = read_cache(path, key)
+        if value is not None:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return value
+
+    def put(self, key, value):
+        """Cache a value, made of builtin types."""
+        write_cache(self.get_entry_path(key), key, value)
+        self.written = True
+
+    def evict(self):
+        """Remove the least recently used entries until the entries size is
+        under the limit.
+        """
+        if not self.written:
+            return
+        self.written = False
+        entries = []
+        total = 0
+        with os.scandir(self.path) as scanned:
+            for entry in scanned:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, entry.path, stat.st_size))
+                total += stat.st_size
+        if total <= self.max_size:
+            return
+        entries.sort()
+        for _, path, size in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            if total <= self.max_size:
+                break
+
+
+class SubtreeRenderer:
+    """Render markdown documents one after the other, as parts of a single
+    document.
+
+    Headings are numbered across documents, like if they were
+    concatenated.
+
+    :param output: the output stream.
+    :param cache: the ```RenderCache``` of the rendered documents, if any.
+    """
+    def __init__(self, output, cache=None):
+        # Only imported by the commands rendering tickets.
+        import vmd
+
+        class parser_args:
+            tab_spaces = TAB_SPACES
+
+        self.output = output
+        self.cache = cache
+        self.parser = vmd.build_parser(parser_args)
+        config = vmd.load_config()
+        config.formatting.indent_paragraph_first_line = False
+        config.formatting.align_content_with_headings = True
+        self.writer = vmd.create_display_writer(output)
+        self.renderer = vmd.build_render(self.writer, config)
+        # The number of the last top-level heading, and the
+        # ```[level, number, last_subheading]``` of the headings a new
+        # heading can be a subheading of, by increasing level.
+        self.heading_count = 0
+        self.headings = []
+        # The text separating the previous document from the next one.
+        self.separator = []
+        self.settings = None
+        if cache is not None:
+            self.settings = [RENDER_VERSION, vmd.VERSION, TAB_SPACES,
+                             self.writer.columns,
+                             get_config_hash(config.paths)]
+
+    def number_headings(self, document):
+        """Number the headings of a document, following the headings of
+        the previous documents.
+        """
+        for heading in document.headings:
+            while self.headings and self.headings[-1][0] >= heading.level:
+                self.headings.pop()
+            if self.headings:
+                parent = self.headings[-1]
+                parent[2] += 1
+                heading.index = "{}.{}".format(parent[1], parent[2])
+            else:
+                self.heading_count += 1
+                heading.index = str(self.heading_count)
+            self.headings.append([heading.level, heading.index, 0])
+
+    def get_state(self):
+        """Returns the state the rendering of a document depends on, or
+        ```None``` if it can't be cached.
+        """
+        if not isinstance(self.writer.prefix, str):
+            return None
+        return [self.heading_count, [list(h) for h in self.headings],
+                self.writer.prefix, self.writer.chars_on_line,
+                list(self.separator)]
+
+    def set_state(self, state):
+        self.heading_count = state[0]
+        self.headings = [list(h) for h in state[1]]
+        self.writer.prefix = state[2]
+        self.writer.chars_on_line = state[3]
+        self.separator = list(state[4])
+
+    def parse(self, content):
+        """Parse a document, preceded by the text separating it from the
+        previous document.
+
+        The text separating it from the next one is kept in
+        ```self.separator```.
+        """
+        document = self.parser.parse(content + "\n# " + SENTINEL)
+        children = document.children
+        if not children or getattr(children[-1], "children", None) != \
+                [SENTINEL]:
+            # The sentinel has been swallowed, by an unclosed code block.
+            document = self.parser.parse(content)
+            separator = []
+        else:
+            children.pop()
+            document.headings.pop()
+            separator = []
+            while children and isinstance(children[-1], str):
+                separator.insert(0, children.pop())
+        if document.children:
+            document.children = self.separator + document.children
+            self.separator = separator
+        return document
+
+    def render(self, content, depth=0):
+        """Render a document.
+
+        :param content: the markdown document.
+        :param depth: the number of levels added to its headings.
+        """
+        state = self.get_state() if self.cache is not None else None
+        if state is None:
+            self._render(content, depth)
+            self.output.flush()
+            return
+
+        key = [self.settings, depth, state, hashlib.sha1(
+            content.encode("utf-8", "surrogatepass")
+        ).hexdigest()]
+        cached = self.cache.get(key)
+        if cached is not None:
+            output, state = cached
+            self.output.write(output)
+            self.set_state(state)
+        else:
+            buffer = io.StringIO()
+            self.writer.output = buffer
+            try:
+                self._render(content, depth)
+            finally:
+                self.writer.output = self.output
+            self.output.write(buffer.getvalue())
+            state = self.get_state()
+            if state is not None:
+                self.cache.put(key, [buffer.getvalue(), state])
+        self.output.flush()
+
+    def _render(self, content, depth):
+        document = self.parse(shift_headings(content, depth))
+        self.number_headings(document)
+        self.renderer.render_document(document)
+
+    def render_subtree(self, repository, name):
+        """Render a ticket followed by its descendants.
+
+        :param repository: the ```Repository```.
+        :param name: the ticket name.
+        :raises PyticketException: the ticket doesn't exist.
+        """
+        try:
+            for _, depth, content in iter_subtree_contents(repository, name):
+                self.render(content, depth)
+        finally:
+            if self.cache is not None:
+                self.cache.evict()
+
+
+def get_config_hash(paths):
+    """Returns the hash of the renderer configuration files."""
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            with open(os.path.expanduser(path), "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+        digest.update(b"\0")
+    return digest.hexdigest()
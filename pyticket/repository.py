@@ -1,4 +1,5 @@
-import json
+import contextlib
+import itertools
 import os
 import os.path
 import shutil
@@ -8,7 +9,9 @@ from string import Template
 from pyticket import PyticketException
 from pyticket import migrations
 from pyticket import utils
+from pyticket.cache import get_file_key
 from pyticket.configuration import Configuration
+from pyticket.storage import JsonStorage, create_storage, open_storage
 from pyticket.ticket import MetaTicket
 
 DEFAULT_BUG_TEMPLATE = ("""# Bug $ticket
@@ -31,6 +34,9 @@ DEFAULT_FEATURE_TEMPLATE = ("""# Feature $ticket
 tags: feature
 """)
 
+# Number of threads reading contents files in ```Repository.read_contents```.
+READ_THREADS = 8
+
 
 class Repository:
     """Pyticket repository management.
@@ -38,49 +44,121 @@ class Repository:
     :param root: the directory on which instantiating the pyticket repository.
     :param create: if ```True``` the repository will be created, else, it will
                    be loaded.
+    :param storage: the storage engine of the created repository (see
+                    ```pyticket.storage```).
+    :param lazy: if ```True```, the tickets storage will be loaded only when a
+                 query needs every tickets. Looking for a single ticket
+                 doesn't load it.
+
+    Tickets meta-information are kept by a storage engine. Every mutation is
+    turned into a record (see ```pyticket.storage```) that the storage
+    applies. Mutations made inside a ```transaction``` are written at once
+    when the transaction ends.
     """
-    def __init__(self, root=".", create=False):
+
+    def __init__(self, root=".", create=False, storage=JsonStorage.NAME,
+                 lazy=False):
         self.root = root
         self.repository = self.root + "/.pyticket"
         self.contents = self.repository + "/contents"
         self.templates = self.repository + "/templates"
-        self.tickets = {}
+        self.pending_records = []
+        self.transaction_depth = 0
+        self.working = None
+        self.working_key = None
+        self.search_index = None
+        self.archive = None
         if create:
-            self.init()
+            self.init(storage)
         else:
             if not os.path.isdir(self.repository):
                 raise PyticketException(
                     "{} is not a pyticket repository".format(self.root)
                 )
             migrations.apply_migrations(self.repository)
-            tickets = Repository.read_tickets_file(
-                    self.repository + "/tickets"
-            )
-            for ticket in tickets:
-                self.tickets[ticket.name] = ticket
+            self.storage = open_storage(self.repository, lazy)
 
-    @staticmethod
-    def read_tickets_file(path):
-        """Read every tickets meta-information form the given tickets
-        repository file.
+    @property
+    def tickets(self):
+        """The mapping of ticket names to every ticket of the repository."""
+        return self.storage.tickets
 
-        :param path: the repository's tickets file path.
-        :return: the list of every ```MetaTicket``` of the repository.
-        """
-        with open(path, "r") as f:
-            json_data = json.loads(f.read())
-            return [MetaTicket.from_json(node) for node in json_data]
+    def load(self):
+        """Reload tickets from the storage."""
+        self.storage.load()
 
-    def write_tickets_file(self):
-        """Replace the content of the tickets file using the current tickets
-        list.
+    def compact(self):
+        """Compact the tickets storage."""
+        with self.transaction():
+            self.storage.compact()
+
+    def record(self, record):
+        """Apply a mutation record and write it in the storage.
+
+        If a transaction is running, the record will be written when it
+        commits.
+
+        :param record: the record to apply (see ```pyticket.storage```).
+        :raises PyticketException: the record concerns a ticket which
+                                   doesn't exist.
         """
-        with open(self.repository + "/tickets", "w+") as f:
-            json_data = [t.to_json() for t in self.tickets.values()]
-            f.write(json.dumps(json_data))
+        with self.transaction():
+            # A record of an unknown ticket would make the journal
+            # impossible to replay.
+            if record["op"] != "create" and \
+                    self.storage.get(record["name"]) is None:
+                raise PyticketException(
+                    "ticket '{}' doesn't exist".format(record["name"])
+                )
+            self.pending_records.append(record)
+            self.storage.apply(record)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group several mutations so they are written at once.
+
+        Transactions can be nested: only the outermost one writes the
+        storage. If an exception escapes a transaction, the tickets are
+        restored as they were when this transaction began. Note that
+        ticket contents files are not part of transactions.
+
+        The outermost transaction holds the repository lock, so transactions
+        of concurrent processes are serialized. Tickets modified by another
+        process before the lock has been acquired are read again.
 
-    def init(self):
-        """Initialize a new pyticket repository in the "root" directory."""
+        :Exemple:
+        >>> r = Repository()
+        >>> with r.transaction():
+        >>>     for name in ["a", "b", "c"]:
+        >>>         r.create_ticket(name, "opened", [])
+        """
+        with contextlib.ExitStack() as stack:
+            if self.transaction_depth == 0:
+                stack.enter_context(utils.file_lock(self.repository + "/lock"))
+                self.storage.refresh()
+
+            savepoint = len(self.pending_records)
+            self.transaction_depth += 1
+            try:
+                yield self
+            except BaseException:
+                if len(self.pending_records) > savepoint:
+                    del self.pending_records[savepoint:]
+                    self.storage.rollback(self.pending_records)
+                raise
+            finally:
+                self.transaction_depth -= 1
+
+            if self.transaction_depth == 0 and self.pending_records:
+                records = self.pending_records
+                self.pending_records = []
+                self.storage.commit(records)
+
+    def init(self, storage=JsonStorage.NAME):
+        """Initialize a new pyticket repository in the "root" directory.
+
+        :param storage: the name of the storage engine to use.
+        """
         if os.path.isdir(self.repository):
             raise PyticketException(
                 "there already exists a pyticket repository at '{}'".format(
@@ -102,10 +180,8 @@ class Repository:
         # Create working file.
         open("{}/working".format(self.repository), "w+").close()
 
-        # Create tickets meta file.
-        ticketsFile = open("{}/tickets".format(self.repository), "w+")
-        ticketsFile.write("{}")
-        ticketsFile.close()
+        # Create tickets meta storage.
+        self.storage = create_storage(self.repository, storage)
 
         # Create default configuration file if needed.
         if not os.path.isdir(utils.get_home_path()):
@@ -119,30 +195,150 @@ class Repository:
 
     def has_ticket(self, name):
         """Check the repository has the given ticket."""
-        return name in self.tickets
+        return self.storage.get(name) is not None
 
     def get_ticket(self, name):
-        """Return the requested ticket.
+        """Return the requested ticket, which can be archived.
 
         :param name: the ticket's name.
         :return: the requested ticket.
         :raises PyticketException: the repository doesn't contain the requested
                                    ticket.
         """
-        if self.has_ticket(name):
-            return self.tickets[name]
+        ticket = self.storage.get(name)
+        if ticket is None:
+            ticket = self.get_archive().get_ticket(name)
+        if ticket is not None:
+            return ticket
         raise PyticketException("ticket '{}' doesn't exist".format(name))
 
-    def get_ticket_content_path(self, name):
-        """Returns the full path of the of the given ticket's content.
+    def get_archive(self):
+        """Returns the archive of the closed ticket trees (see
+        ```pyticket.archive```).
+        """
+        if self.archive is None:
+            # Only imported by the commands needing archived tickets.
+            from pyticket.archive import Archive
+
+            self.archive = Archive(self.repository)
+        return self.archive
+
+    def is_archived(self, name):
+        """Check the given ticket is archived, and not in the storage."""
+        return self.storage.get(name) is None and \
+            self.get_archive().has_ticket(name)
+
+    def unpack_archived(self, name):
+        """If the given ticket is archived, move its tree back to the
+        storage, so it can be modified.
+
+        The tree is removed from the archive once it has been written in the
+        storage, so this method must not be called inside a transaction,
+        which could be rolled back.
+
+        :param name: the ticket name.
+        """
+        if not self.is_archived(name):
+            return
+        archive = self.get_archive()
+        root = name.split(".")[0]
+        names = [root] + archive.get_descendant_names(root)
+        with self.transaction():
+            for unpacked in names:
+                content = archive.read_content(unpacked)
+                if content is not None:
+                    path = utils.get_content_path(self.contents, unpacked)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, "w") as f:
+                        f.write(content)
+                self.record({"op": "create",
+                             "ticket": archive.get_ticket(unpacked).to_json()})
+        with self.transaction():
+            archive.remove(names)
+        self.index_ticket_contents(names)
+
+    def archive_tickets(self, name=None):
+        """Move closed ticket trees to the archive (see
+        ```pyticket.archive```), then compact the storage.
+
+        :param name: if given, the root ticket of the archived tree.
+                     Otherwise, every tree whose tickets are all closed is
+                     archived.
+        :return: the names of the archived tickets.
+        :raises PyticketException: the given ticket doesn't exist, has a
+                                   parent or an opened descendant.
+        """
+        with self.transaction():
+            if name is not None:
+                if not self.has_ticket(name):
+                    raise PyticketException(
+                        "ticket '{}' doesn't exist".format(name)
+                    )
+                if utils.get_ticket_parent_name(name):
+                    raise PyticketException(
+                        "only whole trees can be archived, '{}' has a "
+                        "parent".format(name)
+                    )
+                for ticket in self.get_ticket_childs(name, recursive=True):
+                    if ticket.status == "opened":
+                        raise PyticketException(
+                            "'{}' has an opened ticket: '{}'".format(
+                                name, ticket.name
+                            )
+                        )
+                if self.get_ticket(name).status == "opened":
+                    raise PyticketException(
+                        "'{}' is an opened ticket".format(name)
+                    )
+                roots = [name]
+            else:
+                opened = set([ticket.name.split(".")[0] for ticket
+                              in self.iter_tickets(status="opened")])
+                roots = sorted([ticket.name for ticket
+                                in self.storage.iter_select(status="closed")
+                                if "." not in ticket.name and
+                                ticket.name not in opened])
+            names = [archived for root in roots
+                     for archived in self.get_subtree_names(root)]
+            if not names:
+                return []
+            self.get_archive().add(
+                (self.storage.get(archived), content)
+                for archived, content in self.read_contents(names)
+            )
+            for root in roots:
+                self.record({"op": "delete", "name": root})
+
+        for archived in names:
+            try:
+                os.remove(utils.get_content_path(self.contents, archived))
+            except FileNotFoundError:
+                pass
+        index = self.get_search_index()
+        if index is not None:
+            index.remove(names)
+        if self.get_working_ticket_name() in names:
+            self.set_working_ticket(None)
+        self.compact()
+        return names
+
+    def get_ticket_content_path(self, name, create=False):
+        """Returns the full path of the of the given ticket's content (see
+        ```utils.get_content_path```).
 
         :params name: the ticket name.
+        :param create: if ```True```, the directory of the content file is
+                       created if needed, so the file can be written.
         :return: the ticket content.
-        :raises PyticketException: the given ticket doesn't exist.
+        :raises PyticketException: the given ticket doesn't exist, or is
+                                   archived (see ```unpack_archived```).
         """
         if not self.has_ticket(name):
             raise PyticketException("ticket '{}' doesn't exist".format(name))
-        return "{}/{}".format(self.contents, name)
+        path = utils.get_content_path(self.contents, name)
+        if create:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
 
     def has_ticket_content(self, name):
         """Returns true if the given ticket has a content file.
@@ -151,6 +347,8 @@ class Repository:
         :return: True if the ticket has a content file.
         :raises PyticketException: the givent ticket doesn't exist.
         """
+        if self.is_archived(name):
+            return self.get_archive().has_content(name)
         path = self.get_ticket_content_path(name)
         return os.path.isfile(path)
 
@@ -160,16 +358,40 @@ class Repository:
         :param name: the ticket name.
         :param recursive: if ```True```, returns every descendants of this
                           ticket, and not only direct childs.
-        :return: the ticket childs.
+        :return: the ticket childs, sorted by name. Descendants are listed
+                 depth-first, each ticket being followed by its own
+                 descendants.
         """
-        childs = []
-        for candidate_key, candidate in self.tickets.items():
-            candidate_parent_name = utils.get_ticket_parent_name(candidate_key)
-            if candidate_parent_name and candidate_parent_name == name:
-                childs.append(candidate)
-                if recursive:
-                    childs += self.get_ticket_childs(candidate_key, recursive)
-        return childs
+        if self.is_archived(name):
+            archive = self.get_archive()
+            return [archive.get_ticket(child) for child
+                    in archive.get_descendant_names(name, recursive)]
+        return [self.storage.get(child)
+                for child in self.get_descendant_names(name, recursive)]
+
+    def get_descendant_names(self, name, recursive=True):
+        """Returns the names of the childs of the given ticket.
+
+        The cost of this method only depends on the number of returned names.
+
+        :param name: the ticket name.
+        :param recursive: if ```True```, returns every descendants of this
+                          ticket, and not only direct childs.
+        :return: the childs names, in the same order as
+                 ```get_ticket_childs```.
+        """
+        if self.is_archived(name):
+            return self.get_archive().get_descendant_names(name, recursive)
+        return self.storage.get_descendant_names(name, recursive)
+
+    def get_subtree_names(self, name):
+        """Returns the name of the given ticket followed by the names of
+        every of its descendants.
+
+        :param name: the ticket name.
+        :return: the list of the subtree ticket names.
+        """
+        return [name] + self.get_descendant_names(name)
 
     def set_working_ticket(self, name):
         """Set the given ticket as the working ticket.
@@ -192,6 +414,9 @@ class Repository:
 
         with open(self.repository + "/working", "w+") as f:
             f.write(name)
+            f.flush()
+            self.working = name
+            self.working_key = get_file_key(f.fileno())
 
     def is_working_ticket(self, name):
         """Check if the given ticket is the working ticket.
@@ -199,9 +424,24 @@ class Repository:
         :param name: the ticket name to check.
         :return: return ```True``` if the given ticket is the working ticket.
         """
-        with open(self.repository + "/working", "r") as f:
-            content = f.read()
-            return content == name
+        return self.get_working_ticket_name() == name
+
+    def get_working_ticket_name(self):
+        """Get the name of the current working ticket.
+
+        The working file is only read again if it has been modified since
+        it was last read or written by this repository (see
+        ```pyticket.cache.get_file_key```).
+
+        :return: the working ticket name, or an empty string if there is no
+                 working ticket.
+        """
+        path = self.repository + "/working"
+        if self.working is None or get_file_key(path) != self.working_key:
+            with open(path, "r") as f:
+                self.working = f.read()
+                self.working_key = get_file_key(f.fileno())
+        return self.working
 
     def get_working_ticket(self):
         """Get the current working ticket.
@@ -209,11 +449,10 @@ class Repository:
         :return: The current working ticket or None if this ticket doesn't
                  exist.
         """
-        with open(self.repository + "/working", "r") as f:
-            content = f.read()
-            if not content:
-                return None
-            return self.tickets[content]
+        name = self.get_working_ticket_name()
+        if not name:
+            return None
+        return self.storage.get(name)
 
     def update_ticket_mtime(self, name):
         """Update the mtime of the given ticket to the current time.
@@ -221,9 +460,10 @@ class Repository:
         :param name: the ticket name.
         :raises PyticketException: the ticket doesn't exist.
         """
-        ticket = self.get_ticket(name)
-        ticket.mtime = time.time()
-        self.write_tickets_file()
+        self.unpack_archived(name)
+        with self.transaction():
+            self.get_ticket(name)
+            self.record({"op": "mtime", "name": name, "mtime": time.time()})
 
     def create_ticket(self, name, status, tags, create=False):
         """Create a new ticket in the repository.
@@ -258,15 +498,6 @@ class Repository:
                 "'{}' is not a valid ticket name".format(name)
             )
 
-        if self.has_ticket(name):
-            raise PyticketException("ticket '{}' already exists".format(name))
-
-        parent_name = utils.get_ticket_parent_name(name)
-        if parent_name and not self.has_ticket(parent_name):
-            raise PyticketException(
-                "parent ticket '{}' doesn't exist".format(parent_name)
-            )
-
         if not MetaTicket.is_valid_status(status):
             raise PyticketException(
                 "'{}' is not a valid status".format(status)
@@ -278,26 +509,43 @@ class Repository:
                     "'{}' is not a valid tag name".format(tag)
                 )
 
-        meta_ticket = MetaTicket(name, status, tags, time.time())
-        self.tickets[meta_ticket.name] = meta_ticket
-        self.write_tickets_file()
+        parent_name = utils.get_ticket_parent_name(name)
+        if parent_name:
+            self.unpack_archived(parent_name)
+
+        with self.transaction():
+            if self.has_ticket(name) or self.get_archive().has_ticket(name):
+                raise PyticketException(
+                    "ticket '{}' already exists".format(name)
+                )
+
+            if parent_name and not self.has_ticket(parent_name):
+                raise PyticketException(
+                    "parent ticket '{}' doesn't exist".format(parent_name)
+                )
+
+            meta_ticket = MetaTicket(name, status, tags, time.time())
+            self.record({"op": "create", "ticket": meta_ticket.to_json()})
 
         if create:
-            open(self.get_ticket_content_path(name), "w+").close()
+            open(self.get_ticket_content_path(name, create=True), "w+").close()
 
-        return meta_ticket
+        return self.get_ticket(name)
 
     def write_ticket_content(self, name, content):
-        """Write the ticket content file for the given ticket.
+        """Write the ticket content file for the given ticket, unpacking it
+        if it is archived.
 
         :param name: the ticket name.
         :param content: the ticket content.
         :raises PyticketException: the ticket 'name' doesn't exist.
         """
-        path = self.get_ticket_content_path(name)
+        self.unpack_archived(name)
+        path = self.get_ticket_content_path(name, create=True)
         with open(path, "w+") as f:
             f.write(content)
         self.update_ticket_mtime(name)
+        self.index_ticket_contents([name])
 
     def read_ticket_content(self, name):
         """Read the ticket content of the given ticket.
@@ -310,10 +558,131 @@ class Repository:
             raise PyticketException(
                 "ticket '{}' has no content".format(name)
             )
+        if self.is_archived(name):
+            return self.get_archive().read_content(name)
         path = self.get_ticket_content_path(name)
         with open(path, "r", encoding="utf-8") as f:
             return f.read()
 
+    def read_contents(self, names, threads=READ_THREADS):
+        """Read the contents of several tickets.
+
+        The directories of the contents files are listed once, when a file
+        of theirs is first requested, to find the existing files. These are
+        read by a pool of threads, a few files ahead of the iteration. On a
+        network file system, the round trips of several files overlap
+        instead of following each other.
+
+        :param names: the names of the tickets, which must exist. They can be
+                      archived.
+        :param threads: the number of reading threads.
+        :return: an iterator over the ```(name, content)``` of the given
+                 tickets, in the given order, ```content``` being ```None```
+                 if the ticket has no content file.
+        """
+        # Only imported by the commands reading several contents.
+        import collections
+        import concurrent.futures
+
+        # The names of the files of every listed directory, only used by
+        # the calling thread.
+        listed = {}
+
+        def read(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+
+        with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            pending = collections.deque()
+            try:
+                for name in names:
+                    path = utils.get_content_path(self.contents, name)
+                    directory = os.path.dirname(path)
+                    existing = listed.get(directory)
+                    if existing is None:
+                        try:
+                            existing = set(os.listdir(directory))
+                        except FileNotFoundError:
+                            existing = set()
+                        listed[directory] = existing
+                    future = None
+                    if name in existing:
+                        future = pool.submit(read, path)
+                    pending.append((name, future))
+                    if len(pending) >= threads * 4:
+                        yield self._get_read_content(*pending.popleft())
+                while pending:
+                    yield self._get_read_content(*pending.popleft())
+            finally:
+                # The iteration may have been stopped early.
+                for _, future in pending:
+                    if future is not None:
+                        future.cancel()
+
+    def _get_read_content(self, name, future):
+        """Returns the ```(name, content)``` of a content read by
+        ```read_contents```, reading archived contents from the archive.
+
+        :param future: the future of the content, or ```None``` if the
+                       ticket has no content file.
+        """
+        content = future.result() if future is not None else None
+        if content is None and self.is_archived(name):
+            content = self.get_archive().read_content(name)
+        return name, content
+
+    def get_search_index(self, create=False):
+        """Returns the full-text search index of the ticket contents (see
+        ```pyticket.search```).
+
+        :param create: if ```True```, the index is built if it doesn't exist
+                       yet.
+        :return: the index, or ```None``` if it has not been built and
+                 ```create``` is ```False```.
+        """
+        if self.search_index is None:
+            # Only imported by the commands needing the index.
+            from pyticket.search import SearchIndex
+
+            if create or SearchIndex.exists(self.repository):
+                self.search_index = SearchIndex(self.repository)
+        return self.search_index
+
+    def index_ticket_contents(self, names):
+        """Update the search index with the content files of the given
+        tickets, if the index has been built.
+
+        :param names: the names of the tickets whose content may have
+                      changed.
+        """
+        index = self.get_search_index()
+        if index is not None:
+            index.update(names)
+
+    def search_tickets(self, text, count=None):
+        """Search the ticket contents, building the search index if needed.
+
+        Content files created, replaced or removed by another program are
+        indexed again first (see ```pyticket.search```). The contents found
+        are indexed again if they have been modified in place, and the
+        search answered again.
+
+        :param text: the searched words and "quoted phrases".
+        :param count: if given, only returns the ```count``` best results.
+        :return: the list of the ```(name, score)``` of the tickets whose
+                 content has every searched word and phrase, from the best
+                 score to the worst.
+        """
+        index = self.get_search_index(create=True)
+        index.refresh()
+        results = index.search(text, count)
+        if index.update([name for name, _ in results]):
+            results = index.search(text, count)
+        return results
+
     def switch_ticket_status(self, name, status):
         """Switch the status of the given ticket.
 
@@ -334,27 +703,34 @@ class Repository:
                 "'{}' is not a valid status".format(status)
             )
 
-        if status == "closed":
-            childs = self.get_ticket_childs(name, recursive=True)
-            for child in childs:
-                if child.status == "opened":
-                    raise PyticketException(
-                        "trying to close '{}', but its child '{}' is opened"
-                        .format(name, child.name)
-                    )
-            if self.is_working_ticket(name):
-                self.set_working_ticket(None)
-
-        ticket = self.get_ticket(name)
-        if status == "opened" and ticket.status == "closed":
-            parent_name = utils.get_ticket_parent_name(name)
-            while parent_name:
-                parent = self.get_ticket(parent_name)
-                parent.status = "opened"
-                parent_name = utils.get_ticket_parent_name(parent_name)
-        ticket.status = status
-        self.write_tickets_file()
-        self.update_ticket_mtime(name)
+        if self.is_archived(name):
+            if self.get_ticket(name).status == status:
+                # Nothing changes: the tree is left in the archive.
+                return
+            self.unpack_archived(name)
+        with self.transaction():
+            if status == "closed":
+                childs = self.get_ticket_childs(name, recursive=True)
+                for child in childs:
+                    if child.status == "opened":
+                        raise PyticketException(
+                            ("trying to close '{}', but its child '{}' is "
+                             "opened").format(name, child.name)
+                        )
+                if self.is_working_ticket(name):
+                    self.set_working_ticket(None)
+
+            ticket = self.get_ticket(name)
+            if status == "opened" and ticket.status == "closed":
+                parent_name = utils.get_ticket_parent_name(name)
+                while parent_name:
+                    parent = self.get_ticket(parent_name)
+                    if parent.status != "opened":
+                        self.record({"op": "status", "name": parent_name,
+                                     "status": "opened"})
+                    parent_name = utils.get_ticket_parent_name(parent_name)
+            self.record({"op": "status", "name": name, "status": status})
+            self.update_ticket_mtime(name)
 
     def rename_ticket(self, name, new_name):
         """Rename a ticket.
@@ -366,53 +742,65 @@ class Repository:
         :param name: the name of the ticket to rename.
         :param new_name: the new ticket name.
         :raises PyticketException: if the given ticket cannot be found, if
-                                   the new ticket's name is invalid, or if the
-                                   new ticket's requested parent doesn't exist.
+                                   the new ticket's name is invalid or in the
+                                   ticket's own subtree, or if the new
+                                   ticket's requested parent doesn't exist.
         """
         if not MetaTicket.is_valid_name(new_name):
             raise PyticketException(
                 "'{}' is not a valid ticket name".format(new_name)
             )
-        if self.has_ticket(new_name):
-            raise PyticketException(
-                "ticket '{}' already exists".format(new_name)
-            )
-        parent_name = utils.get_ticket_parent_name(new_name)
-        if parent_name and not self.has_ticket(parent_name):
+        if new_name == name or new_name.startswith(name + "."):
             raise PyticketException(
-                ("requests new parent '{}' for ticket '{}', but this parent "
-                 "doesn't exist (new name is '{}')").format(parent_name, name,
-                                                            new_name)
+                "cannot rename ticket '{}' into its own subtree "
+                "(new name is '{}')".format(name, new_name)
             )
 
-        has_content = self.has_ticket_content(name)
-        if has_content:
-            previous_content_path = self.get_ticket_content_path(name)
-
-        # Rename the ticket
-        ticket = self.get_ticket(name)
-        ticket.name = new_name
-        self.tickets[new_name] = self.tickets.pop(name)
+        parent_name = utils.get_ticket_parent_name(new_name)
+        self.unpack_archived(name)
+        if parent_name:
+            self.unpack_archived(parent_name)
 
-        # Rename the content
-        if has_content:
-            new_content_path = self.get_ticket_content_path(new_name)
-            shutil.move(previous_content_path, new_content_path)
+        with self.transaction():
+            if self.has_ticket(new_name) or \
+                    self.get_archive().has_ticket(new_name):
+                raise PyticketException(
+                    "ticket '{}' already exists".format(new_name)
+                )
+            if parent_name and not self.has_ticket(parent_name):
+                raise PyticketException(
+                    ("requests new parent '{}' for ticket '{}', but this "
+                     "parent doesn't exist (new name is '{}')").format(
+                         parent_name, name, new_name
+                    )
+                )
 
-        # Rename childs
-        childs = self.get_ticket_childs(name)
-        for child in childs:
-            child_basename = utils.get_ticket_basename(child.name)
-            child_new_name = new_name + '.' + child_basename
-            self.rename_ticket(child.name, child_new_name)
+            # Remember which contents need to be moved
+            moved_contents = []
+            for old_name in self.get_subtree_names(name):
+                if self.has_ticket_content(old_name):
+                    moved_contents.append((
+                        self.get_ticket_content_path(old_name),
+                        new_name + old_name[len(name):]
+                    ))
+            working_name = self.get_working_ticket_name()
+
+            # Rename the ticket and its childs
+            self.record({"op": "rename", "name": name, "new_name": new_name})
+            self.update_ticket_mtime(new_name)
+
+        # Rename the contents
+        for previous_content_path, renamed in moved_contents:
+            shutil.move(previous_content_path,
+                        self.get_ticket_content_path(renamed, create=True))
+        index = self.get_search_index()
+        if index is not None:
+            index.rename([(os.path.basename(path), renamed)
+                          for path, renamed in moved_contents])
 
         # Update working ticket
-        if self.is_working_ticket(name):
-            self.set_working_ticket(new_name)
-
-        # Update tickets file
-        self.write_tickets_file()
-        self.update_ticket_mtime(new_name)
+        if working_name == name or working_name.startswith(name + "."):
+            self.set_working_ticket(new_name + working_name[len(name):])
 
     def delete_ticket(self, name):
         """Delete the given ticket and its childs.
@@ -420,28 +808,34 @@ class Repository:
         :param name: the name of the ticket to delete.
         :raises PyticketException: the requested ticket doesn't exist.
         """
-        if not self.has_ticket(name):
-            raise PyticketException("ticket '{}' doesn't exist".format(name))
+        with self.transaction():
+            if self.is_archived(name):
+                # Archived tickets are deleted from the archive itself.
+                self.get_archive().remove(self.get_subtree_names(name))
+                return
+            if not self.has_ticket(name):
+                raise PyticketException(
+                    "ticket '{}' doesn't exist".format(name)
+                )
 
-        # Delete childs
-        childs = self.get_ticket_childs(name)
-        for child in childs:
-            self.delete_ticket(child.name)
+            subtree = self.get_subtree_names(name)
 
-        # Delete ticket content
-        if self.has_ticket_content(name):
-            os.remove(self.get_ticket_content_path(name))
+            # Delete tickets contents
+            for deleted in subtree:
+                if self.has_ticket_content(deleted):
+                    os.remove(self.get_ticket_content_path(deleted))
 
-        # Remove the ticket from the list
-        self.tickets.pop(name)
+            # Remove the ticket and its childs from the list
+            self.record({"op": "delete", "name": name})
+
+        index = self.get_search_index()
+        if index is not None:
+            index.remove(subtree)
 
         # Reset working ticket
-        if self.is_working_ticket(name):
+        if self.get_working_ticket_name() in subtree:
             self.set_working_ticket(None)
 
-        # Write list.
-        self.write_tickets_file()
-
     def add_tags(self, name, tags):
         """Add tags to the given ticket.
 
@@ -449,12 +843,13 @@ class Repository:
         :param tags: tags to add to the ticket.
         :raise PyticketException: the given ticket doesn't exist.
         """
-        ticket = self.get_ticket(name)
-        for tag in tags:
-            if tag not in ticket.tags:
-                ticket.tags.append(tag)
-        self.write_tickets_file()
-        self.update_ticket_mtime(name)
+        self.unpack_archived(name)
+        with self.transaction():
+            self.get_ticket(name)
+            self.record({
+                "op": "add-tags", "name": name, "tags": list(tags)
+            })
+            self.update_ticket_mtime(name)
 
     def remove_tags(self, name, tags):
         """Remove tags from the given ticket.
@@ -463,25 +858,49 @@ class Repository:
         :param tags: the tags to remove.
         :raise PyticketException: the given ticket doesn't exist.
         """
-        ticket = self.get_ticket(name)
-        for tag in tags:
-            if tag in ticket.tags:
-                ticket.tags.remove(tag)
-        self.write_tickets_file()
-        self.update_ticket_mtime(name)
+        self.unpack_archived(name)
+        with self.transaction():
+            self.get_ticket(name)
+            self.record({
+                "op": "remove-tags", "name": name, "tags": list(tags)
+            })
+            self.update_ticket_mtime(name)
 
-    def list_tickets(self, root=None, status=None, tags=None):
+    def list_tickets(self, root=None, status=None, tags=None, any_tags=None,
+                     without_tags=None, since=None, until=None):
         """List tickets using filters.
 
         :param root: if given, list the given 'root' ticket and all of its
                      childs.
         :param status: if given, list only tickets with this status.
-        :param tags: filter tickets having given tags.
+        :param tags: filter tickets having every given tags.
+        :param any_tags: filter tickets having at least one of the given tags.
+        :param without_tags: filter tickets having none of the given tags.
+        :param since: filter tickets modified at this time or later.
+        :param until: filter tickets modified before this time.
         :return: the list of tickets matching filters.
         :raises PyticketException: the 'root' ticket doesn't exist or 'status'
                                    is invalid.
         """
-        if root and not self.has_ticket(root):
+        return list(self.iter_tickets(root, status, tags, any_tags,
+                                      without_tags, since, until))
+
+    def iter_tickets(self, root=None, status=None, tags=None, any_tags=None,
+                     without_tags=None, since=None, until=None):
+        """Iterate over the tickets matching filters (see ```list_tickets```).
+
+        Tickets are produced as the storage finds them, so the first ones
+        are available before the others have been selected. When ```root```
+        is given, the subtree is listed depth-first, each ticket being
+        followed by its own descendants. Otherwise, the order depends on the
+        storage engine.
+
+        :return: an iterator over the tickets matching filters.
+        :raises PyticketException: the 'root' ticket doesn't exist or 'status'
+                                   is invalid.
+        """
+        archived = root is not None and self.is_archived(root)
+        if root and not archived and not self.has_ticket(root):
             raise PyticketException(
                 "ticket '{}' doesn't exist".format(root)
             )
@@ -490,16 +909,39 @@ class Repository:
                 "'{}' is an invalid status".format(status)
             )
 
-        tickets = (list(self.tickets.values()) if not root
-                   else self.get_ticket_childs(root, recursive=True))
-        if root:
-            tickets.append(self.get_ticket(root))
+        filters = (root, status, tags, any_tags, without_tags, since, until)
+        if archived:
+            return self.get_archive().iter_select(*filters)
+        tickets = self.storage.iter_select(*filters)
+        if root or status == "opened":
+            # Archived tickets are closed, and have no parent in the
+            # storage.
+            return tickets
+        return itertools.chain(tickets, self.iter_archived_tickets(filters))
+
+    def iter_archived_tickets(self, filters):
+        """Iterate over the archived tickets matching the filters of
+        ```iter_tickets```, reading the archive only when the iteration
+        reaches them.
+        """
+        yield from self.get_archive().iter_select(*filters)
+
+    def explain_tickets(self, root=None, status=None, tags=None,
+                        any_tags=None, without_tags=None, since=None,
+                        until=None):
+        """Describe how the storage finds the tickets matching filters (see
+        ```list_tickets```).
 
-        if status:
-            tickets = [t for t in tickets if t.status == status]
-        if tags:
-            tickets = [t for t in tickets if not set(tags) - set(t.tags)]
-        return tickets
+        :return: the description of the index used by the storage.
+        """
+        if root is not None and self.is_archived(root):
+            return "scan of the archived subtree of '{}'".format(root)
+        description = self.storage.explain_select(root, status, tags,
+                                                  any_tags, without_tags,
+                                                  since, until)
+        if not root and status != "opened" and self.get_archive().exists():
+            description += ", then a scan of the archived tickets"
+        return description
 
     def expand_template(self, template_name, values):
         """Expand the given template with the given values.
@@ -0,0 +1,494 @@
+"""Full-text search index of the ticket contents.
+
+The index is a SQLite database of the cache directory (see
+```pyticket.cache```), built from the contents files when it is first
+needed. It holds:
+
+- the "documents" table: every indexed content file, with its contents
+  subdirectory (see ```utils.get_content_path```), its key (see
+  ```pyticket.cache.get_file_key```) when it was indexed and its number of
+  tokens ;
+- the "postings" table: for every token and every content having it, the
+  number of occurrences and the positions of the token in this content ;
+- the "terms" table: the distinct tokens of every content, to remove its
+  postings ;
+- the "shards" table: the modification time of every contents
+  subdirectory when its files were last checked.
+
+Pyticket updates the index when it writes, renames or deletes contents.
+Before answering a search, the files of the contents subdirectories
+modified since they were checked are compared to the indexed keys: files
+created, removed or replaced by another program (an editor, git...) are
+indexed again, without reading the other subdirectories. A file modified in
+place doesn't modify its directory: the keys of the contents found by a
+search are checked, and the search is answered again if they changed.
+
+Tokens are the lower-cased words of the contents. Searches return the
+contents having every searched word, and every "quoted phrase", ranked with
+the BM25 function.
+"""
+import array
+import heapq
+import itertools
+import math
+import os
+import os.path
+import re
+import time
+
+from pyticket import utils
+from pyticket.cache import get_cache_directory, get_file_key
+
+TOKEN = re.compile(r"\w+")
+
+PHRASE = re.compile(r'"([^"]*)"|([^"\s]+)')
+
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+
+# Version of the index schema: an index of another version is built again.
+SCHEMA_VERSION = 2
+
+SCHEMA = [
+    "CREATE TABLE documents ("
+    "    id INTEGER PRIMARY KEY,"
+    "    name TEXT NOT NULL UNIQUE,"
+    "    shard TEXT NOT NULL,"
+    "    size INTEGER NOT NULL,"
+    "    mtime_ns INTEGER NOT NULL,"
+    "    inode INTEGER NOT NULL,"
+    "    length INTEGER NOT NULL"
+    ")",
+    "CREATE TABLE postings ("
+    "    token TEXT NOT NULL,"
+    "    document INTEGER NOT NULL,"
+    "    count INTEGER NOT NULL,"
+    "    positions BLOB NOT NULL,"
+    "    PRIMARY KEY (token, document)"
+    ") WITHOUT ROWID",
+    "CREATE TABLE terms ("
+    "    document INTEGER PRIMARY KEY,"
+    "    tokens TEXT NOT NULL"
+    ")",
+    "CREATE INDEX documents_shard ON documents (shard)",
+    "CREATE TABLE shards ("
+    "    name TEXT PRIMARY KEY,"
+    "    mtime_ns INTEGER NOT NULL"
+    ")",
+    "PRAGMA user_version = {}".format(SCHEMA_VERSION),
+]
+
+# A directory modified less than this number of nanoseconds before it is
+# checked may be modified again with the same time: it is checked again by
+# the next search.
+RACY_NS = 2 * 10 ** 9
+
+# Number of contents whose postings are sorted and inserted at once when
+# indexing several contents.
+BATCH_SIZE = 1000
+
+# Under this number of documents, their postings are read one by one instead
+# of reading every posting of a token.
+FEW_DOCUMENTS = 1000
+
+
+def tokenize(text):
+    """Split a text in tokens.
+
+    :return: the mapping of every token of the text to the array of its
+             positions, the position of a token being the number of tokens
+             before it.
+    """
+    positions = {}
+    for position, token in enumerate(TOKEN.findall(text.lower())):
+        occurrences = positions.get(token)
+        if occurrences is None:
+            occurrences = positions[token] = array.array("I")
+        occurrences.append(position)
+    return positions
+
+
+def parse_search(text):
+    """Parse searched terms.
+
+    :param text: the searched words and "quoted phrases".
+    :return: the list of the searched phrases, as lists of tokens. Every
+             word is a phrase of its own.
+    """
+    phrases = []
+    for quoted, word in PHRASE.findall(text):
+        tokens = TOKEN.findall((quoted or word).lower())
+        if quoted:
+            phrases.append(tokens)
+        else:
+            phrases += [[token] for token in tokens]
+    return [phrase for phrase in phrases if phrase]
+
+
+class SearchIndex:
+    """Full-text search index of the ticket contents of a repository.
+
+    :param directory: the ".pyticket" directory of the repository.
+    """
+    FILE_NAME = "search.sqlite"
+
+    def __init__(self, directory):
+        # Only imported by the commands needing the index.
+        import sqlite3
+
+        self.contents = directory + "/contents"
+        self.path = get_cache_directory(directory) + "/" + self.FILE_NAME
+        created = not os.path.isfile(self.path)
+        self.connection = sqlite3.connect(self.path)
+        if not created and self.connection.execute(
+                "PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # The index can be rebuilt from the contents.
+            self.connection.close()
+            os.remove(self.path)
+            self.connection = sqlite3.connect(self.path)
+            created = True
+        # The index can be rebuilt from the contents: don't wait for the
+        # disk.
+        self.connection.execute("PRAGMA synchronous = OFF")
+        if created:
+            with self.connection:
+                for statement in SCHEMA:
+                    self.connection.execute(statement)
+
+    @staticmethod
+    def exists(directory):
+        """Check the index of the given ".pyticket" directory has been
+        built.
+        """
+        return os.path.isfile(
+            directory + "/cache/" + SearchIndex.FILE_NAME
+        )
+
+    def close(self):
+        self.connection.close()
+
+    def get_indexed_keys(self):
+        """Returns the mapping of the indexed contents names to the key of
+        their file when they were indexed.
+        """
+        rows = self.connection.execute(
+            "SELECT name, size, mtime_ns, inode FROM documents"
+        )
+        return {row[0]: row[1:] for row in rows}
+
+    def refresh(self):
+        """Index the contents files created, replaced or removed in the
+        contents subdirectories modified since they were checked.
+        """
+        checked = dict(self.connection.execute(
+            "SELECT name, mtime_ns FROM shards"
+        ))
+        modified_shards = []
+        with os.scandir(self.contents) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    mtime_ns = entry.stat().st_mtime_ns
+                    if checked.pop(entry.name, None) != mtime_ns:
+                        modified_shards.append((entry.name, mtime_ns))
+        if not modified_shards and not checked:
+            return
+
+        modified = []
+        removed = []
+        # Subdirectories which don't exist anymore.
+        for shard in checked:
+            removed += self.get_shard_keys(shard)
+        for shard, mtime_ns in modified_shards:
+            indexed = self.get_shard_keys(shard)
+            with os.scandir(self.contents + "/" + shard) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    if indexed.pop(entry.name, None) != \
+                            (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+                        modified.append(entry.name)
+            removed += indexed
+        with self.connection:
+            self.remove(removed)
+            self.index(modified)
+            self.connection.execute(
+                "DELETE FROM shards WHERE name IN ({})".format(
+                    ", ".join(["?"] * len(checked))
+                ), list(checked)
+            )
+            racy = time.time_ns() - RACY_NS
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO shards VALUES (?, ?)",
+                [(shard, mtime_ns if mtime_ns < racy else -1)
+                 for shard, mtime_ns in modified_shards]
+            )
+
+    def get_shard_keys(self, shard):
+        """Returns the mapping of the names of the indexed contents of a
+        contents subdirectory to the key of their file when they were
+        indexed.
+        """
+        rows = self.connection.execute(
+            "SELECT name, size, mtime_ns, inode FROM documents"
+            " WHERE shard = ?", (shard,)
+        )
+        return {row[0]: row[1:] for row in rows}
+
+    def update(self, names):
+        """Index the content files of the given tickets again, if they
+        changed since they were indexed.
+
+        :param names: the names of the tickets. The tickets without content
+                      file are removed from the index.
+        :return: ```True``` if a content has been indexed again or removed.
+        """
+        modified = []
+        removed = []
+        for name in names:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, inode FROM documents WHERE name = ?",
+                (name,)
+            ).fetchone()
+            try:
+                key = get_file_key(utils.get_content_path(self.contents,
+                                                          name))
+            except FileNotFoundError:
+                removed.append(name)
+                continue
+            if row != key:
+                modified.append(name)
+        with self.connection:
+            self.remove(removed)
+            self.index(modified)
+        return bool(modified or removed)
+
+    def rename(self, renamed):
+        """Rename indexed contents.
+
+        :param renamed: the list of the ```(name, new_name)``` of the renamed
+                        contents.
+        """
+        with self.connection:
+            self.remove([new_name for _, new_name in renamed])
+            self.connection.executemany(
+                "UPDATE documents SET name = ?, shard = ? WHERE name = ?",
+                [(new_name, get_shard(new_name), name)
+                 for name, new_name in renamed]
+            )
+
+    def remove(self, names):
+        """Remove the contents of the given tickets from the index."""
+        with self.connection:
+            for name in names:
+                row = self.connection.execute(
+                    "SELECT id, tokens FROM documents"
+                    " JOIN terms ON terms.document = id WHERE name = ?",
+                    (name,)
+                ).fetchone()
+                if row is None:
+                    continue
+                document, tokens = row
+                self.connection.executemany(
+                    "DELETE FROM postings WHERE token = ? AND document = ?",
+                    [(token, document) for token in tokens.split("\n")
+                     if token]
+                )
+                self.connection.execute(
+                    "DELETE FROM documents WHERE id = ?", (document,)
+                )
+                self.connection.execute(
+                    "DELETE FROM terms WHERE document = ?", (document,)
+                )
+
+    def index(self, names):
+        """Index the content files of the given tickets.
+
+        Postings are inserted by batches sorted by token, so they are
+        mostly appended to the postings of their token.
+
+        :param names: the names of the tickets.
+        """
+        with self.connection:
+            self.remove(names)
+            for i in range(0, len(names), BATCH_SIZE):
+                postings = []
+                for name in names[i:i + BATCH_SIZE]:
+                    postings += self._index_document(name)
+                postings.sort()
+                self.connection.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?, ?)", postings
+                )
+
+    def _index_document(self, name):
+        """Add a content to the documents table.
+
+        :return: the rows of its postings.
+        """
+        try:
+            with open(utils.get_content_path(self.contents, name), "r",
+                      encoding="utf-8", errors="replace") as f:
+                key = get_file_key(f.fileno())
+                positions = tokenize(f.read())
+        except FileNotFoundError:
+            return []
+        document = self.connection.execute(
+            "INSERT INTO documents"
+            " (name, shard, size, mtime_ns, inode, length)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (name, get_shard(name)) + key +
+            (sum([len(o) for o in positions.values()]),)
+        ).lastrowid
+        self.connection.execute("INSERT INTO terms VALUES (?, ?)",
+                                (document, "\n".join(positions)))
+        return [(token, document, len(occurrences),
+                 encode_positions(occurrences))
+                for token, occurrences in positions.items()]
+
+    def get_postings(self, token, documents=None):
+        """Returns the number of occurrences of a token in the documents
+        having it, with the number of tokens of these documents.
+
+        :param token: the token.
+        :param documents: if given, only returns the postings of these
+                          documents ids.
+        :return: the mapping of the ids of the documents having the token to
+                 the ```(count, length)``` of the token and the document.
+        """
+        select = ("SELECT document, count, length FROM postings"
+                  " JOIN documents ON id = document WHERE token = ?")
+        if documents is not None and len(documents) < FEW_DOCUMENTS:
+            select += " AND document = ?"
+            rows = [row for document in documents
+                    for row in self.connection.execute(select,
+                                                       (token, document))]
+        else:
+            rows = self.connection.execute(select, (token,))
+            if documents is not None:
+                rows = [row for row in rows if row[0] in documents]
+        return {document: (count, length) for document, count, length in rows}
+
+    def get_positions(self, token, document):
+        """Returns the positions of a token in the given document."""
+        row = self.connection.execute(
+            "SELECT positions FROM postings WHERE token = ? AND document = ?",
+            (token, document)
+        ).fetchone()
+        return decode_positions(row[0]) if row else array.array("I")
+
+    def has_phrase(self, phrase, document):
+        """Check the tokens of a phrase follow each other in a document.
+
+        :param phrase: the list of the phrase tokens.
+        :param document: the document id.
+        """
+        starts = set(self.get_positions(phrase[0], document))
+        for offset, token in enumerate(phrase[1:], 1):
+            positions = set(self.get_positions(token, document))
+            starts = set([start for start in starts
+                          if start + offset in positions])
+            if not starts:
+                return False
+        return True
+
+    def search(self, text, count=None):
+        """Search contents.
+
+        Postings are read from the rarest token to the most frequent one:
+        once the candidates are few, only their postings are read. The
+        positions of the phrases tokens are then read for the best
+        candidates, until enough of them have every phrase.
+
+        :param text: the searched words and "quoted phrases".
+        :param count: if given, only returns the ```count``` best results.
+        :return: the list of the ```(name, score)``` of the contents having
+                 every searched word and phrase, from the best score to the
+                 worst.
+        """
+        phrases = parse_search(text)
+        tokens = sorted(set([token for phrase in phrases
+                             for token in phrase]))
+        if not tokens:
+            return []
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = self.connection.execute(
+                "SELECT count(*) FROM postings WHERE token = ?", (token,)
+            ).fetchone()[0]
+            if frequencies[token] == 0:
+                return []
+
+        postings = []
+        candidates = None
+        for token in sorted(tokens, key=lambda t: frequencies[t]):
+            token_postings = self.get_postings(token, candidates)
+            postings.append((frequencies[token], token_postings))
+            if candidates is None:
+                candidates = set(token_postings)
+            else:
+                candidates &= token_postings.keys()
+            if not candidates:
+                return []
+
+        documents, total_length = self.connection.execute(
+            "SELECT count(*), sum(length) FROM documents"
+        ).fetchone()
+        average_length = max(total_length / documents, 1.0)
+        weights = [
+            (math.log(1.0 + (documents - frequency + 0.5) /
+                      (frequency + 0.5)), token_postings)
+            for frequency, token_postings in postings
+        ]
+
+        def score(document):
+            result = 0.0
+            for weight, token_postings in weights:
+                occurrences, length = token_postings[document]
+                norm = K1 * (1.0 - B + B * length / average_length)
+                result += weight * occurrences * (K1 + 1.0) / \
+                    (occurrences + norm)
+            return result
+
+        results = [(score(document), document) for document in candidates]
+        phrases = [phrase for phrase in phrases if len(phrase) > 1]
+        if phrases:
+            results.sort(reverse=True)
+            results = itertools.islice(
+                (result for result in results
+                 if all(self.has_phrase(phrase, result[1])
+                        for phrase in phrases)),
+                count
+            )
+        elif count is not None:
+            results = heapq.nlargest(count, results)
+        else:
+            results.sort(reverse=True)
+
+        select = "SELECT name FROM documents WHERE id = ?"
+        named = [(self.connection.execute(select, (document,)).fetchone()[0],
+                  score) for score, document in results]
+        # Equal scores are sorted by name.
+        named.sort(key=lambda result: (-result[1], result[0]))
+        return named
+
+
+def get_shard(name):
+    """Returns the contents subdirectory of the content of a ticket."""
+    return os.path.basename(os.path.dirname(utils.get_content_path("", name)))
+
+
+def encode_positions(positions):
+    """Encode an array of positions, using 16 bits integers when
+    possible.
+    """
+    if positions[-1] < 0x10000:
+        return b"H" + array.array("H", positions).tobytes()
+    return b"I" + positions.tobytes()
+
+
+def decode_positions(data):
+    """Decode positions encoded by ```encode_positions```."""
+    positions = array.array(chr(data[0]))
+    positions.frombytes(data[1:])
+    return positions
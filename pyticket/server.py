@@ -0,0 +1,163 @@
+"""Daemon keeping a repository loaded and answering commands over a Unix
+socket.
+
+"pyticket serve" listens on the ".pyticket/socket" socket of the repository.
+When this socket exists, the pyticket program forwards its command line to
+the daemon instead of loading the repository itself. Commands that need the
+terminal (starting an editor, asking a confirmation, rendering a ticket)
+are always executed by the pyticket program.
+
+The client side is implemented by ```pyticket.client```. A request is a
+JSON object ```{"argv": [...]}``` written on a single line. The daemon
+answers with a JSON object ```{"output": ..., "error": ...}``` where
+"output" is what the command printed and "error" the message of the
+```PyticketException``` it raised, or ```None```.
+
+The daemon reloads the repository when one of its files has been modified
+by another process. Tickets modified by another process are read again by
+the storage (see ```refresh``` in ```pyticket.storage```), which knows which
+writes are the daemon's own.
+"""
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+
+from pyticket import PyticketException
+from pyticket import commands
+from pyticket.cache import get_file_key
+from pyticket.client import can_forward, get_socket_path
+from pyticket.command import execute_argv
+from pyticket.repository import Repository
+
+# Files of the ".pyticket" directory telling how the repository is loaded.
+WATCHED_FILES = ["migration", "storage"]
+
+
+def get_repository_key(directory):
+    """Returns a key identifying the current version of the files telling how
+    the repository is loaded.
+
+    :param directory: the ".pyticket" directory.
+    """
+    key = []
+    for name in WATCHED_FILES:
+        try:
+            key.append(get_file_key(directory + "/" + name))
+        except FileNotFoundError:
+            key.append(None)
+    return key
+
+
+def is_served(path):
+    """Check if a daemon is listening on the given socket path."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # The client only checked that the daemon is running.
+            return
+        request = json.loads(line.decode("utf-8"))
+        output, error = self.server.execute(request["argv"])
+        answer = json.dumps({"output": output, "error": error}) + "\n"
+        self.wfile.write(answer.encode("utf-8"))
+
+
+class Server(socketserver.UnixStreamServer):
+    """The pyticket daemon. Requests are answered one at a time.
+
+    :param commands_list: the commands the daemon can execute (see
+                          ```pyticket.command```).
+    :param root: the root of the served repository.
+    :raises PyticketException: another daemon is serving the repository.
+    """
+    def __init__(self, commands_list, root="."):
+        self.commands = commands_list
+        self.root = root
+        self.directory = root + "/.pyticket"
+        self.repository = None
+        self.key = None
+        self.refresh()
+
+        path = get_socket_path(root)
+        if os.path.exists(path):
+            if is_served(path):
+                raise PyticketException(
+                    "a pyticket daemon is already serving '{}'".format(root)
+                )
+            os.remove(path)
+        super().__init__(path, RequestHandler)
+
+    def refresh(self):
+        """Reload the repository if its files have been modified since it
+        has been loaded, or forget the tickets another process modified.
+        """
+        key = get_repository_key(self.directory)
+        if self.repository is None or key != self.key:
+            self.repository = Repository(self.root)
+            self.key = key
+        else:
+            self.repository.storage.refresh()
+
+    def execute(self, argv):
+        """Execute a command line on the loaded repository.
+
+        :param argv: the command line arguments, without the program name.
+        :return: the ```(output, error)``` of the command.
+        """
+        output = io.StringIO()
+        error = None
+        try:
+            if not can_forward(argv):
+                raise PyticketException(
+                    "command '{}' can't be executed by the daemon".format(
+                        " ".join(argv)
+                    )
+                )
+            self.refresh()
+            commands.served_repository = self.repository
+            with contextlib.redirect_stdout(output):
+                execute_argv(self.commands, argv)
+        except PyticketException as ex:
+            error = str(ex)
+        except Exception as ex:
+            # The repository may be in an unknown state: reload it.
+            self.repository = None
+            error = "daemon error: {}".format(ex)
+        finally:
+            commands.served_repository = None
+        return output.getvalue(), error
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def serve(commands_list, root="."):
+    """Serve the given repository until interrupted or terminated.
+
+    :param commands_list: the commands the daemon can execute.
+    :param root: the root of the served repository.
+    """
+    server = Server(commands_list, root)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print("Serving '{}' on '{}'".format(root, server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,1395 @@
+"""Storage engines of the tickets meta-information.
+
+A storage engine keeps the ```MetaTicket``` of a repository and applies the
+mutation records built by ```Repository``` on them. Records are the following
+ones:
+
+- ```{"op": "create", "ticket": <ticket json>}```
+- ```{"op": "status", "name": <name>, "status": <status>}```
+- ```{"op": "add-tags", "name": <name>, "tags": [<tag>...]}```
+- ```{"op": "remove-tags", "name": <name>, "tags": [<tag>...]}```
+- ```{"op": "mtime", "name": <name>, "mtime": <time>}```
+- ```{"op": "rename", "name": <name>, "new_name": <name>}```, which renames
+  the ticket and all its descendants ;
+- ```{"op": "delete", "name": <name>}```, which deletes the ticket and all its
+  descendants.
+
+Every engine provides the same methods: ```load```, ```refresh```, ```get```,
+```apply```, ```commit```, ```rollback```, ```compact```,
+```get_descendant_names```, ```iter_select``` and ```select```, and a
+```tickets``` mapping associating names to tickets.
+
+Selected tickets are produced in hierarchy order (see
+```get_hierarchy_sort_key```): every ticket is followed by its selected
+descendants.
+"""
+import bisect
+import contextlib
+import gc
+import heapq
+import itertools
+import json
+import mmap
+import os
+import os.path
+
+from pyticket import PyticketException
+from pyticket import binary
+from pyticket import utils
+from pyticket.cache import (
+    get_cache_directory, get_file_key, read_cache, write_cache
+)
+from pyticket.journal import Journal
+from pyticket.ticket import MetaTicket, intern_tags
+
+
+def parse_tickets_file(content):
+    """Parse the content of a JSON tickets file.
+
+    The tickets file is a ```{"generation": <n>, "tickets": [...]}```
+    object. Files written by older versions only contain the tickets list,
+    and have the generation 0.
+
+    :param content: the tickets file content.
+    :return: the ```(generation, tickets)``` of the file, tickets being
+             their JSON description.
+    """
+    json_data = json.loads(content)
+    if isinstance(json_data, list):
+        return 0, json_data
+    return json_data.get("generation", 0), json_data.get("tickets", [])
+
+
+def get_tickets_file_generation(content):
+    """Returns the generation of a tickets file without parsing it
+    completely when it has been written by pyticket.
+    """
+    if content.startswith(JsonStorage.FILE_PREFIX):
+        generation, _ = json.JSONDecoder().raw_decode(
+            content, len(JsonStorage.FILE_PREFIX)
+        )
+        return generation
+    if content.lstrip().startswith("["):
+        return 0
+    return parse_tickets_file(content)[0]
+
+
+def read_tickets_file(path):
+    """Read every tickets meta-information form the given tickets
+    repository file.
+
+    :param path: the repository's tickets file path.
+    :return: the list of every ```MetaTicket``` of the repository.
+    """
+    with open(path, "r") as f:
+        _, json_data = parse_tickets_file(f.read())
+        return [MetaTicket.from_json(node) for node in json_data]
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """Pause the garbage collector.
+
+    Building many objects at once triggers a lot of useless collections, as
+    none of them is garbage.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def is_in_subtree(name, root):
+    """Check if the ticket ```name``` is ```root``` or one of its
+    descendants.
+    """
+    return name == root or name.startswith(root + ".")
+
+
+def get_descendants_range(name):
+    """Returns the (low, high) bounds of the names of the descendants of the
+    given ticket: descendant names are greater or equal to low and strictly
+    lower than high.
+    """
+    # '/' is the character following '.', and is not a valid name character.
+    return (name + ".", name + "/")
+
+
+def get_hierarchy_sort_key(name):
+    """Sort key ordering ticket names depth-first, childs being sorted by
+    name.
+    """
+    return name.split(".")
+
+
+class JsonStorage:
+    """Tickets kept in memory, stored in a JSON tickets file and a journal.
+
+    Mutations are not written in the tickets file directly: each of them is
+    appended to the journal. The journal is folded back into the tickets file
+    once it grows past ```COMPACTION_THRESHOLD``` bytes, or when ```compact```
+    is called.
+
+    Until ```load``` is called, the tickets file is not parsed: ```get```
+    finds the requested ticket in the raw tickets file, and replays the
+    journal records concerning it. Every other query loads the storage.
+
+    Besides the tickets, the storage keeps indexes of the childs of each
+    ticket (root tickets being the childs of ```""```), of the tickets having
+    each tag, and of the tickets sorted by mtime. Loading the tickets file is
+    skipped if the tickets and their indexes, saved in the cache directory,
+    are still up to date.
+
+    Files are never modified in place, so readers don't need to lock the
+    repository. Each compaction increments the generation of the tickets
+    file and starts a journal of the same generation: a reader finding a
+    journal older than the tickets file ignores it, since its records have
+    already been folded into the tickets file, and reads the files again if
+    the journal is newer.
+
+    Writers must hold the repository lock (see ```Repository.transaction```)
+    and call ```refresh``` before mutating the storage.
+
+    :param directory: the ".pyticket" directory of the repository.
+    """
+
+    NAME = "json"
+
+    COMPACTION_THRESHOLD = 1024 * 1024
+
+    FILE_NAME = "tickets"
+
+    # Beginning of the tickets files written by pyticket.
+    FILE_PREFIX = '{"generation": '
+
+    # Version of the cached tickets and indexes, part of the cache key.
+    CACHE_VERSION = 3
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = directory + "/" + self.FILE_NAME
+        self.journal = Journal(directory + "/journal")
+        self.loaded = False
+        self.loaded_tickets = {}
+        self.childs = {}
+        self.tagged = {}
+        # The (mtime, name) of every ticket, sorted.
+        self.by_mtime = []
+        # Raw tickets file and journal records used before loading.
+        self.raw_tickets = None
+        self.records = None
+        # Generations of the read tickets file and journal.
+        self.generation = 0
+        self.journal_generation = 0
+        # Keys of the tickets file and journal versions that have been read.
+        self.raw_key = None
+        self.disk_key = None
+
+    @property
+    def tickets(self):
+        """The mapping of ticket names to tickets, loading the storage if
+        needed.
+        """
+        if not self.loaded:
+            self.load()
+        return self.loaded_tickets
+
+    @classmethod
+    def create(cls, directory):
+        """Create an empty storage in the given directory.
+
+        The journal of another engine sharing it is discarded.
+        """
+        storage = cls(directory)
+        storage.loaded = True
+        storage.write_tickets_file(0)
+        storage.journal.reset(0)
+
+    def remove(self):
+        """Remove the storage files."""
+        os.remove(self.path)
+        if os.path.isfile(self.journal.path):
+            os.remove(self.journal.path)
+
+    def read_files(self):
+        """Read the raw tickets file and the journal records that have not
+        been folded into it yet.
+        """
+        while True:
+            raw_key, raw_tickets = self.read_tickets_file()
+            generation = self.get_generation(raw_tickets)
+            journal_key = self.journal.key()
+            journal_generation, records = self.journal.read()
+            if journal_generation > generation and \
+                    get_file_key(self.path) != raw_key:
+                # The journal has been compacted since the tickets file has
+                # been read.
+                continue
+            break
+        if journal_generation < generation:
+            # The tickets file has been compacted but the journal not reset
+            # yet: its records are already in the tickets file.
+            records = []
+        self.raw_tickets = raw_tickets
+        self.records = records
+        self.generation = generation
+        self.journal_generation = journal_generation
+        self.raw_key = raw_key
+        self.disk_key = (raw_key, journal_key)
+
+    def read_tickets_file(self):
+        """Returns the ```(key, content)``` of the tickets file."""
+        with open(self.path, "r") as f:
+            return get_file_key(f.fileno()), f.read()
+
+    def get_generation(self, raw_tickets):
+        """Returns the generation of the given tickets file content."""
+        return get_tickets_file_generation(raw_tickets)
+
+    def get_disk_key(self):
+        """Returns the keys of the current tickets file and journal."""
+        return (get_file_key(self.path), self.journal.key())
+
+    def refresh(self):
+        """Forget what has been read from the files if another process
+        modified them since.
+        """
+        if self.disk_key is None or self.disk_key == self.get_disk_key():
+            return
+        self.loaded = False
+        self.loaded_tickets = {}
+        self.childs = {}
+        self.tagged = {}
+        self.by_mtime = []
+        self.raw_tickets = None
+        self.records = None
+        self.disk_key = None
+
+    def load(self):
+        """Load every ticket from the tickets file, then replay the journal
+        on them.
+        """
+        if self.raw_tickets is None:
+            self.read_files()
+        records = self.records
+        self.loaded = True
+        self.read_tickets(self.raw_tickets, self.raw_key)
+        self.raw_tickets = None
+        self.records = None
+        for record in records:
+            self.apply(record)
+
+    def get_cache_path(self):
+        return get_cache_directory(self.directory) + "/tickets.marshal"
+
+    def read_tickets(self, raw_tickets, key):
+        """Set the tickets and their indexes as described in the tickets
+        file, using the cache if it is up to date.
+
+        :param raw_tickets: the tickets file content.
+        :param key: the key of the tickets file version (see
+                    ```pyticket.cache.get_file_key```).
+        """
+        with gc_paused():
+            state = read_cache(self.get_cache_path(),
+                               [JsonStorage.CACHE_VERSION, key])
+            if state is not None:
+                tickets, self.childs, self.tagged, self.by_mtime = state
+                self.loaded_tickets = {}
+                for name, status, tags, mtime in tickets:
+                    self.loaded_tickets[name] = MetaTicket(name, status, tags,
+                                                           mtime)
+                return
+            _, json_data = parse_tickets_file(raw_tickets)
+
+            self.loaded_tickets = {}
+            self.childs = {}
+            self.tagged = {}
+            for node in json_data:
+                ticket = MetaTicket.from_json(node)
+                self.loaded_tickets[ticket.name] = ticket
+                self._index_ticket(ticket.name)
+            self.by_mtime = sorted([(t.mtime, t.name)
+                                    for t in self.loaded_tickets.values()])
+        self.write_cache(key)
+
+    def write_cache(self, key):
+        """Save the current tickets and indexes in the cache.
+
+        :param key: the key of the tickets file they correspond to.
+        """
+        tickets = [(t.name, t.status, t.tags, t.mtime)
+                   for t in self.loaded_tickets.values()]
+        write_cache(self.get_cache_path(), [JsonStorage.CACHE_VERSION, key],
+                    (tickets, self.childs, self.tagged, self.by_mtime))
+
+    def get(self, name):
+        """Returns the ticket called ```name```, or ```None``` if there is
+        no such ticket.
+        """
+        if self.loaded:
+            return self.loaded_tickets.get(name)
+        if self.raw_tickets is None:
+            self.read_files()
+        return self._lookup(name)
+
+    def _lookup(self, name):
+        """Find a ticket in the raw tickets file and apply the journal
+        records concerning it, without loading the storage.
+        """
+        # Walk the journal backward to find the name the ticket had in the
+        # tickets file, or the record that created it. A ticket renamed or
+        # deleted after that doesn't have the name anymore.
+        origin = name
+        ticket = None
+        start = 0
+        for i in range(len(self.records) - 1, -1, -1):
+            record = self.records[i]
+            op = record["op"]
+            if op == "create" and record["ticket"]["name"] == origin:
+                ticket = MetaTicket.from_json(dict(record["ticket"]))
+                start = i + 1
+                break
+            elif op == "rename" and is_in_subtree(origin, record["new_name"]):
+                origin = record["name"] + origin[len(record["new_name"]):]
+            elif op in ("rename", "delete") and \
+                    is_in_subtree(origin, record["name"]):
+                return None
+
+        if ticket is None:
+            ticket = self.find_raw_ticket(origin)
+            if ticket is None:
+                return None
+
+        # Then replay the journal forward.
+        for record in self.records[start:]:
+            op = record["op"]
+            if op == "rename" and is_in_subtree(ticket.name, record["name"]):
+                ticket.name = (record["new_name"] +
+                               ticket.name[len(record["name"]):])
+            elif op == "delete" and is_in_subtree(ticket.name,
+                                                  record["name"]):
+                return None
+            elif record.get("name") != ticket.name:
+                continue
+            elif op == "status":
+                ticket.status = record["status"]
+            elif op == "add-tags":
+                ticket.tags = ticket.tags + intern_tags(
+                    t for t in record["tags"] if t not in ticket.tags
+                )
+            elif op == "remove-tags":
+                ticket.tags = tuple(t for t in ticket.tags
+                                    if t not in record["tags"])
+            elif op == "mtime":
+                ticket.mtime = record["mtime"]
+        if ticket.name != name:
+            return None
+        return ticket
+
+    def find_raw_ticket(self, name):
+        """Find a ticket in the raw tickets file without parsing it
+        completely.
+
+        :return: the ticket as described in the tickets file, or ```None```
+                 if there is no such ticket.
+        """
+        raw = self.raw_tickets
+        if not (raw.startswith(JsonStorage.FILE_PREFIX) or
+                raw.startswith('[{"name": "')):
+            # The file hasn't been written by pyticket.
+            for json_data in parse_tickets_file(raw)[1]:
+                if json_data["name"] == name:
+                    return MetaTicket.from_json(json_data)
+            return None
+        offset = raw.find('{{"name": "{}"'.format(name))
+        if offset < 0:
+            return None
+        json_data, _ = json.JSONDecoder().raw_decode(raw, offset)
+        return MetaTicket.from_json(json_data)
+
+    def write_tickets_file(self, generation):
+        """Replace the tickets file using the current tickets list.
+
+        :param generation: the generation of the written file.
+        """
+        json_data = {
+            "generation": generation,
+            "tickets": [t.to_json() for t in self.tickets.values()]
+        }
+        utils.write_file_atomically(self.path, json.dumps(json_data))
+
+    def compact(self):
+        """Fold the journal into the tickets file.
+
+        The tickets file is replaced before the journal: a reader reading the
+        files in between ignores the old journal.
+        """
+        generation = self.generation + 1
+        self.write_tickets_file(generation)
+        self.journal.reset(generation)
+        self.generation = generation
+        self.journal_generation = generation
+        self.disk_key = self.get_disk_key()
+        self.write_cache(self.disk_key[0])
+
+    def commit(self, records):
+        """Write the given (already applied) records in the journal."""
+        if self.journal_generation != self.generation:
+            # A compaction has been interrupted before resetting the journal.
+            self.journal.reset(self.generation)
+            self.journal_generation = self.generation
+        self.journal.append(records)
+        # Our own records don't need to be read again.
+        self.disk_key = (self.disk_key[0], self.journal.key())
+        if self.journal.size() > JsonStorage.COMPACTION_THRESHOLD:
+            self.compact()
+
+    def rollback(self, records):
+        """Drop every uncommitted change, then apply the given records."""
+        self.raw_tickets = None
+        self.records = None
+        self.load()
+        for record in records:
+            self.apply(record)
+
+    def apply(self, record):
+        """Apply a mutation record on the in-memory tickets.
+
+        If the storage isn't loaded yet, the record is only remembered.
+
+        :param record: the record to apply.
+        :raises PyticketException: the record operation is unknown.
+        """
+        if not self.loaded:
+            if self.records is None:
+                self.read_files()
+            self.records.append(record)
+            return
+
+        op = record["op"]
+        if op == "create":
+            ticket = MetaTicket.from_json(record["ticket"])
+            self.loaded_tickets[ticket.name] = ticket
+            self._index_ticket(ticket.name)
+            bisect.insort(self.by_mtime, (ticket.mtime, ticket.name))
+        elif op == "status":
+            self.loaded_tickets[record["name"]].status = record["status"]
+        elif op == "add-tags":
+            ticket = self.loaded_tickets[record["name"]]
+            present = set(ticket.tags)
+            added = []
+            for tag in record["tags"]:
+                if tag not in present:
+                    present.add(tag)
+                    added.append(tag)
+                    self.tagged.setdefault(tag, set()).add(ticket.name)
+            if added:
+                ticket.tags = ticket.tags + intern_tags(added)
+        elif op == "remove-tags":
+            ticket = self.loaded_tickets[record["name"]]
+            removed = set(record["tags"]).intersection(ticket.tags)
+            if removed:
+                ticket.tags = tuple(t for t in ticket.tags
+                                    if t not in removed)
+                for tag in removed:
+                    self._untag(tag, ticket.name)
+        elif op == "mtime":
+            ticket = self.loaded_tickets[record["name"]]
+            self._unindex_mtime(ticket)
+            ticket.mtime = record["mtime"]
+            bisect.insort(self.by_mtime, (ticket.mtime, ticket.name))
+        elif op == "rename":
+            name = record["name"]
+            new_name = record["new_name"]
+            subtree = [name] + self.get_descendant_names(name)
+            for old_name in subtree:
+                self._unindex_ticket(old_name)
+            for old_name in subtree:
+                ticket = self.loaded_tickets.pop(old_name)
+                self._unindex_mtime(ticket)
+                ticket.name = new_name + old_name[len(name):]
+                self.loaded_tickets[ticket.name] = ticket
+                self._index_ticket(ticket.name)
+                bisect.insort(self.by_mtime, (ticket.mtime, ticket.name))
+        elif op == "delete":
+            name = record["name"]
+            for old_name in [name] + self.get_descendant_names(name):
+                self._unindex_ticket(old_name)
+                self._unindex_mtime(self.loaded_tickets.pop(old_name))
+        else:
+            raise PyticketException(
+                "unknown journal operation '{}'".format(op)
+            )
+
+    def _index_ticket(self, name):
+        """Add the given ticket to the childs and tags indexes."""
+        parent_name = utils.get_ticket_parent_name(name) or ""
+        self.childs.setdefault(parent_name, set()).add(name)
+        for tag in self.loaded_tickets[name].tags:
+            self.tagged.setdefault(tag, set()).add(name)
+
+    def _unindex_ticket(self, name):
+        """Remove the given ticket from the childs and tags indexes."""
+        parent_name = utils.get_ticket_parent_name(name) or ""
+        siblings = self.childs[parent_name]
+        siblings.discard(name)
+        if not siblings:
+            del self.childs[parent_name]
+        for tag in self.loaded_tickets[name].tags:
+            self._untag(tag, name)
+
+    def _unindex_mtime(self, ticket):
+        """Remove the given ticket from the mtime index."""
+        del self.by_mtime[bisect.bisect_left(self.by_mtime,
+                                             (ticket.mtime, ticket.name))]
+
+    def get_mtime_range(self, since=None, until=None):
+        """Find the tickets modified in the given period by bisecting the
+        mtime index.
+
+        :param since: if given, the tickets must have been modified at this
+                      time or later.
+        :param until: if given, the tickets must have been modified before
+                      this time.
+        :return: the slice of the mtime index holding these tickets.
+        """
+        start = 0
+        if since is not None:
+            start = bisect.bisect_left(self.by_mtime, (since,))
+        stop = len(self.by_mtime)
+        if until is not None:
+            stop = bisect.bisect_left(self.by_mtime, (until,))
+        return slice(start, max(start, stop))
+
+    def _untag(self, tag, name):
+        """Remove the given ticket from the tickets having ```tag```."""
+        names = self.tagged.get(tag)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del self.tagged[tag]
+
+    def get_descendant_names(self, name, recursive=True):
+        """Returns the names of the childs of the given ticket using the
+        childs index.
+
+        The hierarchy is walked iteratively, so the cost only depends on the
+        number of returned names, and not on the hierarchy depth.
+
+        :param name: the ticket name.
+        :param recursive: if ```True```, returns every descendants of this
+                          ticket, and not only direct childs.
+        :return: the childs names, sorted by name. Descendants are listed
+                 depth-first, each ticket being followed by its own
+                 descendants.
+        """
+        return list(self.iter_descendant_names(name, recursive))
+
+    def iter_descendant_names(self, name, recursive=True):
+        """Iterate over the names of the childs of the given ticket, in the
+        order of ```get_descendant_names```.
+        """
+        if not self.loaded:
+            self.load()
+        stack = [iter(sorted(self.childs.get(name, ())))]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                continue
+            yield child
+            if recursive and child in self.childs:
+                stack.append(iter(sorted(self.childs[child])))
+
+    def select(self, root=None, status=None, tags=None, any_tags=None,
+               without_tags=None, since=None, until=None):
+        """Select tickets using filters (see ```Repository.list_tickets```).
+
+        :return: the list of selected tickets.
+        """
+        return list(self.iter_select(root, status, tags, any_tags,
+                                     without_tags, since, until))
+
+    def find_index(self, tags=None, any_tags=None, since=None, until=None):
+        """Find the most selective index answering the given filters (see
+        ```Repository.iter_tickets```): the tickets having every tag,
+        having any of the tags, or modified in the given period.
+
+        :return: a ```(count, description, get_names)``` tuple:
+                 ```get_names``` returns the names of the candidate tickets,
+                 ```count``` being their number, or its upper bound. The
+                 index having the smallest count is chosen. ```None``` if no
+                 index answers the filters.
+        """
+        if not self.loaded:
+            self.load()
+        indexes = []
+        if tags:
+            tagged = sorted([self.tagged.get(tag, set()) for tag in tags],
+                            key=len)
+            indexes.append((
+                len(tagged[0]), "tags index, tags '{}'".format(",".join(tags)),
+                lambda: tagged[0].intersection(*tagged[1:])
+            ))
+        if any_tags:
+            tagged = [self.tagged.get(tag, ()) for tag in any_tags]
+            indexes.append((
+                sum([len(names) for names in tagged]),
+                "tags index, any of '{}'".format(",".join(any_tags)),
+                lambda: set().union(*tagged)
+            ))
+        if since is not None or until is not None:
+            period = self.get_mtime_range(since, until)
+            indexes.append((
+                period.stop - period.start, "mtime index",
+                lambda: [name for _, name in self.by_mtime[period]]
+            ))
+        if not indexes:
+            return None
+        return min(indexes, key=lambda index: index[0])
+
+    def explain_select(self, root=None, status=None, tags=None,
+                       any_tags=None, without_tags=None, since=None,
+                       until=None):
+        """Describe how ```iter_select``` finds the tickets selected by the
+        given filters.
+
+        :return: the description.
+        """
+        if not self.loaded:
+            self.load()
+        if root:
+            return "childs index, subtree of '{}'".format(root)
+        index = self.find_index(tags, any_tags, since, until)
+        if index is None:
+            return "scan of {} tickets".format(len(self.loaded_tickets))
+        count, description, _ = index
+        return "{} ({} candidates)".format(description, count)
+
+    def iter_select(self, root=None, status=None, tags=None, any_tags=None,
+                    without_tags=None, since=None, until=None):
+        """Iterate over the tickets selected by the given filters (see
+        ```Repository.iter_tickets```).
+
+        Without root ticket, the candidate tickets are given by the most
+        selective index answering the filters (see ```find_index```), or by
+        walking the childs index from the root tickets. The other filters are
+        checked on the candidates.
+        """
+        if not self.loaded:
+            self.load()
+        if root:
+            names = itertools.chain([root], self.iter_descendant_names(root))
+        else:
+            index = self.find_index(tags, any_tags, since, until)
+            if index is not None:
+                names = sorted(index[2](), key=get_hierarchy_sort_key)
+            else:
+                names = self.iter_descendant_names("")
+        return self.filter_tickets(names, status, tags, any_tags,
+                                   without_tags, since, until)
+
+    def filter_tickets(self, names, status=None, tags=None, any_tags=None,
+                       without_tags=None, since=None, until=None):
+        """Iterate over the given tickets matching the given filters (see
+        ```Repository.iter_tickets```), in the given order.
+        """
+        for name in names:
+            ticket = self.loaded_tickets[name]
+            if status and ticket.status != status:
+                continue
+            if tags and not all(tag in ticket.tags for tag in tags):
+                continue
+            if any_tags and not any(tag in ticket.tags for tag in any_tags):
+                continue
+            if without_tags and \
+                    any(tag in ticket.tags for tag in without_tags):
+                continue
+            if since is not None and ticket.mtime < since:
+                continue
+            if until is not None and ticket.mtime >= until:
+                continue
+            yield ticket
+
+
+class BinaryStorage(JsonStorage):
+    """Tickets kept in memory like ```JsonStorage``` does, but stored in a
+    compact binary tickets file (see ```pyticket.binary```) and a journal.
+
+    The binary file loads about as fast as the cache of a JSON tickets file,
+    so no cache is written.
+
+    The tickets file is memory-mapped. Until the storage is loaded,
+    ```select``` and ```get_descendant_names``` filter the fixed-width
+    records of the file in place: only the selected tickets, and the tickets
+    modified by the journal, are built.
+
+    :param directory: the ".pyticket" directory of the repository.
+    """
+
+    NAME = "binary"
+
+    FILE_NAME = "tickets.bin"
+
+    def read_tickets_file(self):
+        with open(self.path, "rb") as f:
+            return (get_file_key(f.fileno()),
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def get_generation(self, raw_tickets):
+        return binary.TicketsFile(raw_tickets).generation
+
+    def read_tickets(self, raw_tickets, key):
+        with gc_paused():
+            tickets_file = binary.TicketsFile(raw_tickets)
+            tickets = tickets_file.get_tickets()
+            self.loaded_tickets = {}
+            self.childs = {}
+            self.tagged = {}
+            for ticket in tickets:
+                self.loaded_tickets[ticket.name] = ticket
+                self._index_ticket(ticket.name)
+            # The file gives the mtime order.
+            self.by_mtime = [(tickets[i].mtime, tickets[i].name)
+                             for i in tickets_file.get_mtime_order()]
+
+    def write_cache(self, key):
+        pass
+
+    def find_raw_ticket(self, name):
+        tickets_file = binary.TicketsFile(self.raw_tickets)
+        index = tickets_file.find(name)
+        if index is None:
+            return None
+        return tickets_file.get_ticket(index)
+
+    def write_tickets_file(self, generation):
+        utils.write_file_atomically(
+            self.path,
+            binary.encode_tickets(generation, list(self.tickets.values()))
+        )
+
+    def replay_journal(self, tickets_file):
+        """Apply the journal on the tickets it concerns, without loading the
+        storage.
+
+        :param tickets_file: the ```binary.TicketsFile``` of the tickets
+                             file.
+        :return: a ```(is_modified, storage)``` tuple. ```is_modified```
+                 tells if a ticket of the tickets file, given its name, is
+                 modified by the journal. ```storage``` is a loaded storage
+                 holding the tickets modified or created by the journal, once
+                 the journal applied.
+        """
+        names = set()
+        subtrees = []
+        for record in self.records:
+            op = record["op"]
+            if op == "rename":
+                subtrees += [record["name"], record["new_name"]]
+            elif op == "delete":
+                subtrees.append(record["name"])
+            elif op != "create":
+                names.add(record["name"])
+
+        def is_modified(name):
+            return name in names or \
+                any(is_in_subtree(name, root) for root in subtrees)
+
+        storage = JsonStorage(self.directory)
+        storage.loaded = True
+        if self.records:
+            for index, name in enumerate(
+                    tickets_file.get_string(i)
+                    for i in range(tickets_file.count)):
+                if is_modified(name):
+                    ticket = tickets_file.get_ticket(index)
+                    storage.loaded_tickets[name] = ticket
+                    storage._index_ticket(name)
+                    storage.by_mtime.append((ticket.mtime, name))
+            storage.by_mtime.sort()
+            for record in self.records:
+                storage.apply(record)
+        return is_modified, storage
+
+    def iter_select(self, root=None, status=None, tags=None, any_tags=None,
+                    without_tags=None, since=None, until=None):
+        """Iterate over the tickets selected by the given filters (see
+        ```Repository.iter_tickets```).
+
+        If the storage isn't loaded, the records of the tickets file are
+        filtered without building their tickets. They are merged with the
+        tickets modified by the journal, unless the file predates the
+        hierarchy order of the records: the selected tickets are then sorted.
+        """
+        if self.loaded:
+            yield from super().iter_select(root, status, tags, any_tags,
+                                           without_tags, since, until)
+            return
+        file_tickets, journal_tickets = self.scan_parts(
+            root, status, tags, any_tags, without_tags, since, until
+        )
+
+        def key(ticket):
+            return get_hierarchy_sort_key(ticket.name)
+
+        if binary.TicketsFile(self.raw_tickets).version >= 3 and \
+                since is None and until is None:
+            yield from heapq.merge(file_tickets, journal_tickets, key=key)
+        else:
+            yield from sorted(itertools.chain(file_tickets, journal_tickets),
+                              key=key)
+
+    def explain_select(self, root=None, status=None, tags=None,
+                       any_tags=None, without_tags=None, since=None,
+                       until=None):
+        if self.loaded:
+            return super().explain_select(root, status, tags, any_tags,
+                                          without_tags, since, until)
+        if self.raw_tickets is None:
+            self.read_files()
+        tickets_file = binary.TicketsFile(self.raw_tickets)
+        if since is not None or until is not None:
+            period = tickets_file.find_mtime_range(since, until)
+            description = "mtime order of the tickets file ({} records)"
+            count = period.stop - period.start
+        else:
+            description = "scan of the tickets file ({} records)"
+            count = tickets_file.count
+        return (description + ", then {} journal records").format(
+            count, len(self.records)
+        )
+
+    def scan(self, root=None, status=None, tags=None, any_tags=None,
+             without_tags=None, since=None, until=None):
+        """Iterate over the tickets selected by the given filters, reading
+        the tickets file records, then the tickets modified by the journal.
+        """
+        file_tickets, journal_tickets = self.scan_parts(
+            root, status, tags, any_tags, without_tags, since, until
+        )
+        return itertools.chain(file_tickets, journal_tickets)
+
+    def scan_parts(self, root=None, status=None, tags=None, any_tags=None,
+                   without_tags=None, since=None, until=None):
+        """Select the tickets matching the given filters in the tickets file
+        and in the journal.
+
+        Modification time filters only read the records found by bisecting
+        the mtime order of the file.
+
+        :return: a ```(file_tickets, journal_tickets)``` tuple:
+                 ```file_tickets``` iterates over the selected tickets not
+                 modified by the journal, in file order, and
+                 ```journal_tickets``` is the list of the selected tickets
+                 modified or created by the journal, in hierarchy order.
+        """
+        if self.raw_tickets is None:
+            self.read_files()
+        tickets_file = binary.TicketsFile(self.raw_tickets)
+        is_modified, journal_storage = self.replay_journal(tickets_file)
+
+        tags_ids = tickets_file.get_tags_ids()
+        tags = set(tags or ())
+        any_tags = set(any_tags or ())
+        required = {tags_ids.get(tag) for tag in tags}
+        any_ids = {tags_ids[tag] for tag in any_tags if tag in tags_ids}
+        excluded = {tags_ids[tag] for tag in without_tags or ()
+                    if tag in tags_ids}
+        status_id = (MetaTicket.VALID_STATUS.index(status) if status
+                     else None)
+        if root:
+            root_bytes = root.encode("utf-8")
+            prefix = root_bytes + b"."
+        strings = tickets_file.strings_data
+        offsets = tickets_file.offsets
+        tag_ids = tickets_file.tag_ids
+        if since is not None or until is not None:
+            records = (
+                (index, tickets_file.get_record(index))
+                for index in tickets_file.get_mtime_order()[
+                    tickets_file.find_mtime_range(since, until)
+                ]
+            )
+        else:
+            records = enumerate(tickets_file.iter_records())
+
+        def scan_file():
+            # A required tag no ticket of the file has can't be matched.
+            if None in required or (any_tags and not any_ids):
+                return
+            for index, (name_id, ticket_status, _, first_tag, tags_count) in \
+                    records:
+                if status_id is not None and ticket_status != status_id:
+                    continue
+                if required or any_ids or excluded:
+                    ticket_tags = set(
+                        tag_ids[first_tag:first_tag + tags_count]
+                    )
+                    if not required <= ticket_tags or \
+                            (any_ids and not any_ids & ticket_tags) or \
+                            excluded & ticket_tags:
+                        continue
+                name = strings[offsets[name_id]:offsets[name_id + 1]]
+                if root and name != root_bytes and \
+                        name[:len(prefix)] != prefix:
+                    continue
+                if self.records and is_modified(str(name, "utf-8")):
+                    continue
+                yield tickets_file.get_ticket(index)
+
+        # The journal storage may lack the parents of its tickets: its
+        # childs index can't be walked from the root tickets.
+        journal_names = sorted(
+            [name for name in journal_storage.loaded_tickets
+             if not root or is_in_subtree(name, root)],
+            key=get_hierarchy_sort_key
+        )
+        journal_tickets = list(journal_storage.filter_tickets(
+            journal_names, status, tags, any_tags, without_tags, since, until
+        ))
+        return scan_file(), journal_tickets
+
+    def get_descendant_names(self, name, recursive=True):
+        if self.loaded:
+            return super().get_descendant_names(name, recursive)
+        names = [t.name for t in self.scan(name) if t.name != name]
+        names.sort(key=get_hierarchy_sort_key)
+        if not recursive:
+            names = [child for child in names
+                     if utils.get_ticket_parent_name(child) == name]
+        return names
+
+
+class SqliteTickets:
+    """Read-only mapping of ticket names to tickets stored in a SQLite
+    database.
+
+    :param connection: the database connection.
+    """
+
+    SELECT = (
+        "SELECT name, status, mtime, ("
+        "    SELECT group_concat(tag, ',') FROM ("
+        "        SELECT tag FROM tags WHERE ticket = name ORDER BY position"
+        "    )"
+        ") FROM tickets"
+    )
+
+    # Hierarchy order of the tickets: names compare like their
+    # ```get_hierarchy_sort_key``` once the dots are replaced by a character
+    # lower than every valid name character.
+    HIERARCHY_ORDER = " ORDER BY replace(name, '.', char(1))"
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @staticmethod
+    def from_row(row):
+        name, status, mtime, tags = row
+        return MetaTicket(name, status, tags.split(",") if tags else [],
+                          mtime)
+
+    def query(self, where="", parameters=()):
+        """Returns the tickets matching the given SQL condition."""
+        return list(self.iter_query(where, parameters))
+
+    def iter_query(self, where="", parameters=()):
+        """Iterate over the tickets matching the given SQL condition, as
+        they are read from the database.
+        """
+        rows = self.connection.execute(
+            SqliteTickets.SELECT + where, parameters
+        )
+        for row in rows:
+            yield SqliteTickets.from_row(row)
+
+    def __getitem__(self, name):
+        ticket = self.get(name)
+        if ticket is None:
+            raise KeyError(name)
+        return ticket
+
+    def get(self, name, default=None):
+        tickets = self.query(" WHERE name = ?", (name,))
+        return tickets[0] if tickets else default
+
+    def __contains__(self, name):
+        return self.connection.execute(
+            "SELECT 1 FROM tickets WHERE name = ?", (name,)
+        ).fetchone() is not None
+
+    def __iter__(self):
+        rows = self.connection.execute("SELECT name FROM tickets")
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT count(*) FROM tickets"
+        ).fetchone()[0]
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return self.query()
+
+    def items(self):
+        return [(ticket.name, ticket) for ticket in self.query()]
+
+    def __eq__(self, other):
+        return dict(self.items()) == dict(other.items())
+
+
+class SqliteStorage:
+    """Tickets stored in a SQLite database, indexed by status, parent, tags,
+    mtime and hierarchy order.
+
+    Nothing is loaded in memory: every query is answered by the database.
+
+    :param directory: the ".pyticket" directory of the repository.
+    """
+
+    NAME = "sqlite"
+
+    # Index giving the tickets in hierarchy order (see
+    # ```SqliteTickets.HIERARCHY_ORDER```).
+    HIERARCHY_INDEX = (
+        "CREATE INDEX IF NOT EXISTS tickets_hierarchy"
+        " ON tickets (replace(name, '.', char(1)))"
+    )
+
+    SCHEMA = [
+        "CREATE TABLE tickets ("
+        "    name TEXT PRIMARY KEY,"
+        "    parent TEXT,"
+        "    status TEXT NOT NULL,"
+        "    mtime REAL NOT NULL"
+        ")",
+        "CREATE INDEX tickets_parent ON tickets (parent)",
+        "CREATE INDEX tickets_status ON tickets (status)",
+        "CREATE INDEX tickets_mtime ON tickets (mtime)",
+        HIERARCHY_INDEX,
+        "CREATE TABLE tags ("
+        "    ticket TEXT NOT NULL,"
+        "    tag TEXT NOT NULL,"
+        "    position INTEGER NOT NULL,"
+        "    PRIMARY KEY (ticket, tag)"
+        ")",
+        "CREATE INDEX tags_tag ON tags (tag)",
+    ]
+
+    def __init__(self, directory):
+        # Only imported by repositories using this engine.
+        import sqlite3
+
+        self.path = directory + "/tickets.sqlite"
+        self.connection = sqlite3.connect(self.path)
+        self.tickets = SqliteTickets(self.connection)
+
+    @staticmethod
+    def create(directory):
+        """Create an empty storage in the given directory."""
+        import sqlite3
+
+        connection = sqlite3.connect(directory + "/tickets.sqlite")
+        with connection:
+            for statement in SqliteStorage.SCHEMA:
+                connection.execute(statement)
+        connection.close()
+
+    def remove(self):
+        """Remove the storage files."""
+        self.connection.close()
+        os.remove(self.path)
+
+    def load(self):
+        """Nothing needs to be loaded from the database."""
+        pass
+
+    def refresh(self):
+        """Queries always read the database: nothing needs to be
+        refreshed.
+        """
+        pass
+
+    def get(self, name):
+        """Returns the ticket called ```name```, or ```None``` if there is
+        no such ticket.
+        """
+        return self.tickets.get(name)
+
+    def compact(self):
+        """Rebuild the database file to reclaim unused space."""
+        self.connection.commit()
+        self.connection.execute("VACUUM")
+
+    def commit(self, records):
+        """Commit the database transaction in which records were applied."""
+        self.connection.commit()
+
+    def rollback(self, records):
+        """Drop every uncommitted change, then apply the given records."""
+        self.connection.rollback()
+        for record in records:
+            self.apply(record)
+
+    def _insert_tags(self, name, tags):
+        position = self.connection.execute(
+            "SELECT coalesce(max(position), 0) FROM tags WHERE ticket = ?",
+            (name,)
+        ).fetchone()[0]
+        for tag in tags:
+            position += 1
+            self.connection.execute(
+                "INSERT OR IGNORE INTO tags VALUES (?, ?, ?)",
+                (name, tag, position)
+            )
+
+    def apply(self, record):
+        """Apply a mutation record on the database, in the current database
+        transaction.
+
+        :param record: the record to apply.
+        :raises PyticketException: the record operation is unknown.
+        """
+        op = record["op"]
+        execute = self.connection.execute
+        if op == "create":
+            ticket = MetaTicket.from_json(record["ticket"])
+            execute("INSERT INTO tickets VALUES (?, ?, ?, ?)", (
+                ticket.name, utils.get_ticket_parent_name(ticket.name),
+                ticket.status, ticket.mtime
+            ))
+            self._insert_tags(ticket.name, ticket.tags)
+        elif op == "status":
+            execute("UPDATE tickets SET status = ? WHERE name = ?",
+                    (record["status"], record["name"]))
+        elif op == "add-tags":
+            self._insert_tags(record["name"], record["tags"])
+        elif op == "remove-tags":
+            for tag in record["tags"]:
+                execute("DELETE FROM tags WHERE ticket = ? AND tag = ?",
+                        (record["name"], tag))
+        elif op == "mtime":
+            execute("UPDATE tickets SET mtime = ? WHERE name = ?",
+                    (record["mtime"], record["name"]))
+        elif op == "rename":
+            name = record["name"]
+            new_name = record["new_name"]
+            low, high = get_descendants_range(name)
+            start = len(name) + 1
+            execute(
+                "UPDATE tickets SET name = :new || substr(name, :start),"
+                "    parent = CASE WHEN name = :name THEN :parent"
+                "             ELSE :new || substr(parent, :start) END"
+                " WHERE name = :name OR (name >= :low AND name < :high)",
+                {"name": name, "new": new_name, "start": start, "low": low,
+                 "high": high,
+                 "parent": utils.get_ticket_parent_name(new_name)}
+            )
+            execute(
+                "UPDATE tags SET ticket = :new || substr(ticket, :start)"
+                " WHERE ticket = :name"
+                "    OR (ticket >= :low AND ticket < :high)",
+                {"name": name, "new": new_name, "start": start, "low": low,
+                 "high": high}
+            )
+        elif op == "delete":
+            name = record["name"]
+            low, high = get_descendants_range(name)
+            execute("DELETE FROM tickets"
+                    " WHERE name = ? OR (name >= ? AND name < ?)",
+                    (name, low, high))
+            execute("DELETE FROM tags"
+                    " WHERE ticket = ? OR (ticket >= ? AND ticket < ?)",
+                    (name, low, high))
+        else:
+            raise PyticketException(
+                "unknown journal operation '{}'".format(op)
+            )
+
+    def get_descendant_names(self, name, recursive=True):
+        """Returns the names of the childs of the given ticket, in the same
+        order as ```JsonStorage.get_descendant_names```.
+
+        :param name: the ticket name.
+        :param recursive: if ```True```, returns every descendants of this
+                          ticket, and not only direct childs.
+        :return: the childs names.
+        """
+        if recursive:
+            rows = self.connection.execute(
+                "SELECT name FROM tickets WHERE name >= ? AND name < ?",
+                get_descendants_range(name)
+            )
+            return sorted([row[0] for row in rows],
+                          key=get_hierarchy_sort_key)
+        rows = self.connection.execute(
+            "SELECT name FROM tickets WHERE parent = ? ORDER BY name", (name,)
+        )
+        return [row[0] for row in rows]
+
+    def select(self, root=None, status=None, tags=None, any_tags=None,
+               without_tags=None, since=None, until=None):
+        """Select tickets using filters (see ```Repository.list_tickets```).
+
+        :return: the list of selected tickets.
+        """
+        return list(self.iter_select(root, status, tags, any_tags,
+                                     without_tags, since, until))
+
+    def explain_select(self, root=None, status=None, tags=None,
+                       any_tags=None, without_tags=None, since=None,
+                       until=None):
+        """Describe how ```iter_select``` finds the tickets selected by the
+        given filters, using the SQLite query plan.
+
+        :return: the description.
+        """
+        where, parameters = self.get_select_condition(
+            root, status, tags, any_tags, without_tags, since, until
+        )
+        rows = self.connection.execute(
+            "EXPLAIN QUERY PLAN " + SqliteTickets.SELECT + where +
+            SqliteTickets.HIERARCHY_ORDER, parameters
+        )
+        return "; ".join([row[-1] for row in rows])
+
+    def iter_select(self, root=None, status=None, tags=None, any_tags=None,
+                    without_tags=None, since=None, until=None):
+        """Iterate over the tickets selected by the given filters (see
+        ```Repository.iter_tickets```).
+
+        Filters are translated into a single SQL query sorting the tickets
+        in hierarchy order, whose rows are read as the tickets are consumed.
+        """
+        where, parameters = self.get_select_condition(
+            root, status, tags, any_tags, without_tags, since, until
+        )
+        yield from self.tickets.iter_query(
+            where + SqliteTickets.HIERARCHY_ORDER, parameters
+        )
+
+    def get_select_condition(self, root=None, status=None, tags=None,
+                             any_tags=None, without_tags=None, since=None,
+                             until=None):
+        """Translate the given filters (see ```Repository.iter_tickets```)
+        into a SQL condition.
+
+        :return: the ```(where, parameters)``` of the condition, ```where```
+                 being empty if there is no filter.
+        """
+        def placeholders(values):
+            return ", ".join(["?"] * len(values))
+
+        conditions = []
+        parameters = []
+        if root:
+            conditions.append("(name = ? OR (name >= ? AND name < ?))")
+            parameters += [root] + list(get_descendants_range(root))
+        if status:
+            # Half the tickets may have a status: the unary "+" keeps SQLite
+            # from using the status index, so the hierarchy index gives the
+            # tickets in order instead of sorting them first.
+            conditions.append("+status = ?")
+            parameters.append(status)
+        if tags:
+            tags = set(tags)
+            conditions.append(
+                "name IN (SELECT ticket FROM tags WHERE tag IN ({})"
+                " GROUP BY ticket HAVING count(*) = ?)".format(
+                    placeholders(tags)
+                )
+            )
+            parameters += list(tags) + [len(tags)]
+        if any_tags:
+            conditions.append(
+                "name IN (SELECT ticket FROM tags WHERE tag IN ({}))".format(
+                    placeholders(any_tags)
+                )
+            )
+            parameters += list(any_tags)
+        if without_tags:
+            conditions.append(
+                "name NOT IN (SELECT ticket FROM tags WHERE tag IN ({}))"
+                .format(placeholders(without_tags))
+            )
+            parameters += list(without_tags)
+        if since is not None:
+            conditions.append("mtime >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("mtime < ?")
+            parameters.append(until)
+
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, parameters
+
+
+STORAGES = {
+    JsonStorage.NAME: JsonStorage,
+    BinaryStorage.NAME: BinaryStorage,
+    SqliteStorage.NAME: SqliteStorage,
+}
+
+
+def get_storage_class(name):
+    """Returns the storage engine class called ```name```.
+
+    :raises PyticketException: there is no such storage engine.
+    """
+    if name not in STORAGES:
+        raise PyticketException(
+            "'{}' is not a valid storage (valid ones are {})".format(
+                name, ", ".join(sorted(STORAGES))
+            )
+        )
+    return STORAGES[name]
+
+
+def get_storage_name(directory):
+    """Returns the name of the storage engine used in the given ".pyticket"
+    directory.
+    """
+    path = directory + "/storage"
+    if not os.path.isfile(path):
+        return JsonStorage.NAME
+    with open(path, "r") as f:
+        return f.read().strip()
+
+
+def set_storage_name(directory, name):
+    """Set the name of the storage engine used in the given ".pyticket"
+    directory.
+    """
+    with open(directory + "/storage", "w+") as f:
+        f.write(name)
+
+
+def create_storage(directory, name):
+    """Create an empty storage of the given engine in a ".pyticket"
+    directory.
+
+    :return: the loaded storage.
+    """
+    storage_class = get_storage_class(name)
+    storage_class.create(directory)
+    set_storage_name(directory, name)
+    return open_storage(directory)
+
+
+def open_storage(directory, lazy=False):
+    """Open the storage of the given ".pyticket" directory.
+
+    :param lazy: if ```True```, the storage is loaded when a query first
+                 needs it, instead of being loaded right now.
+    """
+    storage = get_storage_class(get_storage_name(directory))(directory)
+    if not lazy:
+        storage.load()
+    return storage
@@ -1,12 +1,28 @@
-import inspect
 import re
 import string
+import sys
 
 from pyticket import PyticketException
 
 
+def intern_tags(tags):
+    """Returns the given tags as a tuple of interned strings.
+
+    Repositories use a few tags on many tickets: interned tags are stored
+    once.
+    """
+    return tuple(map(sys.intern, tags))
+
+
 class MetaTicket:
-    """Ticket meta-information."""
+    """Ticket meta-information.
+
+    Tickets use slots, and their tags are kept in a tuple of interned
+    strings (see ```intern_tags```): a ticket must be given new tags instead
+    of being modified in place.
+    """
+
+    __slots__ = ("name", "status", "tags", "mtime")
 
     VALID_NAME_CHARSET = "-_@." + string.ascii_letters + string.digits
 
@@ -14,8 +30,8 @@ class MetaTicket:
 
     def __init__(self, name, status, tags, mtime=0.0):
         self.name = name
-        self.status = status
-        self.tags = tags
+        self.status = sys.intern(status)
+        self.tags = intern_tags(tags)
         self.mtime = mtime
 
     def to_string(self):
@@ -35,6 +51,7 @@ class MetaTicket:
         return hash(self.name)
 
     def to_json(self):
+        # The tags tuple is written as a JSON list.
         return {
             "name": self.name,
             "status": self.status,
@@ -72,6 +89,8 @@ class MetaTicket:
 
     @staticmethod
     def parse_legacy(line):
+        import inspect
+
         s = inspect.signature(MetaTicket.__init__)
         nargs = len(s.parameters) - 1
         split = line.split(" ")
@@ -1,5 +1,11 @@
+import contextlib
+import fcntl
 import os
 import os.path
+import time
+import zlib
+
+from pyticket import PyticketException
 
 
 def get_home_path():
@@ -7,6 +13,28 @@ def get_home_path():
     return os.path.expanduser("~/.pyticket")
 
 
+def parse_time(value):
+    """Parse a time given on the command line.
+
+    :param value: a timestamp in seconds, or a UTC date formatted as
+                  "YYYY-MM-DD", "YYYY-MM-DDTHH:MM" or "YYYY-MM-DDTHH:MM:SS".
+    :return: the timestamp, in seconds.
+    :raises PyticketException: the value is not a valid time.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    import calendar
+
+    for time_format in ["%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S"]:
+        try:
+            return float(calendar.timegm(time.strptime(value, time_format)))
+        except ValueError:
+            pass
+    raise PyticketException("'{}' is not a valid time".format(value))
+
+
 def get_ticket_parent_name(name):
     """Returns the ticket's parent name.
 
@@ -30,3 +58,75 @@ def get_ticket_basename(name):
     if parent_name:
         return name[len(parent_name)+1:]
     return name
+
+
+def get_content_path(contents, name):
+    """Returns the path of the content file of a ticket.
+
+    Content files are spread in 256 directories of the contents directory,
+    named by the last two hexadecimal digits of the CRC-32 of the ticket
+    name, so no directory holds too many files.
+
+    :param contents: the contents directory.
+    :param name: the ticket name.
+    """
+    return "{}/{:02x}/{}".format(
+        contents, zlib.crc32(name.encode("utf-8")) & 0xff, name
+    )
+
+
+def iter_content_files(contents):
+    """Iterate over the ```os.DirEntry``` of every content file of a
+    contents directory (see ```get_content_path```).
+    """
+    with os.scandir(contents) as entries:
+        shards = [entry.path for entry in entries if entry.is_dir()]
+    for shard in shards:
+        with os.scandir(shard) as entries:
+            for entry in entries:
+                if not entry.name.startswith(".") and entry.is_file():
+                    yield entry
+
+
+def write_file_atomically(path, content):
+    """Replace the content of the given file.
+
+    The content is written in a temporary file, synchronized to the disk,
+    then moved over the file: readers and an interrupted write never see a
+    partially written file.
+
+    :param path: the file path.
+    :param content: the new file content, as a string or bytes.
+    """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(tmp_path, "wb" if isinstance(content, bytes) else "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Make the rename itself durable.
+    fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on the given file, creating it if
+    needed. Waits until other processes release it.
+
+    :param path: the lock file path.
+    """
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -4,7 +4,9 @@ import os
 
 from tests import (
     test_configuration, test_generators, test_migrations, test_repository,
-    test_ticket, test_commands, test_git
+    test_ticket, test_commands, test_git, test_journal, test_storage,
+    test_cache, test_server, test_command, test_binary, test_query,
+    test_search, test_grep, test_render, test_archive
 )
 
 
@@ -19,6 +21,17 @@ def suite():
     suite.addTests(loader.loadTestsFromModule(test_ticket))
     suite.addTests(loader.loadTestsFromModule(test_commands))
     suite.addTests(loader.loadTestsFromModule(test_git))
+    suite.addTests(loader.loadTestsFromModule(test_journal))
+    suite.addTests(loader.loadTestsFromModule(test_storage))
+    suite.addTests(loader.loadTestsFromModule(test_cache))
+    suite.addTests(loader.loadTestsFromModule(test_server))
+    suite.addTests(loader.loadTestsFromModule(test_command))
+    suite.addTests(loader.loadTestsFromModule(test_binary))
+    suite.addTests(loader.loadTestsFromModule(test_query))
+    suite.addTests(loader.loadTestsFromModule(test_search))
+    suite.addTests(loader.loadTestsFromModule(test_grep))
+    suite.addTests(loader.loadTestsFromModule(test_render))
+    suite.addTests(loader.loadTestsFromModule(test_archive))
     return suite
 
 
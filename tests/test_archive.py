@@ -0,0 +1,188 @@
+import unittest
+import os
+import os.path
+import shutil
+from unittest import mock
+
+from pyticket import PyticketException
+from pyticket import archive
+from pyticket.repository import Repository
+
+from tests import utils
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = utils.get_test_root_dir()
+        self.repository = Repository(self.root, create=True)
+        r = self.repository
+        r.create_ticket("done", "opened", ["bug"])
+        r.write_ticket_content("done", "# Done\n\nThe disk was full.")
+        r.create_ticket("done.child", "closed", [])
+        r.create_ticket("done.child.leaf", "closed", [])
+        r.write_ticket_content("done.child.leaf", "# Leaf")
+        r.create_ticket("partial", "opened", [])
+        r.create_ticket("partial.child", "closed", [])
+        r.create_ticket("todo", "opened", [])
+        r.switch_ticket_status("done", "closed")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def names(self, **filters):
+        return [t.name for t in self.repository.iter_tickets(**filters)]
+
+    def reopen(self):
+        # Archive files are read again by another repository instance.
+        return Repository(self.root)
+
+    def test_archive(self):
+        r = self.repository
+        self.assertEqual(r.archive_tickets(),
+                         ["done", "done.child", "done.child.leaf"])
+        self.assertEqual(r.archive_tickets(), [])
+
+        r = self.reopen()
+        self.assertFalse(r.has_ticket("done"))
+        self.assertTrue(r.is_archived("done.child"))
+        self.assertFalse(os.path.exists(r.get_ticket_content_path("todo")
+                                        .replace("todo", "done")))
+        self.assertEqual(r.get_ticket("done").tags, ("bug",))
+        self.assertEqual(r.read_ticket_content("done"),
+                         "# Done\n\nThe disk was full.")
+        self.assertEqual(r.read_ticket_content("done.child.leaf"), "# Leaf")
+        self.assertFalse(r.has_ticket_content("done.child"))
+        self.assertEqual(r.get_subtree_names("done"),
+                         ["done", "done.child", "done.child.leaf"])
+        self.assertEqual(list(r.read_contents(["done", "done.child"])), [
+            ("done", "# Done\n\nThe disk was full."),
+            ("done.child", None),
+        ])
+
+    def test_archive_ticket(self):
+        r = self.repository
+        with self.assertRaises(PyticketException):
+            r.archive_tickets("partial")
+        with self.assertRaises(PyticketException):
+            r.archive_tickets("todo")
+        with self.assertRaises(PyticketException):
+            r.archive_tickets("done.child")
+        with self.assertRaises(PyticketException):
+            r.archive_tickets("missing")
+        r.switch_ticket_status("partial", "closed")
+        self.assertEqual(r.archive_tickets("partial"),
+                         ["partial", "partial.child"])
+        self.assertTrue(r.has_ticket("done"))
+
+    def test_list(self):
+        self.repository.archive_tickets()
+        r = self.reopen()
+        self.assertEqual(self.names(status="opened"),
+                         ["partial", "todo"])
+        # Listing opened tickets doesn't read the archive.
+        self.assertIsNone(r.archive)
+        self.repository = r
+        self.assertEqual(self.names(status="opened"),
+                         ["partial", "todo"])
+        self.assertIsNone(r.archive)
+        self.assertEqual(self.names(status="closed"),
+                         ["partial.child", "done", "done.child",
+                          "done.child.leaf"])
+        self.assertEqual(self.names(tags=["bug"]), ["done"])
+        self.assertEqual(self.names(root="done.child"),
+                         ["done.child", "done.child.leaf"])
+        self.assertEqual(self.names(root="done", status="opened"), [])
+        self.assertIn("archived", r.explain_tickets(status="closed"))
+        self.assertNotIn("archived", r.explain_tickets(status="opened"))
+
+    def test_unpack(self):
+        r = self.repository
+        r.archive_tickets()
+        r.switch_ticket_status("done.child", "opened")
+        self.assertFalse(r.get_archive().exists() and
+                         r.get_archive().get_tickets())
+        self.assertEqual(r.get_ticket("done.child").status, "opened")
+        self.assertTrue(r.has_ticket("done"))
+        self.assertEqual(r.read_ticket_content("done.child.leaf"), "# Leaf")
+        self.assertTrue(os.path.isfile(
+            r.get_ticket_content_path("done.child.leaf")
+        ))
+
+        r.switch_ticket_status("done.child", "closed")
+        r.switch_ticket_status("done", "closed")
+        self.assertEqual(r.archive_tickets(),
+                         ["done", "done.child", "done.child.leaf"])
+        # Getting a path doesn't unpack the tree.
+        with self.assertRaises(PyticketException):
+            r.get_ticket_content_path("done", create=True)
+        self.assertTrue(r.is_archived("done"))
+        r.create_ticket("done.other", "opened", [])
+        self.assertEqual(self.names(root="done"),
+                         ["done", "done.child", "done.child.leaf",
+                          "done.other"])
+        with self.assertRaises(PyticketException):
+            r.create_ticket("done", "opened", [])
+
+        r.archive_tickets()
+        r.write_ticket_content("done", "# Done again")
+        self.assertFalse(r.is_archived("done"))
+        self.assertEqual(r.read_ticket_content("done"), "# Done again")
+
+    def test_unchanged_status(self):
+        r = self.repository
+        r.archive_tickets()
+        r.switch_ticket_status("done.child", "closed")
+        self.assertTrue(r.is_archived("done"))
+        self.assertTrue(r.is_archived("done.child.leaf"))
+
+    def test_names_cache(self):
+        self.repository.archive_tickets()
+        self.assertTrue(self.reopen().is_archived("done"))
+
+        # The archived tickets are not read to check a name is free.
+        r = self.reopen()
+        with mock.patch.object(archive.Archive, "get_tickets") as m:
+            r.create_ticket("new", "opened", [])
+            r.rename_ticket("new", "renamed")
+            with self.assertRaises(PyticketException):
+                r.create_ticket("done", "opened", [])
+            with self.assertRaises(PyticketException):
+                r.rename_ticket("renamed", "done")
+            m.assert_not_called()
+
+        # Archiving more tickets changes the cached names.
+        r.switch_ticket_status("renamed", "closed")
+        r.archive_tickets()
+        self.assertTrue(self.reopen().is_archived("renamed"))
+        self.assertFalse(self.reopen().is_archived("todo"))
+
+    def test_delete(self):
+        r = self.repository
+        r.archive_tickets()
+        r.delete_ticket("done.child")
+        self.assertEqual(self.names(status="closed"),
+                         ["partial.child", "done"])
+        r.delete_ticket("done")
+        self.assertEqual(self.names(status="closed"), ["partial.child"])
+        with self.assertRaises(PyticketException):
+            r.get_ticket("done")
+        r.create_ticket("done", "opened", [])
+
+    def test_repack(self):
+        r = self.repository
+        r.archive_tickets()
+        a = r.get_archive()
+        content = os.urandom(archive.MIN_REPACK_SIZE).hex()
+        r.create_ticket("big", "closed", [])
+        r.write_ticket_content("big", content)
+        r.archive_tickets()
+        self.assertEqual(a.get_index()["pack"], "pack-1")
+
+        r.delete_ticket("big")
+        self.assertEqual(a.get_index()["pack"], "pack-2")
+        self.assertEqual(sorted(os.listdir(a.path)),
+                         ["index", "pack-2", "tickets"])
+        self.assertEqual(r.read_ticket_content("done"),
+                         "# Done\n\nThe disk was full.")
+        self.assertEqual(r.read_ticket_content("done.child.leaf"), "# Leaf")
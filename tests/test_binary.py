@@ -0,0 +1,79 @@
+"""Tests the binary tickets file format."""
+import struct
+import unittest
+
+from pyticket import PyticketException
+from pyticket.binary import HEADER, TicketsFile, encode_tickets
+from pyticket.storage import get_hierarchy_sort_key
+from pyticket.ticket import MetaTicket
+
+from tests import generators
+
+
+class BinaryTest(unittest.TestCase):
+
+    def test_encode_decode(self):
+        tickets = [generators.gen_meta_ticket() for _ in range(100)]
+        tickets.append(MetaTicket("héllo.wörld", "closed",
+                                  ["été", "tag"], 12.5))
+        tickets.sort(key=lambda t: get_hierarchy_sort_key(t.name))
+        tickets_file = TicketsFile(encode_tickets(42, tickets))
+        self.assertEqual(tickets_file.generation, 42)
+        self.assertEqual(tickets_file.get_tickets(), tickets)
+        for i, ticket in enumerate(tickets):
+            self.assertEqual(tickets_file.get_ticket(i), ticket)
+
+    def test_find(self):
+        names = ["a", "a.ab", "ab", "b.a", "été"]
+        tickets = [MetaTicket(name, "opened", ["a", "b"], 0.0)
+                   for name in names]
+        tickets_file = TicketsFile(encode_tickets(0, tickets))
+        for i, name in enumerate(names):
+            self.assertEqual(tickets_file.find(name), i)
+        for name in ["b", "a.a", "abb", "té"]:
+            self.assertEqual(tickets_file.find(name), None)
+
+    def test_mtime_range(self):
+        tickets = [MetaTicket("t{:02}".format(i), "opened", [],
+                              float(i % 10))
+                   for i in range(100)]
+        data = encode_tickets(0, tickets)
+        # The same file without mtime order, as written by version 1.
+        order_start = HEADER.size + 4 * (len(tickets) + 1)
+        legacy = (data[:4] + struct.pack("<H", 1) + data[6:order_start] +
+                  data[order_start + 4 * len(tickets):])
+        for tickets_file in [TicketsFile(data), TicketsFile(legacy)]:
+            self.assertEqual(tickets_file.get_tickets(), tickets)
+            order = tickets_file.get_mtime_order()
+            for since, until in [(None, None), (2.0, 5.0), (2.5, None),
+                                 (None, 0.0), (5.0, 2.0), (9.0, 100.0)]:
+                found = set([tickets_file.get_ticket(i).name for i in
+                             order[tickets_file.find_mtime_range(since,
+                                                                 until)]])
+                expected = set([
+                    t.name for t in tickets
+                    if (since is None or t.mtime >= since) and
+                    (until is None or t.mtime < until)
+                ])
+                self.assertEqual(found, expected)
+
+    def test_hierarchy_order(self):
+        names = ["b", "a.z", "a-b", "a", "a.y.k", "b.x", "a.y"]
+        tickets_file = TicketsFile(encode_tickets(0, [
+            MetaTicket(name, "opened", [], 0.0) for name in names
+        ]))
+        self.assertEqual(tickets_file.version, 3)
+        self.assertEqual([t.name for t in tickets_file.get_tickets()],
+                         ["a", "a.y", "a.y.k", "a.z", "a-b", "b", "b.x"])
+
+    def test_invalid_file(self):
+        data = encode_tickets(0, [generators.gen_meta_ticket()])
+        self.assertRaises(PyticketException, TicketsFile, b"[]")
+        self.assertRaises(PyticketException, TicketsFile, data[:-1])
+        self.assertRaises(PyticketException, TicketsFile, data[:50])
+        self.assertRaises(PyticketException, TicketsFile,
+                          b"XXXX" + data[4:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Tests the binary caches."""
+import unittest
+import os.path
+import shutil
+
+from pyticket import cache
+
+from tests import utils
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = utils.get_test_root_dir()
+        self.path = cache.get_cache_directory(self.directory) + "/entry"
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cache_directory(self):
+        path = cache.get_cache_directory(self.directory)
+        self.assertTrue(os.path.isdir(path))
+        self.assertEqual(utils.read_file_content(path + "/.gitignore"), "*\n")
+
+    def test_read_write(self):
+        value = {"blectre": [1, 2, 3]}
+        cache.write_cache(self.path, [1, 2], value)
+        self.assertEqual(cache.read_cache(self.path, [1, 2]), value)
+
+    def test_missing(self):
+        self.assertEqual(cache.read_cache(self.path, [1, 2]), None)
+
+    def test_stale(self):
+        cache.write_cache(self.path, [1, 2], "value")
+        self.assertEqual(cache.read_cache(self.path, [1, 3]), None)
+
+    def test_corrupted(self):
+        cache.write_cache(self.path, [1, 2], list(range(1000)))
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) // 2)
+        self.assertEqual(cache.read_cache(self.path, [1, 2]), None)
+
+    def test_file_key(self):
+        path = self.directory + "/file"
+        with open(path, "w+") as f:
+            f.write("blectre")
+        key = cache.get_file_key(path)
+        with open(path, "r") as f:
+            self.assertEqual(cache.get_file_key(f.fileno()), key)
+        with open(path, "a") as f:
+            f.write("blectre")
+        self.assertNotEqual(cache.get_file_key(path), key)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from unittest import mock
+
+from pyticket import PyticketException
+from pyticket.command import (
+    argument, command, command_table, execute_argv, option
+)
+
+
+class CommandTest(unittest.TestCase):
+
+    def test_execute_argv(self):
+        callback = mock.MagicMock()
+        commands = command_table([
+            command("a", "A command", callback,
+                    [option("flag", "a flag", False),
+                     option("value", "a value", True)],
+                    args=[argument("x", "an argument", False),
+                          argument("y", "an optional argument", True)])
+        ])
+        execute_argv(commands, ["a", "1", "--flag", "--value", "v"])
+        callback.assert_called_with({"flag": None, "value": "v"}, x="1")
+        execute_argv(commands, ["a", "1", "2"])
+        callback.assert_called_with({}, x="1", y="2")
+        self.assertRaises(PyticketException, execute_argv, commands, ["a"])
+        self.assertRaises(PyticketException, execute_argv, commands, ["b"])
+
+    def test_lazy_callback(self):
+        commands = command_table([
+            command("parent", "Print a ticket parent",
+                    "pyticket.utils:get_ticket_parent_name",
+                    args=[argument("name", "the ticket name", False)])
+        ])
+        with mock.patch("pyticket.utils.get_ticket_parent_name") as m:
+            execute_argv(commands, ["parent", "a.b"])
+            m.assert_called_with({}, name="a.b")
+
+
+if __name__ == "__main__":
+    unittest.main()
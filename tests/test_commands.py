@@ -1,11 +1,19 @@
 import unittest
 from unittest import mock
+import os
+import shutil
 
+from pyticket import PyticketException
 from pyticket.commands import (
     create_ticket, edit_ticket, show_ticket, list_tickets, close_ticket,
     reopen_ticket, delete_ticket, rename_ticket, works_on, release, configure,
-    init
+    init, compact, table, search, grep, archive
 )
+from pyticket.repository import Repository
+from pyticket.storage import STORAGES
+from pyticket.ticket import MetaTicket
+
+from tests import utils
 
 
 @mock.patch('pyticket.commands.Repository')
@@ -14,7 +22,7 @@ class CommandsTest(unittest.TestCase):
     @mock.patch('subprocess.call')
     def test_create_ticket(self, call_mock, repo_mock):
         create_ticket({}, "blectre", "debug")
-        repo_mock.assert_called_with(".")
+        repo_mock.assert_called_with(".", lazy=True)
         repo_mock().create_ticket.assert_called_with(
             "blectre", "opened", []
         )
@@ -24,6 +32,7 @@ class CommandsTest(unittest.TestCase):
     @mock.patch('subprocess.call')
     def test_edit_ticket(self, call_mock, repo_mock):
         edit_ticket({}, "blectre")
+        repo_mock().unpack_archived.assert_called_with("blectre")
         call_mock.assert_called()
 
     @mock.patch('subprocess.call')
@@ -31,24 +40,107 @@ class CommandsTest(unittest.TestCase):
         create_ticket({"no-edit": None}, "blectre", "debug")
         call_mock.assert_not_called()
 
-    @mock.patch('pyticket.commands.vmd')
-    def test_show_ticket(self, vmd_mock, repo_mock):
+    @mock.patch.dict('sys.modules', {'vmd': mock.MagicMock()})
+    @mock.patch('pyticket.render.RenderCache')
+    def test_show_ticket(self, cache_mock, repo_mock):
+        repo_mock().get_subtree_names.return_value = ["blectre"]
         show_ticket({}, "blectre")
-        repo_mock.assert_called_with(".")
-        repo_mock().read_ticket_content.assert_called_with("blectre")
+        repo_mock.assert_called_with(".", lazy=True)
+        repo_mock().read_contents.assert_called_with(["blectre"])
 
     def test_list_tickets(self, repo_mock):
         list_tickets({"opened": None, "tags": "x,y"}, "blectre")
-        repo_mock().list_tickets.assert_called_with(
-            root="blectre", status="opened", tags=["x", "y"]
+        repo_mock().iter_tickets.assert_called_once_with(
+            root="blectre", status="opened", tags=["x", "y"], any_tags=None,
+            without_tags=None, since=None, until=None
         )
 
+    def test_list_tickets_tags_filters(self, repo_mock):
+        list_tickets({"any-tags": "x,y", "without-tags": "z"})
+        repo_mock().iter_tickets.assert_has_calls([
+            mock.call(root=None, status=status, tags=None,
+                      any_tags=["x", "y"], without_tags=["z"], since=None,
+                      until=None)
+            for status in ["opened", "closed"]
+        ])
+
+    def test_list_tickets_time_filters(self, repo_mock):
+        list_tickets({"closed": None, "since": "1970-01-02",
+                      "until": "200000.5"})
+        repo_mock().iter_tickets.assert_called_once_with(
+            root=None, status="closed", tags=None, any_tags=None,
+            without_tags=None, since=86400.0, until=200000.5
+        )
+        self.assertRaises(PyticketException, list_tickets,
+                          {"since": "yesterday"})
+
+    def test_list_tickets_query(self, repo_mock):
+        list_tickets({"opened": None, "tags": "x",
+                      "query": "tag:y and name:a.* and mtime<10"})
+        repo_mock().iter_tickets.assert_called_once_with(
+            root="a", status="opened", tags=["x", "y"], any_tags=None,
+            without_tags=None, since=None, until=10.0
+        )
+        with mock.patch("builtins.print"):
+            list_tickets({"query": "status:closed", "explain": None})
+        repo_mock().explain_tickets.assert_called_once_with(
+            root=None, status="closed", tags=None, any_tags=None,
+            without_tags=None, since=None, until=None
+        )
+        self.assertRaises(PyticketException, list_tickets,
+                          {"query": "tag:y and"})
+
+    def test_search(self, repo_mock):
+        repo_mock().search_tickets.return_value = [("a", 2.0), ("b", 1.0)]
+        with mock.patch("builtins.print") as print_mock:
+            search({}, "disk full")
+        repo_mock().search_tickets.assert_called_once_with("disk full", 20)
+        self.assertEqual(len(print_mock.call_args_list), 2)
+        search({"count": "0"}, "disk")
+        repo_mock().search_tickets.assert_called_with("disk", None)
+
+    @mock.patch("pyticket.grep.iter_matches")
+    def test_grep(self, matches_mock, repo_mock):
+        matches_mock.return_value = [("a", 2, "disk full")]
+        with mock.patch("builtins.print") as print_mock:
+            grep({}, "disk")
+        print_mock.assert_called_once_with("a:2: disk full")
+        # Without filters, every content file is read.
+        self.assertIsNone(matches_mock.call_args[0][2])
+        repo_mock().iter_tickets.assert_not_called()
+
+        repo_mock().iter_tickets.return_value = iter([
+            MetaTicket("a", "opened", ["bug"], 0)
+        ])
+        grep({"tags": "bug", "jobs": "2", "ignore-case": None}, "disk")
+        repo_mock().iter_tickets.assert_called_once()
+        self.assertEqual(matches_mock.call_args[0][2:], (["a"], True, 2))
+
     def test_close_ticket(self, repo_mock):
         close_ticket({}, "blectre")
         repo_mock().switch_ticket_status.assert_called_with(
             "blectre", "closed"
         )
 
+    def test_table_count(self, repo_mock):
+        tickets = [MetaTicket("t{}".format(i), "opened", [], i % 7)
+                   for i in range(50)]
+
+        def shown(options):
+            repo_mock().iter_tickets.return_value = iter(tickets)
+            with mock.patch("builtins.print") as print_mock:
+                table(options)
+            return [c[0][0].split()[0] for c in print_mock.call_args_list
+                    if c[0][0].startswith(" t")]
+
+        by_mtime = sorted(tickets, key=lambda t: t.mtime, reverse=True)
+        by_name = sorted(tickets, key=lambda t: t.name)
+        self.assertEqual(shown({"count": "5"}),
+                         [t.name for t in by_mtime[:5]])
+        self.assertEqual(shown({"count": "5", "sorted-name": None}),
+                         [t.name for t in by_name[:5]])
+        self.assertEqual(shown({}), [t.name for t in by_mtime])
+
     def test_reopen_ticket(self, repo_mock):
         reopen_ticket({}, "blectre")
         repo_mock().switch_ticket_status.called_with(
@@ -90,6 +182,54 @@ class CommandsTest(unittest.TestCase):
         init({}, "blectre")
         repo_mock.assert_called_with("blectre", create=True)
 
+    def test_compact(self, repo_mock):
+        compact({})
+        repo_mock().compact.assert_called()
+
+    def test_archive(self, repo_mock):
+        repo_mock().archive_tickets.return_value = ["a", "a.b"]
+        with mock.patch("builtins.print") as print_mock:
+            archive({})
+        repo_mock().archive_tickets.assert_called_once_with(None)
+        print_mock.assert_called_once_with("2 tickets archived")
+        archive({}, "a")
+        repo_mock().archive_tickets.assert_called_with("a")
+
+
+class ListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = utils.get_test_root_dir()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_hierarchy_order(self):
+        for storage in sorted(STORAGES):
+            directory = self.root + "/" + storage
+            os.mkdir(directory)
+            r = Repository(directory, create=True, storage=storage)
+            for i, name in enumerate(["b", "a", "a.z", "c", "a.y", "a.y.k",
+                                      "b.x", "a-b", "d"]):
+                r.create_ticket(name, "opened", [])
+                if i == 4:
+                    # Tickets both in the tickets file and in the journal.
+                    r.compact()
+            r.rename_ticket("c", "b.c")
+            for repository in [r, Repository(directory, lazy=True)]:
+                with mock.patch("pyticket.commands.served_repository",
+                                repository), \
+                        mock.patch("builtins.print") as print_mock:
+                    list_tickets({"opened": None})
+                self.assertEqual(
+                    [c[0][0] for c in print_mock.call_args_list], [
+                        "opened:", "    a", "     a.y", "      a.y.k",
+                        "     a.z", "    a-b", "    b", "     b.c",
+                        "     b.x", "    d", "closed:"
+                    ],
+                    storage
+                )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import shutil
+
+from pyticket import PyticketException
+from pyticket import grep
+from pyticket.repository import Repository
+
+from tests import utils
+
+
+class GrepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = utils.get_test_root_dir()
+        self.repository = Repository(self.root, create=True)
+        self.contents = self.repository.contents
+        contents = {
+            "disk": "The disk is full.\nFree some disk space.\nDisk",
+            "network": "The network is down,\n\nthe disk is fine.",
+            "ui": "Buttons are too small.",
+        }
+        for name, content in sorted(contents.items()):
+            self.repository.create_ticket(name, "opened", [])
+            self.repository.write_ticket_content(name, content)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def matches(self, pattern, names=None, **kwargs):
+        return sorted(grep.iter_matches(self.contents, pattern, names,
+                                        **kwargs))
+
+    def test_grep(self):
+        self.assertEqual(self.matches("disk"), [
+            ("disk", 1, "The disk is full."),
+            ("disk", 2, "Free some disk space."),
+            ("network", 3, "the disk is fine."),
+        ])
+        self.assertEqual(self.matches("^disk$", ignore_case=True),
+                         [("disk", 3, "Disk")])
+        self.assertEqual(self.matches("disk", ["network", "ui"]),
+                         [("network", 3, "the disk is fine.")])
+        self.assertEqual(self.matches("^$"), [("network", 2, "")])
+        self.assertEqual(self.matches("printer"), [])
+        with self.assertRaises(PyticketException):
+            self.matches("disk(")
+
+    def test_pool(self):
+        names = ["ticket-{}".format(i) for i in range(grep.SERIAL_FILES * 2)]
+        for i, name in enumerate(names):
+            self.repository.create_ticket(name, "opened", [])
+            self.repository.write_ticket_content(
+                name, "line\n" * i + "match {}\n".format(i)
+            )
+        expected = [(name, i + 1, "match {}".format(i))
+                    for i, name in enumerate(names)]
+        self.assertEqual(self.matches("match", names, jobs=2),
+                         sorted(expected))
+        self.assertEqual(self.matches("match", names, jobs=1),
+                         sorted(expected))
+
+        # Stopping the iteration early cancels the remaining chunks.
+        matches = grep.iter_matches(self.contents, "match", names, jobs=2)
+        self.assertIn(next(matches), expected)
+        matches.close()
@@ -0,0 +1,54 @@
+"""Tests the repository journal."""
+import unittest
+import os
+import shutil
+
+from pyticket.journal import Journal
+
+from tests import utils
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = utils.get_test_root_dir()
+        self.journal = Journal(self.directory + "/journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_missing_journal(self):
+        self.assertEqual(self.journal.read(), (0, []))
+        self.assertEqual(self.journal.size(), 0)
+        self.assertEqual(self.journal.key(), None)
+
+    def test_append_and_read(self):
+        records = [
+            {"op": "status", "name": "blectre", "status": "closed"},
+            {"op": "mtime", "name": "blectre", "mtime": 42.0},
+        ]
+        self.journal.append(records[:1])
+        self.journal.append(records[1:])
+        self.assertEqual(self.journal.read(), (0, records))
+        self.assertEqual(self.journal.size(),
+                         os.path.getsize(self.directory + "/journal"))
+
+    def test_torn_record(self):
+        record = {"op": "delete", "name": "blectre"}
+        self.journal.append([record])
+        with open(self.journal.path, "a") as f:
+            f.write('{"op": "del')
+        self.assertEqual(self.journal.read(), (0, [record]))
+
+    def test_reset(self):
+        self.journal.append([{"op": "delete", "name": "blectre"}])
+        self.journal.reset(3)
+        self.assertEqual(self.journal.read(), (3, []))
+        record = {"op": "delete", "name": "other"}
+        self.journal.append([record])
+        self.assertEqual(self.journal.read(), (3, [record]))
+        self.assertEqual(os.listdir(self.directory), ["journal"])
+
+
+if __name__ == "__main__":
+    unittest.main()
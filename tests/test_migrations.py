@@ -7,6 +7,9 @@ import shutil
 import random
 
 from pyticket import migrations
+from pyticket import storage
+from pyticket import utils as utils_module
+from pyticket.repository import Repository
 from pyticket.ticket import MetaTicket
 
 from tests import generators
@@ -105,7 +108,8 @@ class MigrationsTest(unittest.TestCase):
                     path = "{}/contents/{}".format(self.directory, name)
                     with open(path, "w+") as f_content:
                         f_content.write(content)
-                        mtime = os.path.getmtime(path)
+                    # The file is modified when it is flushed, on close.
+                    mtime = os.path.getmtime(path)
                 f.write("{} {} ({})\n".format(name, status, ",".join(tags)))
                 tickets[name] = (status, tags, mtime)
 
@@ -118,11 +122,12 @@ class MigrationsTest(unittest.TestCase):
             self.assertEqual(len(lines), len(tickets))
             for line in lines:
                 ticket = MetaTicket.parse_legacy(line)
-            self.assertTrue(ticket.name in tickets)
-            self.assertEqual(ticket.status, tickets[ticket.name][0])
-            self.assertEqual(ticket.tags, tickets[ticket.name][1])
-            if tickets[ticket.name][2]:
-                self.assertEqual(ticket.mtime, tickets[ticket.name][2])
+                self.assertTrue(ticket.name in tickets)
+                self.assertEqual(ticket.status, tickets[ticket.name][0])
+                self.assertEqual(ticket.tags,
+                                 tuple(tickets[ticket.name][1]))
+                if tickets[ticket.name][2]:
+                    self.assertEqual(ticket.mtime, tickets[ticket.name][2])
 
     @repeat(10)
     def test_json_migration(self):
@@ -154,6 +159,101 @@ class MigrationsTest(unittest.TestCase):
                 legacy_ticket = [t for t in legacy_tickets if t == meta_ticket]
                 self.assertTrue(legacy_ticket)
 
+    def test_storage_migration(self):
+        migrations.storage_migration(self.directory)
+        self.assertEqual(storage.get_storage_name(self.directory),
+                         storage.JsonStorage.NAME)
+
+    def test_contents_sharding_migration(self):
+        contents = self.directory + "/contents"
+        os.mkdir(contents)
+        # A ticket can be named like a contents subdirectory.
+        names = ["ab", "root", "root.child", "ticket-{:02x}".format(0xab)]
+        for name in names:
+            with open(contents + "/" + name, "w") as f:
+                f.write(name)
+
+        # An interrupted migration has moved a file.
+        moved = utils_module.get_content_path(
+            self.directory + "/contents.sharded", "root"
+        )
+        os.makedirs(os.path.dirname(moved))
+        os.rename(contents + "/root", moved)
+
+        migrations.contents_sharding_migration(self.directory)
+        self.assertFalse(os.path.exists(self.directory + "/contents.sharded"))
+        for name in names:
+            path = utils_module.get_content_path(contents, name)
+            with open(path, "r") as f:
+                self.assertEqual(f.read(), name)
+        files = utils_module.iter_content_files(contents)
+        self.assertEqual(sorted([entry.name for entry in files]),
+                         sorted(names))
+
+    def test_convert_storage(self):
+        r = Repository(self.directory, create=True)
+        for i in range(100):
+            r.create_ticket(generators.gen_child_ticket_name(list(r.tickets)),
+                            generators.gen_status(),
+                            list(set(generators.gen_tags())))
+        tickets = dict(r.tickets.items())
+        directory = self.directory + "/.pyticket"
+
+        migrations.convert_storage(directory, storage.SqliteStorage.NAME)
+        self.assertFalse(os.path.exists(directory + "/tickets"))
+        r = Repository(self.directory)
+        self.assertEqual(r.storage.NAME, storage.SqliteStorage.NAME)
+        self.assertEqual(r.tickets, tickets)
+
+        migrations.convert_storage(directory, storage.JsonStorage.NAME)
+        self.assertFalse(os.path.exists(directory + "/tickets.sqlite"))
+        r = Repository(self.directory)
+        self.assertEqual(r.storage.NAME, storage.JsonStorage.NAME)
+        self.assertEqual(r.tickets, tickets)
+
+        # The JSON and binary engines share the journal.
+        r.add_tags(list(tickets)[0], ["converted"])
+        tickets = dict(r.tickets.items())
+        migrations.convert_storage(directory, storage.BinaryStorage.NAME)
+        self.assertFalse(os.path.exists(directory + "/tickets"))
+        r = Repository(self.directory)
+        self.assertEqual(r.storage.NAME, storage.BinaryStorage.NAME)
+        self.assertEqual(r.tickets, tickets)
+
+        r.remove_tags(list(tickets)[0], ["converted"])
+        tickets = dict(r.tickets.items())
+        migrations.convert_storage(directory, storage.JsonStorage.NAME)
+        self.assertFalse(os.path.exists(directory + "/tickets.bin"))
+        r = Repository(self.directory)
+        self.assertEqual(r.tickets, tickets)
+
+    def test_sqlite_hierarchy_index_migration(self):
+        import sqlite3
+
+        Repository(self.directory, create=True,
+                   storage=storage.SqliteStorage.NAME)
+        directory = self.directory + "/.pyticket"
+        path = directory + "/tickets.sqlite"
+
+        def has_index():
+            connection = sqlite3.connect(path)
+            rows = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'tickets_hierarchy'"
+            ).fetchall()
+            connection.close()
+            return bool(rows)
+
+        self.assertTrue(has_index())
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute("DROP INDEX tickets_hierarchy")
+        connection.close()
+        self.assertFalse(has_index())
+        migrations.sqlite_hierarchy_index_migration(directory)
+        self.assertTrue(has_index())
+        # Other engines are left as they are.
+        migrations.sqlite_hierarchy_index_migration(self.directory)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from pyticket import PyticketException
+from pyticket import query
+from pyticket.ticket import MetaTicket
+
+
+class QueryTest(unittest.TestCase):
+
+    def test_parse(self):
+        expression = query.parse(
+            "status:opened and tag:bug not tag:wontfix"
+            " and (name:core.* or mtime>=1970-01-02)"
+        )
+        self.assertEqual(
+            str(expression),
+            "(status:opened and tag:bug and not tag:wontfix and"
+            " (name:core.* or mtime>=1970-01-02))"
+        )
+        self.assertEqual(expression.operands[3].operands[1].time, 86400.0)
+        self.assertEqual(str(query.parse("tag:a or tag:b and tag:c")),
+                         "(tag:a or (tag:b and tag:c))")
+        for text in ["", "tag:a and", "(tag:a", "tag:a)", "or tag:a",
+                     "owner:me", "status:pending", "mtime=0", "mtime<now"]:
+            self.assertRaises(PyticketException, query.parse, text)
+
+    def test_match(self):
+        ticket = MetaTicket("core.net", "opened", ["bug", "ui"], 100.0)
+        for text, expected in [
+            ("status:opened tag:bug", True),
+            ("status:closed or tag:ui", True),
+            ("not tag:ui", False),
+            ("name:core.*", True),
+            ("name:core", False),
+            ("mtime>100", False),
+            ("mtime<=100 and mtime>=100", True),
+        ]:
+            self.assertEqual(query.parse(text).match(ticket), expected, text)
+
+    def test_compile(self):
+        plan = query.compile_query(query.parse(
+            "status:opened tag:bug not tag:wontfix (tag:a or tag:b)"
+            " name:core.net* mtime>=10 mtime>20 mtime<=50 mtime<40"
+        ))
+        self.assertEqual(plan.root, "core")
+        self.assertEqual(plan.status, "opened")
+        self.assertEqual(plan.tags, ["bug"])
+        self.assertEqual(plan.any_tags, ["a", "b"])
+        self.assertEqual(plan.without_tags, ["wontfix"])
+        self.assertEqual((plan.since, plan.until), (20.0, 40.0))
+        self.assertEqual(str(plan.residual),
+                         "(name:core.net* and mtime>20 and mtime<=50)")
+
+        plan = query.compile_query(query.parse("tag:a or status:closed"))
+        self.assertEqual(plan.tags, [])
+        self.assertEqual(str(plan.residual), "(tag:a or status:closed)")
+        self.assertEqual(query.Name("core").get_root(), "core")
+        self.assertIsNone(query.Name("co*").get_root())
+
+
+if __name__ == "__main__":
+    unittest.main()
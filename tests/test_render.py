@@ -0,0 +1,119 @@
+import io
+import os
+import unittest
+import shutil
+from unittest import mock
+
+import vmd
+
+from pyticket.render import (
+    RenderCache, SubtreeRenderer, iter_subtree_contents, shift_headings
+)
+from pyticket.repository import Repository
+
+from tests import utils
+
+
+class RenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = utils.get_test_root_dir()
+        self.repository = Repository(self.root, create=True)
+        for name in ["epic", "epic.a", "epic.a.x", "epic.b", "other"]:
+            self.repository.create_ticket(name, "opened", [])
+        self.repository.write_ticket_content("epic", "# Epic\n\n## Plan\n")
+        self.repository.write_ticket_content("epic.a", "# A\n\ntext\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_shift_headings(self):
+        self.assertEqual(shift_headings("# a\ntext #\n## b", 0),
+                         "# a\ntext #\n## b")
+        self.assertEqual(shift_headings("# a\ntext #\n## b", 2),
+                         "### a\ntext #\n#### b")
+
+    def test_iter_subtree_contents(self):
+        contents = iter_subtree_contents(self.repository, "epic")
+        self.assertEqual(list(contents), [
+            ("epic", 0, "# Epic\n\n## Plan\n"),
+            ("epic.a", 1, "# A\n\ntext\n"),
+            ("epic.a.x", 2, "# epic.a.x"),
+            ("epic.b", 1, "# epic.b"),
+        ])
+
+    def render_concatenated(self, name):
+        """Returns the output of the concatenated subtree contents, rendered
+        as a single document by vmd.
+        """
+        class parser_args:
+            tab_spaces = 4
+
+        content = "\n".join([
+            shift_headings(content, depth) for _, depth, content
+            in iter_subtree_contents(self.repository, name)
+        ])
+        output = io.StringIO()
+        config = vmd.load_config()
+        config.formatting.indent_paragraph_first_line = False
+        config.formatting.align_content_with_headings = True
+        renderer = vmd.build_render(vmd.create_display_writer(output),
+                                    config)
+        renderer.render_document(vmd.build_parser(parser_args).parse(content))
+        return output.getvalue()
+
+    def test_render_subtree(self):
+        # The parser adds a separator after a fenced code block.
+        self.repository.write_ticket_content("epic.a.x",
+                                             "# X\n\n```\ncode\n```\n")
+        self.repository.create_ticket("epic.a.y", "opened", [])
+        self.repository.write_ticket_content("epic.a.y", "")
+        output = io.StringIO()
+        SubtreeRenderer(output).render_subtree(self.repository, "epic")
+
+        # Rendering every ticket at once gives the same output.
+        self.assertEqual(output.getvalue(),
+                         self.render_concatenated("epic"))
+        # Headings are numbered across tickets.
+        self.assertIn("1.2.1", output.getvalue())
+
+    def render(self, cache=None):
+        """Returns the output of the epic and the number of parsed
+        documents.
+        """
+        output = io.StringIO()
+        renderer = SubtreeRenderer(output, cache)
+        with mock.patch.object(renderer.parser, "parse",
+                               wraps=renderer.parser.parse) as parse_mock:
+            renderer.render_subtree(self.repository, "epic")
+        return output.getvalue(), parse_mock.call_count
+
+    def test_render_cache(self):
+        cache = RenderCache(self.repository.repository)
+        expected, _ = self.render()
+        self.assertEqual(self.render(cache), (expected, 4))
+        self.assertEqual(self.render(cache), (expected, 0))
+
+        # Only the modified ticket is rendered again.
+        self.repository.write_ticket_content("epic.a", "# A\n\nmore\n")
+        expected, _ = self.render()
+        self.assertEqual(self.render(cache), (expected, 1))
+
+        # The following tickets headings numbers changed.
+        self.repository.write_ticket_content("epic.a", "# A\n# B\n")
+        expected, _ = self.render()
+        self.assertEqual(self.render(cache), (expected, 3))
+
+    def test_render_cache_eviction(self):
+        cache = RenderCache(self.repository.repository)
+        self.render(cache)
+        sizes = {name: os.path.getsize(cache.path + "/" + name)
+                 for name in os.listdir(cache.path)}
+        self.assertEqual(len(sizes), 4)
+
+        # The least recently used entry is removed.
+        cache = RenderCache(self.repository.repository,
+                            sum(sizes.values()) - 1)
+        self.repository.write_ticket_content("epic.b", "# B\n")
+        self.render(cache)
+        self.assertEqual(len(os.listdir(cache.path)), 4)
@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 import os.path
 import shutil
 import random
@@ -8,6 +9,7 @@ from pyticket.ticket import MetaTicket
 from pyticket.repository import (
         Repository, DEFAULT_BUG_TEMPLATE, DEFAULT_FEATURE_TEMPLATE
 )
+from pyticket.storage import STORAGES, JsonStorage, read_tickets_file
 import pyticket.utils
 
 from tests import utils
@@ -99,7 +101,7 @@ class RepositoryTest(unittest.TestCase):
             repo_ticket = r.get_ticket(ticket.name)
             self.assertEqual(repo_ticket, ticket)
             if created:
-                path = "{}/{}".format(r.contents, repo_ticket.name)
+                path = r.get_ticket_content_path(repo_ticket.name)
                 self.assertTrue(os.path.isfile(path))
 
     def test_create_ticket_invalid_name(self):
@@ -166,6 +168,35 @@ class RepositoryTest(unittest.TestCase):
             PyticketException, r.read_ticket_content, "test"
         )
 
+    def test_read_contents(self):
+        r = Repository(self.root, create=True)
+        names = ["ticket-{}".format(i) for i in range(100)]
+        for i, name in enumerate(names):
+            r.create_ticket(name, "opened", [])
+            if i % 3:
+                r.write_ticket_content(name, "content {}".format(i))
+
+        expected = [(name, "content {}".format(i) if i % 3 else None)
+                    for i, name in enumerate(names)]
+        self.assertEqual(list(r.read_contents(names)), expected)
+        self.assertEqual(list(r.read_contents(reversed(names), threads=2)),
+                         list(reversed(expected)))
+
+        # Only the directories of the given tickets are listed, once.
+        with mock.patch("os.listdir", wraps=os.listdir) as listdir_mock:
+            self.assertEqual(list(r.read_contents(names[:3])), expected[:3])
+        directories = set([
+            os.path.dirname(r.get_ticket_content_path(name))
+            for name in names[:3]
+        ])
+        listed = [c[0][0] for c in listdir_mock.call_args_list]
+        self.assertEqual(sorted(listed), sorted(directories))
+
+        # The iteration can be stopped before every file has been read.
+        contents = r.read_contents(names)
+        self.assertEqual(next(contents), expected[0])
+        contents.close()
+
     @repeat(100)
     def test_switch_ticket_status(self):
         r = Repository(self.root, create=True)
@@ -322,6 +353,46 @@ class RepositoryTest(unittest.TestCase):
             ]
             self.assertFalse(set(childs) - set(returned_childs))
 
+    def test_childs_index(self):
+        def brute_force_childs(r, name):
+            return set([
+                candidate for candidate in r.tickets
+                if pyticket.utils.get_ticket_parent_name(candidate) == name
+            ])
+
+        r = Repository(self.root, create=True)
+        tickets, _ = RepositoryTest.generate_tickets(r, 300, 0.5)
+        for ticket in random.sample(tickets, 50):
+            if not r.has_ticket(ticket):
+                continue
+            if random.choice([True, False]):
+                r.rename_ticket(ticket, ticket + "-renamed")
+            else:
+                r.delete_ticket(ticket)
+
+        for repository in [r, Repository(self.root)]:
+            for name in repository.tickets:
+                childs = repository.get_ticket_childs(name)
+                childs = set([t.name for t in childs])
+                self.assertEqual(childs, brute_force_childs(repository, name))
+
+    def test_deep_hierarchy(self):
+        r = Repository(self.root, create=True)
+        names = ["a"]
+        with r.transaction():
+            r.create_ticket("a", "opened", [])
+            for i in range(2000):
+                names.append(names[-1] + ".a")
+                r.create_ticket(names[-1], "opened", [])
+        self.assertEqual(
+            [t.name for t in r.get_ticket_childs("a", recursive=True)],
+            names[1:]
+        )
+        r.rename_ticket("a", "b")
+        self.assertEqual(len(r.list_tickets(root="b")), len(names))
+        r.delete_ticket("b")
+        self.assertFalse(r.tickets)
+
     def test_rename_ticket(self):
         def rename_parent(ticket, prev_parent, new_parent):
             basename = ticket[len(prev_parent)+1:]
@@ -417,6 +488,26 @@ class RepositoryTest(unittest.TestCase):
             PyticketException, r.rename_ticket, "blectre", "parent.blectre"
         )
 
+    def test_rename_ticket_into_subtree(self):
+        for storage in sorted(STORAGES):
+            directory = self.root + "/" + storage
+            os.mkdir(directory)
+            r = Repository(directory, create=True, storage=storage)
+            r.create_ticket("d", "opened", [])
+            r.create_ticket("d.f", "opened", [])
+            for new_name in ["d", "d.f", "d.g", "d.f.d"]:
+                self.assertRaises(
+                    PyticketException, r.rename_ticket, "d", new_name
+                )
+            r.create_ticket("d-e", "opened", [])
+            r.rename_ticket("d-e", "d.e")
+            for repository in [r, Repository(directory, lazy=True)]:
+                self.assertEqual(
+                    [t.name for t in repository.iter_tickets()],
+                    ["d", "d.e", "d.f"],
+                    storage
+                )
+
     def test_rename_ticket_already_exist(self):
         r = Repository(self.root, create=True)
         r.create_ticket("blectre", "opened", [])
@@ -480,6 +571,32 @@ class RepositoryTest(unittest.TestCase):
         for tag in ticket.tags:
             self.assertTrue(tag in tags or tag in new_tags)
 
+    def test_add_tags_rollback(self):
+        r = Repository(self.root, create=True)
+        tags = ["a"]
+        try:
+            with r.transaction():
+                r.create_ticket("blectre", "opened", tags)
+                r.add_tags("blectre", ["b"])
+                raise KeyboardInterrupt()
+        except KeyboardInterrupt:
+            pass
+        self.assertEqual(tags, ["a"])
+        self.assertFalse(r.has_ticket("blectre"))
+
+        with r.transaction():
+            r.create_ticket("blectre", "opened", tags)
+            r.add_tags("blectre", ["b"])
+            try:
+                with r.transaction():
+                    r.add_tags("blectre", ["c"])
+                    raise KeyboardInterrupt()
+            except KeyboardInterrupt:
+                pass
+        self.assertEqual(r.get_ticket("blectre").tags, ("a", "b"))
+        self.assertEqual(Repository(self.root).get_ticket("blectre").tags,
+                         ("a", "b"))
+
     def test_add_tags_invalid_name(self):
         r = Repository(self.root, create=True)
 
@@ -512,7 +629,7 @@ class RepositoryTest(unittest.TestCase):
             if tag not in removed_tags:
                 self.assertTrue(tag in ticket.tags)
             else:
-                self.assertFalse(tag not in ticket.tags)
+                self.assertFalse(tag in ticket.tags)
 
     def test_remove_tags_invalid_name(self):
         r = Repository(self.root, create=True)
@@ -553,6 +670,58 @@ class RepositoryTest(unittest.TestCase):
                 set(parents[parent] + [parent]).intersection(listed), listed
             )
 
+    def test_list_tags_filters(self):
+        r = Repository(self.root, create=True)
+        tags = [generators.gen_tag_name() for _ in range(10)]
+        with r.transaction():
+            for i in range(300):
+                name = "ticket-{}".format(i)
+                r.create_ticket(name, "opened",
+                                random.sample(tags, random.randrange(4)))
+            for name in random.sample(list(r.tickets), 50):
+                r.add_tags(name, random.sample(tags, 2))
+            for name in random.sample(list(r.tickets), 50):
+                r.remove_tags(name, random.sample(tags, 2))
+            for name in random.sample(list(r.tickets), 50):
+                r.rename_ticket(name, name + "-renamed")
+
+        def expected(predicate):
+            return set([name for name, t in r.tickets.items()
+                        if predicate(set(t.tags))])
+
+        def listed(**kwargs):
+            return set([t.name for t in r.list_tickets(**kwargs)])
+
+        for repository in [r, Repository(self.root)]:
+            for _ in range(20):
+                a, b = random.sample(tags, 2)
+                self.assertEqual(listed(tags=[a, b]),
+                                 expected(lambda t: a in t and b in t))
+                self.assertEqual(listed(any_tags=[a, b]),
+                                 expected(lambda t: a in t or b in t))
+                self.assertEqual(listed(without_tags=[a, b]),
+                                 expected(lambda t: not t & set([a, b])))
+                self.assertEqual(
+                    listed(tags=[a], without_tags=[b]),
+                    expected(lambda t: a in t and b not in t)
+                )
+
+    def test_iter_tickets(self):
+        r = Repository(self.root, create=True)
+        tickets, parents = RepositoryTest.generate_tickets(r, 100, 0.3)
+        iterator = r.iter_tickets(status="opened")
+        self.assertEqual(next(iterator).status, "opened")
+        self.assertEqual(list(r.iter_tickets(status="opened")),
+                         r.list_tickets(status="opened"))
+        for parent in parents:
+            self.assertEqual([t.name for t in r.iter_tickets(root=parent)],
+                             [parent] + r.get_descendant_names(parent))
+
+        # Filters are checked before iterating.
+        self.assertRaises(PyticketException, r.iter_tickets, root="cocorico")
+        self.assertRaises(PyticketException, r.iter_tickets,
+                          status="cocorico")
+
     def test_list_invalid_root(self):
         r = Repository(self.root, create=True)
         name = "blectre"
@@ -591,6 +760,202 @@ class RepositoryTest(unittest.TestCase):
             self.assertTrue(r.is_working_ticket(ticket))
             self.assertEqual(r.get_working_ticket().name, ticket)
 
+    def test_working_ticket_cache(self):
+        r = Repository(self.root, create=True)
+        r.create_ticket("a", "opened", [])
+        r.create_ticket("b", "opened", [])
+        r.set_working_ticket("a")
+
+        # The working file is not read while it is unmodified.
+        with mock.patch("builtins.open") as m:
+            for _ in range(10):
+                self.assertTrue(r.is_working_ticket("a"))
+            m.assert_not_called()
+
+        # Modifications made by another repository instance are seen.
+        path = self.root + "/.pyticket/working"
+        mtime = os.stat(path).st_mtime_ns
+        other = Repository(self.root)
+        other.set_working_ticket("b")
+        os.utime(path, ns=(mtime, mtime + 1))
+        self.assertEqual(r.get_working_ticket_name(), "b")
+
+        # Even within the same modification time tick.
+        other.set_working_ticket(None)
+        os.utime(path, ns=(mtime, mtime + 1))
+        self.assertEqual(r.get_working_ticket_name(), "")
+
+    def test_journal_replay(self):
+        r = Repository(self.root, create=True)
+        tickets, _ = RepositoryTest.generate_tickets(r, 200, 0.3)
+        for ticket in random.sample(tickets, 50):
+            if not r.has_ticket(ticket):
+                continue
+            action = random.randrange(4)
+            if action == 0:
+                r.add_tags(ticket, generators.gen_tags())
+            elif action == 1:
+                r.remove_tags(ticket, r.get_ticket(ticket).tags[:2])
+            elif action == 2:
+                r.rename_ticket(ticket, ticket + "-renamed")
+            else:
+                r.delete_ticket(ticket)
+
+        # Nothing has been folded in the tickets file...
+        self.assertFalse(
+            read_tickets_file(self.root + "/.pyticket/tickets")
+        )
+        # ...but the journal is replayed when loading the repository.
+        reloaded = Repository(self.root)
+        self.assertEqual(reloaded.tickets, r.tickets)
+
+    def test_compact(self):
+        r = Repository(self.root, create=True)
+        RepositoryTest.generate_tickets(r, 100, 0.3)
+        r.compact()
+        self.assertEqual(r.storage.journal.read(), (1, []))
+        written = read_tickets_file(
+            self.root + "/.pyticket/tickets"
+        )
+        self.assertEqual({t.name: t for t in written}, r.tickets)
+        self.assertEqual(Repository(self.root).tickets, r.tickets)
+
+    def test_compaction_threshold(self):
+        r = Repository(self.root, create=True)
+        threshold = JsonStorage.COMPACTION_THRESHOLD
+        JsonStorage.COMPACTION_THRESHOLD = 4096
+        try:
+            RepositoryTest.generate_tickets(r, 100, 0.3)
+        finally:
+            JsonStorage.COMPACTION_THRESHOLD = threshold
+        self.assertTrue(r.storage.journal.size() <= 4096 + 4096)
+        self.assertTrue(
+            read_tickets_file(self.root + "/.pyticket/tickets")
+        )
+        self.assertEqual(Repository(self.root).tickets, r.tickets)
+
+    def test_transaction(self):
+        r = Repository(self.root, create=True)
+        with mock.patch.object(r.storage.journal, "append",
+                               wraps=r.storage.journal.append) as append_mock:
+            with r.transaction():
+                tickets, _ = RepositoryTest.generate_tickets(r, 100, 0.3)
+                for ticket in tickets:
+                    r.add_tags(ticket, ["x"])
+                self.assertEqual(Repository(self.root).tickets, {})
+            append_mock.assert_called_once()
+        self.assertEqual(Repository(self.root).tickets, r.tickets)
+
+    def test_mutation_single_write(self):
+        r = Repository(self.root, create=True)
+        RepositoryTest.generate_tickets(r, 100, 0.5)
+        with mock.patch.object(r.storage.journal, "append") as append_mock:
+            for name in list(r.tickets):
+                if r.has_ticket(name):
+                    r.rename_ticket(name, name + "-renamed")
+                    self.assertEqual(append_mock.call_count, 1)
+                    append_mock.reset_mock()
+
+    def test_transaction_rollback(self):
+        r = Repository(self.root, create=True)
+        r.create_ticket("blectre", "opened", [])
+        with r.transaction():
+            r.add_tags("blectre", ["x"])
+            try:
+                with r.transaction():
+                    r.create_ticket("blectre.child", "opened", [])
+                    raise PyticketException("abort")
+            except PyticketException:
+                pass
+            # A failing mutation doesn't cancel the whole transaction.
+            self.assertRaises(
+                PyticketException, r.create_ticket, "missing.x", "opened", []
+            )
+        self.assertFalse(r.has_ticket("blectre.child"))
+        self.assertEqual(r.get_ticket("blectre").tags, ("x",))
+        self.assertEqual(Repository(self.root).tickets, r.tickets)
+
+    def test_concurrent_repositories(self):
+        r = Repository(self.root, create=True)
+        r.create_ticket("a", "opened", [])
+        other = Repository(self.root)
+        self.assertEqual(other.tickets, r.tickets)
+
+        # Mutations see what another process wrote since loading...
+        r.create_ticket("b", "opened", [])
+        r.compact()
+        other.add_tags("b", ["x"])
+        r.create_ticket("a.child", "opened", [])
+        self.assertRaises(PyticketException,
+                          other.create_ticket, "a.child", "closed", ["y"])
+        # ...and nothing is lost when compacting.
+        other.compact()
+        reloaded = Repository(self.root)
+        self.assertEqual(sorted(reloaded.tickets), ["a", "a.child", "b"])
+        self.assertEqual(reloaded.get_ticket("b").tags, ("x",))
+
+    def test_concurrent_processes(self):
+        r = Repository(self.root, create=True)
+        r.create_ticket("blectre", "opened", [])
+        threshold = JsonStorage.COMPACTION_THRESHOLD
+        JsonStorage.COMPACTION_THRESHOLD = 1024
+        pids = []
+        try:
+            for i in range(8):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        for j in range(10):
+                            Repository(self.root, lazy=True).add_tags(
+                                "blectre", ["tag-{}-{}".format(i, j)]
+                            )
+                    finally:
+                        os._exit(0)
+                pids.append(pid)
+        finally:
+            for pid in pids:
+                os.waitpid(pid, 0)
+            JsonStorage.COMPACTION_THRESHOLD = threshold
+        tags = Repository(self.root).get_ticket("blectre").tags
+        self.assertEqual(len(tags), 80)
+
+    def test_interrupted_compaction(self):
+        r = Repository(self.root, create=True)
+        r.create_ticket("a", "opened", [])
+        r.compact()
+        r.add_tags("a", ["x"])
+        # The tickets file has been written but not the journal.
+        with mock.patch.object(r.storage.journal, "reset"):
+            r.compact()
+        self.assertEqual(r.storage.journal.read()[0], 1)
+
+        # The records of the old journal are already in the tickets file.
+        reloaded = Repository(self.root)
+        self.assertEqual(reloaded.get_ticket("a").tags, ("x",))
+        self.assertEqual(Repository(self.root, lazy=True).get_ticket("a").tags,
+                         ("x",))
+        # The next mutation starts a new journal.
+        reloaded.add_tags("a", ["y"])
+        self.assertEqual(reloaded.storage.journal.read()[0], 2)
+        self.assertEqual(Repository(self.root).get_ticket("a").tags,
+                         ("x", "y"))
+
+    def test_atomic_tickets_file(self):
+        r = Repository(self.root, create=True)
+        r.create_ticket("a", "opened", [])
+        r.compact()
+        path = self.root + "/.pyticket/tickets"
+        with open(path, "r") as f:
+            content = f.read()
+        with mock.patch("os.replace", side_effect=OSError):
+            r.create_ticket("b", "opened", [])
+            self.assertRaises(OSError, r.compact)
+        with open(path, "r") as f:
+            self.assertEqual(f.read(), content)
+        self.assertFalse([f for f in os.listdir(self.root + "/.pyticket")
+                          if f.endswith(".tmp")])
+        self.assertEqual(sorted(Repository(self.root).tickets), ["a", "b"])
+
     def test_working_ticket_invalid_name(self):
         r = Repository(self.root, create=True)
         self.assertRaises(PyticketException, r.set_working_ticket, "blectre")
@@ -0,0 +1,101 @@
+import unittest
+from unittest import mock
+import os
+import shutil
+
+from pyticket.repository import Repository
+from pyticket.search import SearchIndex, parse_search, tokenize
+
+from tests import utils
+
+
+class SearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = utils.get_test_root_dir()
+        self.repository = Repository(self.root, create=True)
+        contents = {
+            "disk": "The disk is full.\nFree some disk space.",
+            "disk.quota": "Add a quota per user: a full disk is bad.",
+            "network": "The network is down, the disk is fine.",
+            "ui": "Buttons are too small.",
+        }
+        for name, content in sorted(contents.items()):
+            self.repository.create_ticket(name, "opened", [])
+            self.repository.write_ticket_content(name, content)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def searched(self, text):
+        return [name for name, _ in self.repository.search_tickets(text)]
+
+    def test_tokenize(self):
+        positions = tokenize("A b, a.")
+        self.assertEqual({t: list(p) for t, p in positions.items()},
+                         {"a": [0, 2], "b": [1]})
+        self.assertEqual(parse_search('"Full Disk" quota, user'),
+                         [["full", "disk"], ["quota"], ["user"]])
+
+    def test_search(self):
+        # "disk" has the most occurrences of the word.
+        self.assertEqual(self.searched("disk")[0], "disk")
+        self.assertEqual(sorted(self.searched("disk")),
+                         ["disk", "disk.quota", "network"])
+        self.assertEqual(self.searched("disk full"), ["disk", "disk.quota"])
+        self.assertEqual(self.searched('"full disk"'), ["disk.quota"])
+        self.assertEqual(self.searched('"disk full"'), [])
+        self.assertEqual(self.searched("printer"), [])
+        self.assertEqual(self.searched(""), [])
+        self.assertEqual(len(self.repository.search_tickets("disk", 2)), 2)
+
+    def test_incremental_updates(self):
+        self.assertEqual(self.searched("buttons"), ["ui"])
+        self.repository.write_ticket_content("ui", "Colors are too dark.")
+        self.assertEqual(self.searched("buttons"), [])
+        self.repository.rename_ticket("disk", "storage")
+        self.assertEqual(self.searched("quota"), ["storage.quota"])
+        self.repository.delete_ticket("network")
+        self.assertEqual(self.searched("network"), [])
+
+        # The index has been updated without indexing files again.
+        index = SearchIndex(self.repository.repository)
+        keys = index.get_indexed_keys()
+        index.refresh()
+        self.assertEqual(index.get_indexed_keys(), keys)
+        self.assertEqual(sorted(keys),
+                         ["storage", "storage.quota", "ui"])
+
+    def test_modified_files(self):
+        self.assertEqual(self.searched("printer"), [])
+        # Replaced like editors do, which modifies its directory.
+        path = self.repository.get_ticket_content_path("ui")
+        with open(path + ".tmp", "w") as f:
+            f.write("Buttons are too small.\nThe printer button is missing.")
+        os.replace(path + ".tmp", path)
+        self.repository.create_ticket("printer", "opened", [])
+        path = self.repository.get_ticket_content_path("printer", create=True)
+        with open(path, "w") as f:
+            f.write("Printer driver.")
+        os.remove(self.repository.get_ticket_content_path("network"))
+        self.assertEqual(self.searched("printer"), ["printer", "ui"])
+        self.assertEqual(self.searched("network"), [])
+
+    @mock.patch("pyticket.search.RACY_NS", 0)
+    def test_checked_directories(self):
+        self.assertEqual(self.searched("quota"), ["disk.quota"])
+        # Unmodified directories aren't read again.
+        with mock.patch.object(SearchIndex, "get_shard_keys") as keys_mock:
+            self.assertEqual(self.searched("quota"), ["disk.quota"])
+        keys_mock.assert_not_called()
+
+        # A found content modified in place is indexed again.
+        path = self.repository.get_ticket_content_path("disk.quota")
+        with open(path, "w") as f:
+            f.write("Limit the disk usage.")
+        self.assertEqual(self.searched("quota"), [])
+        self.assertEqual(self.searched("usage"), ["disk.quota"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Tests the pyticket daemon."""
+import unittest
+import os.path
+import shutil
+import socket
+import threading
+from unittest import mock
+
+from pyticket import PyticketException
+from pyticket.__main__ import COMMANDS
+from pyticket.repository import Repository
+from pyticket.client import can_forward, forward, get_socket_path
+from pyticket import server
+from pyticket.server import Server
+
+from tests import utils
+
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = utils.get_test_root_dir()
+        Repository(self.root, create=True)
+        self.server = Server(COMMANDS, self.root)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.root)
+
+    def test_can_forward(self):
+        self.assertTrue(can_forward(["list", "--opened"]))
+        self.assertTrue(can_forward(["delete", "a", "--force"]))
+        self.assertFalse(can_forward(["delete", "a"]))
+        self.assertFalse(can_forward(["create", "a"]))
+        self.assertFalse(can_forward(["edit", "a"]))
+        self.assertFalse(can_forward([]))
+
+    def test_forward(self):
+        output, error = forward(["create", "a", "--no-edit"], self.root)
+        self.assertEqual(error, None)
+        forward(["works-on", "a"], self.root)
+        output, error = forward(["current"], self.root)
+        self.assertEqual((output, error), ("a\n", None))
+        self.assertTrue(Repository(self.root).has_ticket("a"))
+
+    def test_forward_error(self):
+        output, error = forward(["close", "blectre"], self.root)
+        self.assertEqual(error, "ticket 'blectre' doesn't exist")
+        output, error = forward(["edit", "blectre"], self.root)
+        self.assertNotEqual(error, None)
+
+    def test_reload(self):
+        forward(["create", "a", "--no-edit"], self.root)
+        # Modifications made by another process are seen by the daemon.
+        Repository(self.root).create_ticket("b", "opened", [])
+        output, error = forward(["list"], self.root)
+        self.assertIn(" b\n", output)
+
+    def test_reload_during_command(self):
+        forward(["list"], self.root)
+        served_execute_argv = server.execute_argv
+
+        def execute_argv(commands_list, argv):
+            served_execute_argv(commands_list, argv)
+            # Another process writes while the command is served.
+            Repository(self.root).create_ticket("b", "opened", [])
+
+        with mock.patch("pyticket.server.execute_argv", execute_argv):
+            forward(["create", "a", "--no-edit"], self.root)
+        output, error = forward(["list"], self.root)
+        self.assertIn(" a\n", output)
+        self.assertIn(" b\n", output)
+
+    def test_already_served(self):
+        self.assertRaises(PyticketException, Server, COMMANDS, self.root)
+
+    def test_not_served(self):
+        root = utils.get_test_root_dir()
+        try:
+            self.assertEqual(forward(["list"], root), None)
+            # A socket left by a dead daemon is ignored.
+            os.mkdir(root + "/.pyticket")
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.bind(get_socket_path(root))
+            self.assertEqual(forward(["list"], root), None)
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    unittest.main()
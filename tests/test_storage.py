@@ -0,0 +1,308 @@
+"""Tests storage engines."""
+import unittest
+from unittest import mock
+import os.path
+import shutil
+import random
+
+from pyticket import PyticketException, query
+from pyticket.repository import Repository
+from pyticket.storage import (
+    BinaryStorage, JsonStorage, SqliteStorage, get_storage_name, open_storage
+)
+
+from tests import utils
+from tests import generators
+
+
+class StorageTest(unittest.TestCase):
+    """Apply the same random mutations on a repository of each storage
+    engine, and check they answer queries the same way.
+    """
+
+    def setUp(self):
+        self.root = utils.get_test_root_dir()
+        self.repositories = []
+        for name in [JsonStorage.NAME, SqliteStorage.NAME, BinaryStorage.NAME]:
+            os.mkdir(self.root + "/" + name)
+            self.repositories.append(
+                Repository(self.root + "/" + name, create=True, storage=name)
+            )
+        self.tags = [generators.gen_tag_name() for _ in range(8)]
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def mutate(self, count):
+        """Apply ```count``` random mutations on every repository."""
+        names = []
+        for _ in range(count):
+            action = random.randrange(6)
+            if not names or action == 0:
+                name = generators.gen_child_ticket_name(
+                    random.sample(names, min(len(names), 1))
+                )
+                if name in names:
+                    continue
+                status = generators.gen_status()
+                tags = random.sample(self.tags, random.randrange(4))
+                mtime = generators.gen_time()
+                for r in self.repositories:
+                    r.create_ticket(name, status, tags)
+                    r.record({"op": "mtime", "name": name, "mtime": mtime})
+                names.append(name)
+                continue
+            name = random.choice(names)
+            if action == 1:
+                tags = random.sample(self.tags, 2)
+                for r in self.repositories:
+                    r.add_tags(name, tags)
+            elif action == 2:
+                tags = random.sample(self.tags, 2)
+                for r in self.repositories:
+                    r.remove_tags(name, tags)
+            elif action == 3:
+                status = generators.gen_status()
+                for r in self.repositories:
+                    r.record({"op": "status", "name": name, "status": status})
+            elif action == 4:
+                new_name = name + "-renamed"
+                if new_name in names:
+                    continue
+                for r in self.repositories:
+                    r.rename_ticket(name, new_name)
+                    r.record({"op": "mtime", "name": new_name, "mtime": 0.0})
+                names = [new_name + n[len(name):] if n == name or
+                         n.startswith(name + ".") else n for n in names]
+            else:
+                for r in self.repositories:
+                    r.delete_ticket(name)
+                names = [n for n in names
+                         if n != name and not n.startswith(name + ".")]
+        return names
+
+    def assertSameAnswers(self, query):
+        answers = [query(r) for r in self.repositories]
+        for answer in answers[1:]:
+            self.assertEqual(answer, answers[0])
+
+    @mock.patch("time.time", return_value=1234.0)
+    def test_same_answers(self, time_mock):
+        names = self.mutate(300)
+
+        def listed(**kwargs):
+            return lambda r: sorted(
+                [t.to_json() for t in r.list_tickets(**kwargs)],
+                key=lambda t: t["name"]
+            )
+
+        self.assertSameAnswers(
+            lambda r: sorted([t.to_json() for t in r.tickets.values()],
+                             key=lambda t: t["name"])
+        )
+        self.assertSameAnswers(listed())
+        for status in ["opened", "closed"]:
+            self.assertSameAnswers(listed(status=status))
+        for _ in range(10):
+            a, b = random.sample(self.tags, 2)
+            self.assertSameAnswers(listed(tags=[a, b]))
+            self.assertSameAnswers(listed(any_tags=[a, b]))
+            self.assertSameAnswers(listed(without_tags=[a]))
+            self.assertSameAnswers(listed(status="opened", tags=[a],
+                                          without_tags=[b]))
+            since = random.uniform(0.0, 1234.0)
+            until = since + random.uniform(0.0, 600.0)
+            self.assertSameAnswers(listed(since=since))
+            self.assertSameAnswers(listed(until=until))
+            self.assertSameAnswers(listed(since=since, until=until,
+                                          any_tags=[a]))
+        # Modification times are included in "since", not in "until".
+        self.assertSameAnswers(listed(since=1234.0))
+        self.assertSameAnswers(listed(until=1234.0))
+        for text in ["status:opened and not tag:{a} or tag:{b}",
+                     "tag:{a} tag:{b} mtime<=600 mtime>300",
+                     "(tag:{a} or tag:{b}) and name:{name}*"]:
+            a, b = random.sample(self.tags, 2)
+            plan = query.compile_query(query.parse(text.format(
+                a=a, b=b, name=names[0] if names else "x"
+            )))
+            self.assertSameAnswers(
+                lambda r: sorted([t.name for t in plan.iter_tickets(r)])
+            )
+            self.assertEqual(
+                sorted([t.name for t in plan.iter_tickets(
+                    self.repositories[0]
+                )]),
+                sorted([t.name for t in self.repositories[0].tickets.values()
+                        if plan.expression.match(t)])
+            )
+        for name in names:
+            self.assertSameAnswers(
+                lambda r: [t.name for t in r.get_ticket_childs(name)]
+            )
+            self.assertSameAnswers(
+                lambda r: r.get_descendant_names(name)
+            )
+            self.assertSameAnswers(
+                lambda r: [t.name for t in r.list_tickets(root=name)]
+            )
+
+    def test_reload(self):
+        self.mutate(100)
+        for r in self.repositories:
+            reloaded = Repository(r.root)
+            self.assertEqual(reloaded.tickets, r.tickets)
+            since = generators.gen_time()
+            self.assertEqual(
+                sorted([t.name for t in reloaded.list_tickets(since=since)]),
+                sorted([t.name for t in r.list_tickets(since=since)])
+            )
+
+    def test_rollback(self):
+        self.mutate(50)
+        for r in self.repositories:
+            before = dict(r.tickets.items())
+            try:
+                with r.transaction():
+                    for name in list(r.tickets):
+                        if r.has_ticket(name):
+                            r.delete_ticket(name)
+                    raise KeyboardInterrupt()
+            except KeyboardInterrupt:
+                pass
+            self.assertEqual(r.tickets, before)
+            self.assertEqual(Repository(r.root).tickets, before)
+
+    def test_lazy_get(self):
+        # Both engines reading a tickets file and a journal.
+        lazy_repositories = [self.repositories[0], self.repositories[2]]
+        deleted = []
+        for i, compact in enumerate([False, True, False]):
+            names = self.mutate(100)
+            deleted += [t for t in [n + "-renamed" for n in names]
+                        if t not in names]
+            for repository in lazy_repositories:
+                repository.create_ticket("lazy-{}".format(i), "opened", [])
+                if compact:
+                    repository.compact()
+                storage = open_storage(repository.repository, lazy=True)
+                for name in names + deleted:
+                    self.assertEqual(storage.get(name),
+                                     repository.tickets.get(name))
+                self.assertFalse(storage.loaded)
+
+                # Mutations are remembered until the storage is loaded.
+                name = "lazy-{}".format(i)
+                storage.apply({"op": "add-tags", "name": name, "tags": ["x"]})
+                self.assertTrue("x" in storage.get(name).tags)
+                self.assertTrue("x" in storage.tickets[name].tags)
+                self.assertTrue(storage.loaded)
+
+    def test_lazy_rename(self):
+        for repository in [self.repositories[0], self.repositories[2]]:
+            repository.create_ticket("c", "opened", [])
+            repository.create_ticket("c.child", "opened", [])
+            repository.create_ticket("e", "opened", [])
+            repository.compact()
+            repository.rename_ticket("c", "d")
+            repository.rename_ticket("e", "d.e")
+
+            r = Repository(repository.root, lazy=True)
+            self.assertFalse(r.has_ticket("c"))
+            self.assertFalse(r.has_ticket("c.child"))
+            self.assertFalse(r.has_ticket("e"))
+            self.assertEqual(r.get_ticket("d.child").name, "d.child")
+            self.assertEqual(r.get_ticket("d.e").name, "d.e")
+            with self.assertRaises(PyticketException):
+                r.add_tags("c", ["x"])
+            self.assertFalse(r.storage.loaded)
+
+            # The old name can be used again.
+            r = Repository(repository.root, lazy=True)
+            r.create_ticket("c", "opened", [])
+            r = Repository(repository.root, lazy=True)
+            self.assertEqual(r.get_ticket("c").name, "c")
+            r.add_tags("c", ["x"])
+            self.assertEqual(
+                sorted(Repository(repository.root).tickets),
+                ["c", "d", "d.child", "d.e"]
+            )
+            self.assertEqual(r.get_ticket("c").tags, ("x",))
+
+    def test_lazy_select(self):
+        binary_repository = self.repositories[2]
+        for compact in [False, True]:
+            names = self.mutate(200)
+            if compact:
+                binary_repository.compact()
+            storage = open_storage(binary_repository.repository, lazy=True)
+
+            def selected(**kwargs):
+                return [
+                    sorted([t.to_json() for t in s.select(**kwargs)],
+                           key=lambda t: t["name"])
+                    for s in [storage, binary_repository.storage]
+                ]
+
+            self.assertEqual(*selected())
+            self.assertEqual(*selected(status="closed"))
+            for _ in range(10):
+                a, b = random.sample(self.tags, 2)
+                self.assertEqual(*selected(tags=[a, b]))
+                self.assertEqual(*selected(tags=[a, "missing"]))
+                self.assertEqual(*selected(any_tags=[a, "missing"]))
+                self.assertEqual(*selected(without_tags=[a]))
+                self.assertEqual(*selected(status="opened", tags=[a],
+                                           without_tags=[b]))
+                since = generators.gen_time()
+                self.assertEqual(*selected(since=since))
+                self.assertEqual(*selected(since=since, until=since + 1e8,
+                                           without_tags=[a]))
+            for name in names:
+                self.assertEqual(
+                    [t.name for t in storage.select(root=name)],
+                    [t.name for t in binary_repository.storage.select(
+                        root=name
+                    )]
+                )
+                for recursive in [False, True]:
+                    self.assertEqual(
+                        storage.get_descendant_names(name, recursive),
+                        binary_repository.get_descendant_names(name,
+                                                               recursive)
+                    )
+            self.assertFalse(storage.loaded)
+
+    def test_tickets_cache(self):
+        json_repository = self.repositories[0]
+        self.mutate(100)
+        json_repository.compact()
+        tickets = dict(json_repository.tickets)
+
+        # The cache is used when the tickets file didn't change...
+        storage = open_storage(json_repository.repository, lazy=True)
+        with mock.patch("pyticket.storage.parse_tickets_file") as parse_mock:
+            self.assertEqual(storage.tickets, tickets)
+            parse_mock.assert_not_called()
+
+        # A corrupted cache is ignored...
+        with open(storage.get_cache_path(), "r+b") as f:
+            f.seek(-10, os.SEEK_END)
+            f.write(b"0123456789")
+        self.assertEqual(open_storage(json_repository.repository).tickets,
+                         tickets)
+
+        # ...and so is the cache of a previous tickets file.
+        json_repository.compact()
+        with open(storage.path, "w+") as f:
+            f.write("[]")
+        self.assertEqual(open_storage(json_repository.repository).tickets, {})
+
+    def test_storage_name(self):
+        for r in self.repositories:
+            self.assertEqual(get_storage_name(r.repository), r.storage.NAME)
+            self.assertEqual(Repository(r.root).storage.NAME, r.storage.NAME)
+
+
+if __name__ == "__main__":
+    unittest.main()
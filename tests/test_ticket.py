@@ -36,9 +36,19 @@ class MetaTicketTest(unittest.TestCase):
         meta_ticket = MetaTicket.parse_legacy(line)
         self.assertEqual(meta_ticket.name, name)
         self.assertEqual(meta_ticket.status, status)
-        self.assertEqual(meta_ticket.tags, tags)
+        self.assertEqual(meta_ticket.tags, tuple(tags))
         self.assertEqual(meta_ticket.mtime, mtime)
 
+    def test_interned_tags(self):
+        a = MetaTicket("a", "opened", ["".join(["ta", "g"])])
+        b = MetaTicket.from_json({"name": "b", "status": "opened",
+                                  "tags": ["".join(["t", "ag"])],
+                                  "mtime": 0.0})
+        self.assertEqual(a.tags, ("tag",))
+        self.assertIs(a.tags[0], b.tags[0])
+        self.assertIs(b.to_json()["tags"], b.tags)
+        self.assertRaises(AttributeError, setattr, a, "content", "")
+
     def test_parse_invalid_count(self):
         line = "invalid_name opened (x,y,z) 32"
         self.assertRaises(PyticketException, MetaTicket.parse_legacy, line)